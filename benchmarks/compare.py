@@ -0,0 +1,70 @@
+"""
+Compares two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import json
+from typing import Any, Dict, List, Tuple
+
+# Metrics compared for each kind of result, and whether a higher value is better
+INGESTION_METRICS = (("rows_per_second", True), ("peak_rss_mib", False))
+REPORT_METRICS = (("p50_ms", False), ("p99_ms", False))
+
+def _index(results: List[Dict[str, Any]], keys: Tuple[str, ...]) -> Dict[Tuple[Any, ...], Dict[str, Any]]:
+    return {tuple(result[key] for key in keys): result for result in results}
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Matches the results of two runs and computes the change of each metric.
+
+    Args:
+        before (Dict[str, Any]): The baseline run.
+        after (Dict[str, Any]): The run to compare with the baseline.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per metric of every result present in both runs,
+                              with both values, the relative change and whether it improved.
+    """
+    changes = []
+    for section, keys, metrics in (
+        ("ingestion", ("path", "rows"), INGESTION_METRICS),
+        ("reports", ("endpoint", "cached", "rows"), REPORT_METRICS)
+    ):
+        previous = _index(before.get(section, []), keys)
+        for key, result in _index(after.get(section, []), keys).items():
+            if key not in previous:
+                continue
+            for metric, higher_is_better in metrics:
+                old, new = previous[key][metric], result[metric]
+                change = (new - old) / old if old else 0.0
+                changes.append({
+                    "section": section,
+                    "case": " ".join(str(part) for part in key),
+                    "metric": metric,
+                    "before": old,
+                    "after": new,
+                    "change": change,
+                    "improved": change > 0 if higher_is_better else change < 0
+                })
+    return changes
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before", help="Baseline results")
+    parser.add_argument("after", help="Results to compare with the baseline")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+
+    print(f"{before.get('commit') or '?'} -> {after.get('commit') or '?'}")
+    for change in compare(before, after):
+        marker = "+" if change["improved"] else "-" if change["change"] else " "
+        print(f"{marker} {change['section']:<9} {change['case']:<45} {change['metric']:<15} "
+              f"{change['before']:>12} -> {change['after']:>12} ({change['change']:+.1%})")
+
+if __name__ == "__main__":
+    main()
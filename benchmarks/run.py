@@ -0,0 +1,373 @@
+"""
+Ingestion and report benchmarks, run against the database configured with the DB_* variables.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+
+The employees, departments and jobs tables are truncated between runs, use a dedicated
+database (i.e. the one of .env.test). Results are written as JSON to benchmarks/results,
+compare two runs with python -m benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+from pydantic import TypeAdapter
+from sqlalchemy import func, select, text
+
+from bootstrap import bootstrap
+from database import SessionLocal, get_engine, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from models.db_models import Employee  # Also registers the tables and the rollup triggers
+from routers.department_router import dept_router
+from schemas.schemas import EmployeeCreate
+from services.department_service import create_departments
+from services.employee_service import (
+    create_employees,
+    create_employees_csv_stream,
+    create_employees_ndjson_stream,
+    create_employees_file)
+from services.job_service import create_jobs
+from services.parallel_csv import shutdown_parse_pool
+from services.utils import iter_path_chunks
+from utils.cache import report_cache
+from utils.constants import BATCH_SIZE, CHUNK_SIZE, PARSE_WORKERS, DEFAULT_REPORT_YEAR
+from tests.generator import (
+    get_valid_departments,
+    get_valid_jobs,
+    get_valid_employees,
+    list_of_dicts_to_csv_bytes,
+    list_of_dicts_to_json_bytes,
+    list_of_dicts_to_ndjson_bytes)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional dependency, only needed for the Parquet path
+    pyarrow = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+DEPARTMENTS = 12
+JOBS = 180
+# Employees are generated and written in slices to bound the memory of the runner
+SLICE_SIZE = 100_000
+REPORTS = ("/departments/quarter_hires", "/departments/hires_over_avg")
+
+# Ingestion paths, each one mirrors an upload endpoint
+PATHS = {
+    "batch": "json",          # POST /employees/batch with a JSON array
+    "ndjson": "ndjson",       # POST /employees/batch with application/x-ndjson
+    "csv_stream": "csv",      # POST /employees/stream and small /upload files
+    "csv_file": "csv",        # Large /upload files, parsed by the parser processes
+    "parquet": "parquet"      # /upload of a Parquet file
+}
+
+def _employee_slices(size: int, seed: int):
+    """
+    Generates the employees in slices, hired in the report year so the reports have data.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)  # get_valid_employees draws the departments and jobs from random
+    start_of_year = datetime(DEFAULT_REPORT_YEAR, 1, 1)
+    for start in range(0, size, SLICE_SIZE):
+        employees = get_valid_employees(min(SLICE_SIZE, size - start), list(range(DEPARTMENTS)), list(range(JOBS)))
+        for employee in employees:
+            employee["id"] += start
+            employee["datetime"] = start_of_year + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        yield employees
+
+def write_inputs(size: int, seed: int, directory: str, formats: List[str]) -> Dict[str, str]:
+    """
+    Writes the employees of a run in every format needed by the selected paths.
+
+    Args:
+        size (int): Number of employees.
+        seed (int): Seed of the generated data, the same seed gives the same files.
+        directory (str): Directory of the files.
+        formats (List[str]): json, ndjson, csv and/or parquet.
+
+    Returns:
+        Dict[str, str]: The path of the file of each format.
+    """
+    paths = {fmt: os.path.join(directory, f"employees_{size}.{fmt}") for fmt in formats}
+    files = {fmt: open(paths[fmt], "wb") for fmt in formats if fmt != "parquet"}
+    parquet_writer = None
+    try:
+        if "json" in files:
+            files["json"].write(b"[")
+        for index, employees in enumerate(_employee_slices(size, seed)):
+            if "json" in files:
+                # Each slice is a JSON array, its brackets are replaced to make a single one
+                files["json"].write((b"," if index else b"") + list_of_dicts_to_json_bytes(employees)[1:-1])
+            if "ndjson" in files:
+                files["ndjson"].write(list_of_dicts_to_ndjson_bytes(employees))
+            if "csv" in files:
+                files["csv"].write(list_of_dicts_to_csv_bytes(employees, Employee.__table__.columns.keys()))
+            if "parquet" in paths:
+                table = pyarrow.Table.from_pylist(employees)
+                if parquet_writer is None:
+                    parquet_writer = pyarrow.parquet.ParquetWriter(paths["parquet"], table.schema)
+                parquet_writer.write_table(table)
+        if "json" in files:
+            files["json"].write(b"]")
+    finally:
+        for file in files.values():
+            file.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return paths
+
+def reset_tables(departments: bool = False) -> None:
+    """
+    Empties the employees table, and the departments and jobs tables when asked.
+    """
+    tables = "employees, departments, jobs" if departments else "employees"
+    with get_engine().begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    report_cache.bump_generation()
+
+async def _load(path_name: str, input_path: str) -> Any:
+    db = SessionLocal()
+    try:
+        if path_name == "batch":
+            # The same validation as the /batch endpoint, the whole array at once
+            with open(input_path, "rb") as file:
+                items = TypeAdapter(List[EmployeeCreate]).validate_json(file.read())
+            return await create_employees([item.model_dump() for item in items], db)
+        if path_name == "ndjson":
+            return await create_employees_ndjson_stream(iter_path_chunks(input_path), db)
+        if path_name == "csv_stream":
+            return await create_employees_csv_stream(iter_path_chunks(input_path), db)
+        file_format = "parquet" if path_name == "parquet" else "csv"
+        return await create_employees_file(input_path, db, file_format=file_format)
+    finally:
+        db.close()
+
+def _max_rss_mib(who: int) -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+def run_case(path_name: str, input_path: str) -> Dict[str, Any]:
+    """
+    Loads a file through an ingestion path, in the benchmark child process.
+
+    Returns:
+        Dict[str, Any]: The rows loaded, the elapsed seconds and the peak RSS of the
+                        process before and after the load and of its parser processes.
+    """
+    baseline = _max_rss_mib(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    loaded = asyncio.run(_load(path_name, input_path))
+    elapsed = time.perf_counter() - start
+    # The parser processes are waited for, so they are counted in RUSAGE_CHILDREN
+    shutdown_parse_pool()
+    return {
+        "loaded": loaded,
+        "seconds": round(elapsed, 3),
+        "baseline_rss_mib": baseline,
+        "peak_rss_mib": _max_rss_mib(resource.RUSAGE_SELF),
+        "peak_children_rss_mib": _max_rss_mib(resource.RUSAGE_CHILDREN)
+    }
+
+def benchmark_ingestion(path_name: str, input_path: str, size: int) -> Dict[str, Any]:
+    """
+    Loads a file through an ingestion path in a fresh process, so its peak RSS is its own.
+
+    Args:
+        path_name (str): One of PATHS.
+        input_path (str): The file to load.
+        size (int): Number of employees in the file.
+
+    Returns:
+        Dict[str, Any]: The measures of the load, with its rows per second.
+    """
+    reset_tables()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--case", path_name, "--input", input_path],
+        capture_output=True, text=True, cwd=ROOT_DIR
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{path_name} failed:\n{completed.stderr[-4000:]}")
+    measures = json.loads(completed.stdout.strip().splitlines()[-1])
+    if measures["loaded"] != size:
+        raise RuntimeError(f"{path_name} loaded {measures['loaded']} of {size} employees")
+    with SessionLocal() as db:
+        stored = db.execute(select(func.count()).select_from(Employee)).scalar_one()
+    if stored != size:
+        raise RuntimeError(f"{path_name} stored {stored} of {size} employees")
+    measures["rows_per_second"] = round(size / measures["seconds"], 1)
+    return {"path": path_name, "rows": size, **measures}
+
+async def _get(app: FastAPI, path: str) -> None:
+    # Calls the ASGI application in process, without a server or a network in between
+    messages = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"accept", b"application/json")],
+        "server": ("benchmark", 80), "client": ("benchmark", 0)
+    }
+    await app(scope, receive, send)
+    if messages[0]["status"] != 200:
+        raise RuntimeError(f"GET {path} returned {messages[0]['status']}")
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3)
+    }
+
+async def benchmark_reports(requests: int) -> List[Dict[str, Any]]:
+    """
+    Measures the latency of the report endpoints over the loaded employees.
+
+    Each endpoint is requested with the report cache invalidated before every request
+    (the query runs each time) and with the cache kept (the repeated requests are hits).
+
+    Args:
+        requests (int): Number of requests per endpoint and cache mode.
+
+    Returns:
+        List[Dict[str, Any]]: The p50, p99 and mean latency of each endpoint and cache mode.
+    """
+    app = FastAPI()
+    app.include_router(dept_router)
+    results = []
+    for report in REPORTS:
+        for cached in (False, True):
+            report_cache.bump_generation()
+            await _get(app, report)  # Warm up the connection pool and the prepared statements
+            latencies = []
+            for _ in range(requests):
+                if not cached:
+                    report_cache.bump_generation()
+                start = time.perf_counter()
+                await _get(app, report)
+                latencies.append(time.perf_counter() - start)
+            results.append({"endpoint": report, "cached": cached, "requests": requests, **_percentiles(latencies)})
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def _load_dimensions() -> None:
+    db = SessionLocal()
+    try:
+        await create_departments(get_valid_departments(DEPARTMENTS), db)
+        await create_jobs(get_valid_jobs(JOBS), db)
+    finally:
+        db.close()
+
+def run(sizes: List[int], paths: List[str], requests: int, seed: int, force: bool) -> Dict[str, Any]:
+    """
+    Runs the ingestion benchmarks of every size and path, then the report benchmarks.
+
+    Args:
+        sizes (List[int]): Numbers of employees to load.
+        paths (List[str]): Ingestion paths to measure, from PATHS.
+        requests (int): Number of requests per report endpoint and cache mode.
+        seed (int): Seed of the generated data.
+        force (bool): Run even if the employees table already has data.
+
+    Returns:
+        Dict[str, Any]: The environment of the run and its results.
+    """
+    bootstrap()
+    with SessionLocal() as db:
+        if not force and db.execute(select(func.count()).select_from(Employee)).scalar_one():
+            raise SystemExit("The employees table is not empty, use a dedicated database or pass --force")
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "batch_size": BATCH_SIZE,
+            "chunk_size": CHUNK_SIZE,
+            "parse_workers": PARSE_WORKERS,
+            "db_pool_size": DB_POOL_SIZE,
+            "db_max_overflow": DB_MAX_OVERFLOW,
+            "seed": seed
+        },
+        "ingestion": [],
+        "reports": []
+    }
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+        for size in sizes:
+            reset_tables(departments=True)
+            asyncio.run(_load_dimensions())
+            inputs = write_inputs(size, seed, directory, sorted({PATHS[path] for path in paths}))
+            for path in paths:
+                measures = benchmark_ingestion(path, inputs[PATHS[path]], size)
+                print(f"{path:>10} {size:>9} rows {measures['rows_per_second']:>12} rows/s "
+                      f"{measures['peak_rss_mib']:>8} MiB", file=sys.stderr)
+                results["ingestion"].append(measures)
+            # The reports run over the employees of the last load
+            for measures in asyncio.run(benchmark_reports(requests)):
+                print(f"{measures['endpoint']:>30} {size:>9} rows cached={measures['cached']!s:<5} "
+                      f"p50 {measures['p50_ms']} ms p99 {measures['p99_ms']} ms", file=sys.stderr)
+                results["reports"].append({"rows": size, **measures})
+            for input_path in inputs.values():
+                os.remove(input_path)
+    reset_tables(departments=True)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingestion and report benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Numbers of employees to load")
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=None,
+                        help="Ingestion paths to measure, all the available ones by default")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Requests per report endpoint and cache mode")
+    parser.add_argument("--seed", type=int, default=2021, help="Seed of the generated data")
+    parser.add_argument("--output", help="Results file, benchmarks/results/<timestamp>.json by default")
+    parser.add_argument("--force", action="store_true", help="Run even if the employees table has data")
+    # Internal, a single load run in the child process
+    parser.add_argument("--case", choices=list(PATHS), help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.input)))
+        return
+
+    paths = args.paths or [path for path in PATHS if path != "parquet" or pyarrow is not None]
+    if "parquet" in paths and pyarrow is None:
+        parser.error("the parquet path requires pyarrow")
+    results = run(args.sizes, paths, args.requests, args.seed, args.force)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Creates the database and its schema. Run it once per deployment, before starting the API:
+
+    python -m bootstrap
+"""
+import argparse
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy_utils import database_exists, create_database
+
+from database import Base, get_engine
+from models import db_models  # noqa: F401, registers the tables in Base.metadata
+from utils.log_manager import SingletonLogger
+
+# Get the logger instance
+logger = SingletonLogger().get_logger()
+
+def bootstrap(wait: float = 0) -> None:
+    """
+    Creates the database if it does not exist, then its missing tables, indexes and triggers.
+
+    It is idempotent, so it can run on every deployment.
+
+    Args:
+        wait (float): Seconds to keep retrying while the database server is not reachable.
+    """
+    engine = get_engine()
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            if not database_exists(engine.url):
+                logger.info("Creating database %s", engine.url.database)
+                create_database(engine.url)
+            break
+        except OperationalError as e:
+            if time.monotonic() >= deadline:
+                raise
+            logger.warning("Database not reachable, retrying: %s", e)
+            time.sleep(1)
+
+    Base.metadata.create_all(bind=engine)
+    logger.info("Database schema is up to date")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create the database and its schema")
+    parser.add_argument("--wait", type=float, default=30, help="Seconds to wait for the database server")
+    args = parser.parse_args()
+    try:
+        bootstrap(args.wait)
+    finally:
+        SingletonLogger().stop()
+
+if __name__ == "__main__":
+    main()
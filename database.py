@@ -1,8 +1,21 @@
 import os
+import threading
+import time
+from typing import Dict, Any, Callable, List, Mapping, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.constants import DB_POOL_EXHAUSTED_MSG, DB_REPLICA_PIN_SECONDS, DB_UNAVAILABLE_MSG, WEB_CONCURRENCY
+from prometheus_client import Counter, Gauge, Histogram
+
+from utils.metrics import histogram_snapshot, merge_histograms
+from utils.sql_timing import instrument_engine
 
 # Database connection building from environment variables
 DB_USER = os.getenv("DB_USER")
@@ -10,19 +23,189 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
-DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# The psycopg2 driver is explicit because the COPY loader relies on its copy_expert API
+DB_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Optional read-only replica serving the reports, every write goes to DB_URL
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL") or None
+# Cookie holding the time until which a client reads from the primary
+PRIMARY_PIN_COOKIE = "read_primary_until"
+
+# Connection pool settings, defaults are the SQLAlchemy ones
+# Max connections per process = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Seconds to wait for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Seconds after which a connection is replaced, -1 to never recycle
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+# Test connections with a lightweight query when they are checked out
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Seconds to wait for the server when opening a connection
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 10))
+# Connections the server processes (WEB_CONCURRENCY) may open in total, i.e. the database
+# max_connections minus those of other clients. Unset to size each pool on its own
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 0))
+
+def pool_limits(budget: int, workers: int, pool_size: int, max_overflow: int) -> Tuple[int, int]:
+    """
+    Splits a global connection budget among the worker processes.
+
+    Each process gets budget // workers connections, kept open up to pool_size and
+    the rest as overflow, so all the workers together never exceed the budget.
+
+    Args:
+        budget: Connections allowed to all the processes, 0 for no budget.
+        workers: Number of processes sharing the budget.
+        pool_size: Connections kept open per process without a budget.
+        max_overflow: Extra connections per process without a budget.
+
+    Returns:
+        The pool size and max overflow of each process.
+    """
+    if budget <= 0:
+        return pool_size, max_overflow
+    per_process = budget // workers
+    if per_process < 1:
+        raise ValueError(f"A budget of {budget} connections cannot be split among {workers} workers")
+    pool_size = min(pool_size, per_process)
+    return pool_size, per_process - pool_size
+
+DB_POOL_SIZE, DB_MAX_OVERFLOW = pool_limits(DB_CONNECTION_BUDGET, WEB_CONCURRENCY, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+
+# Time spent waiting for a connection on checkout (in seconds), by pool (primary or replica)
+pool_wait_histogram = Histogram(
+    "db_pool_wait_seconds", "Time waited for a database connection on checkout.",
+    ("pool",), buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+# Live usage of the pools, updated on every checkout and checkin. The gauges of the worker
+# processes are added up while they run
+pool_checked_out = Gauge(
+    "db_pool_checked_out", "Database connections currently checked out.", ("pool",), multiprocess_mode="livesum")
+pool_overflow = Gauge(
+    "db_pool_overflow", "Database connections opened over the pool size.", ("pool",), multiprocess_mode="livesum")
+pool_timeouts = Counter("db_pool_timeouts", "Checkouts that gave up waiting for a connection.", ("pool",))
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waits for a connection.
+
+    The wait includes opening a new connection when the pool grows, and
+    checkouts that give up after pool_timeout are counted as timeouts. Each
+    pool counts its own timeouts and labels its waits with its name.
+    """
+    # Set by _create_engine, primary or replica
+    name = "primary"
+
+    def __init__(self, *args: Any, **kw: Any):
+        super().__init__(*args, **kw)
+        self.timeouts = 0
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # Disposing the engine replaces its pool, the new one keeps the name and the timeouts
+        pool = super().recreate()
+        pool.name, pool.timeouts = self.name, self.timeouts
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            pool_timeouts.labels(self.name).inc()
+            raise
+        finally:
+            pool_wait_histogram.labels(self.name).observe(time.perf_counter() - start)
+        self.update_gauges()
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self.update_gauges()
+
+    def update_gauges(self) -> None:
+        """
+        Publishes the connections checked out and in overflow to the pool gauges.
+        """
+        pool_checked_out.labels(self.name).set(self.checkedout())
+        pool_overflow.labels(self.name).set(max(self.overflow(), 0))
 
-# Create the database engine
-engine = create_engine(DB_URL)
+def _create_engine(url: str, name: str, **options: Any) -> Engine:
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+        **options
+    )
+    engine.pool.name = name
+    engine.pool.update_gauges()
+    # Time every statement and log the slow ones
+    instrument_engine(engine)
+    return engine
 
-# Create database if doesn't exist
-if not database_exists(engine.url):
-    create_database(engine.url)
+_engine: Optional[Engine] = None
+_replica_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> Engine:
+    """
+    Returns the database engine, creating it on first use.
+
+    Creating the engine does not connect to the database, connections are opened
+    by the pool when they are first needed. The schema is created by the bootstrap
+    command (python -m bootstrap), not when the application starts.
+
+    Returns:
+        The engine of this process.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(DB_URL, "primary")
+    return _engine
+
+def get_replica_engine() -> Engine:
+    """
+    Returns the engine of the read replica (DB_REPLICA_URL), creating it on first use.
+
+    Its transactions are read-only, so a write routed to it by mistake fails instead of
+    diverging from the primary.
+
+    Returns:
+        The replica engine of this process.
+    """
+    global _replica_engine
+    if _replica_engine is None:
+        with _engine_lock:
+            if _replica_engine is None:
+                _replica_engine = _create_engine(DB_REPLICA_URL, "replica", execution_options={"postgresql_readonly": True})
+    return _replica_engine
+
+class LazySessionMaker(sessionmaker):
+    """
+    sessionmaker that binds the engine when the first session is created.
+    """
+
+    def __init__(self, engine_factory: Callable[[], Engine], **kw: Any):
+        super().__init__(**kw)
+        self.engine_factory = engine_factory
+
+    def __call__(self, **local_kw: Any) -> Any:
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_factory())
+        return super().__call__(**local_kw)
 
 # Create a session local for session management
 # autocommit = false for manual commits
 # autoflush = false for manual flush, thinking on the batch operations
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = LazySessionMaker(get_engine, autocommit=False, autoflush=False)
+# Sessions of the read replica, flagged so cached reports are kept apart from the primary ones
+ReplicaSessionLocal = LazySessionMaker(get_replica_engine, autocommit=False, autoflush=False, info={"replica": True})
 
 # Create a base class for declarative class definitions (models)
 Base = declarative_base()
@@ -43,4 +226,163 @@ def get_db():
         yield db
     finally:
         # Close the session after the request is finished
-        db.close()
\ No newline at end of file
+        db.close()
+
+def pinned_to_primary(cookies: Mapping[str, str]) -> bool:
+    """
+    Whether a client wrote recently enough to read from the primary.
+
+    Args:
+        cookies: The cookies of the request.
+
+    Returns:
+        True until DB_REPLICA_PIN_SECONDS after the last write of the client.
+    """
+    try:
+        return float(cookies.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(request: Request):
+    """
+    Creates and returns a database session for read-only endpoints, i.e. the reports.
+
+    The session uses the read replica when DB_REPLICA_URL is set, unless the client
+    is pinned to the primary after its own writes (read-your-writes).
+
+    Yields:
+        A database session object, closed after the request is finished.
+    """
+    use_replica = DB_REPLICA_URL is not None and not pinned_to_primary(request.cookies)
+    db = ReplicaSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def primary_pin_cookie(since: float) -> Optional[str]:
+    """
+    Returns the Set-Cookie value pinning a client to the primary after one of its writes.
+
+    Args:
+        since: When the write was committed, as a Unix timestamp.
+
+    Returns:
+        The cookie, valid until DB_REPLICA_PIN_SECONDS after the write, or None if that is past.
+    """
+    until = int(since) + DB_REPLICA_PIN_SECONDS
+    max_age = until - int(time.time())
+    if max_age <= 0:
+        return None
+    return f"{PRIMARY_PIN_COOKIE}={until}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware pinning the clients that write to the primary for DB_REPLICA_PIN_SECONDS.
+
+    Successful requests other than GET, HEAD and OPTIONS (uploads, batches...) set a cookie
+    with the time until which get_read_db uses the primary, so a client reading right after
+    its own upload does not see the replica lagging behind. A 202 Accepted background upload
+    has committed nothing yet, its client is pinned by the job status once the job succeeds.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400 and message["status"] != 202:
+                cookie = primary_pin_cookie(time.time())
+                # None when the pin is disabled (DB_REPLICA_PIN_SECONDS=0)
+                if cookie is not None:
+                    message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+def _pool_stats(pool: InstrumentedQueuePool) -> Dict[str, Any]:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "timeouts": pool.timeouts,
+        "wait_seconds": histogram_snapshot(pool_wait_histogram, pool=pool.name)
+    }
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Returns the configuration and live usage of the connection pool.
+
+    Returns:
+        A dictionary with the pool settings, the connections currently checked in,
+        checked out and in overflow, the checkout timeouts and the histogram of
+        checkout wait times, and the same stats of the read replica pool under
+        "replica" when DB_REPLICA_URL is set.
+    """
+    stats = {"pid": os.getpid(), **_pool_stats(get_engine().pool)}
+    if DB_REPLICA_URL is not None:
+        stats["replica"] = _pool_stats(get_replica_engine().pool)
+    return stats
+
+def check_ready() -> Optional[str]:
+    """
+    Checks that the database can serve requests, without waiting for a busy pool.
+
+    Returns:
+        None when a pooled connection answers a query, otherwise the reason it cannot.
+    """
+    pool = get_engine().pool
+    if pool.checkedout() >= pool.size() + DB_MAX_OVERFLOW:
+        return DB_POOL_EXHAUSTED_MSG
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except SQLAlchemyError:
+        return DB_UNAVAILABLE_MSG
+    return None
+
+def _merge_pools(pools: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+    # Usage of the running pools, timeouts and wait times of every pool
+    running = [pool for pool, alive in pools if alive]
+    totals = {"max_connections": sum(pool["pool_size"] + pool["max_overflow"] for pool in running)}
+    for key in ("checked_in", "checked_out", "overflow"):
+        totals[key] = sum(pool[key] for pool in running)
+    totals["timeouts"] = sum(pool["timeouts"] for pool, _ in pools)
+    wait_seconds = None
+    for pool, _ in pools:
+        wait_seconds = pool["wait_seconds"] if wait_seconds is None else merge_histograms(wait_seconds, pool["wait_seconds"])
+    totals["wait_seconds"] = wait_seconds
+    return totals
+
+def merge_pool_stats(workers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregates the pool stats published by the worker processes.
+
+    Args:
+        workers: The published stats of each worker, with its "pool" stats and whether it is "alive".
+
+    Returns:
+        The totals of the running workers, with the timeouts and wait times of exited
+        ones included, the connection budget, the totals of the read replica pools
+        under "replica" and the stats of each running worker.
+    """
+    running = [worker["pool"] for worker in workers if worker["alive"]]
+    totals = {
+        "workers": len(running),
+        "connection_budget": DB_CONNECTION_BUDGET or None,
+        **_merge_pools([(worker["pool"], worker["alive"]) for worker in workers])
+    }
+    replicas = [(worker["pool"]["replica"], worker["alive"]) for worker in workers if "replica" in worker["pool"]]
+    if replicas:
+        totals["replica"] = _merge_pools(replicas)
+    totals["per_worker"] = running
+    return totals
@@ -0,0 +1,43 @@
+"""
+Multi-process serving: gunicorn pre-forks WEB_CONCURRENCY uvicorn workers from a preloaded application.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Each worker opens at most DB_CONNECTION_BUDGET // WEB_CONCURRENCY connections, writes
+its metrics to PROMETHEUS_MULTIPROC_DIR, where /metrics adds them up (prometheus_client
+multiprocess mode), and publishes its pool usage to WORKER_STATS_DIR for /health/pool.
+"""
+import os
+import tempfile
+
+# Set before importing the application, its settings are read on import
+os.environ.setdefault("WORKER_STATS_DIR", os.path.join(tempfile.gettempdir(), "api-worker-stats"))
+# Read by prometheus_client when the first metric is created
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(os.environ["WORKER_STATS_DIR"], "metrics"))
+
+from utils.constants import WEB_CONCURRENCY  # noqa: E402
+from utils.worker_stats import clear_worker_stats, mark_worker_dead  # noqa: E402
+from database import get_engine  # noqa: E402
+from services.ingestion_service import fail_interrupted_jobs  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = WEB_CONCURRENCY
+worker_class = "uvicorn_worker.UvicornWorker"
+# The application is imported once by the master and the workers are forked from it, so they
+# start in milliseconds and share its memory pages. The database engine is created lazily,
+# after the fork, so no connection is shared between processes
+preload_app = True
+# Uploads and reports can take longer than the default 30 seconds
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", 30))
+
+def on_starting(server):
+    # The stats and metrics of a previous run would be added to this one
+    clear_worker_stats()
+    # Before any worker takes jobs, then closes the connections so none is shared with the workers
+    fail_interrupted_jobs()
+    get_engine().dispose()
+
+def child_exit(server, worker):
+    # The counters of the exited worker are still added up, its gauges are not
+    mark_worker_dead(worker.pid)
@@ -1,16 +1,26 @@
-from models import db_models
-from database import engine
+from database import DB_REPLICA_URL, ReadYourWritesMiddleware, check_ready, get_pool_stats, merge_pool_stats
 
 from routers.job_router import job_router
 from routers.department_router import dept_router
 from routers.employee_router import employee_router
+from routers.ingestion_router import ingestion_router
 
-from utils.log_manager import SingletonLogger
+from services.ingestion_service import fail_interrupted_jobs, start_ingestion_workers, stop_ingestion_workers
+from services.parallel_csv import shutdown_parse_pool
+from services.query_registry import load_queries
+from utils.compression import RequestDecompressionMiddleware
+from utils.log_manager import RequestContextMiddleware, SingletonLogger
+from utils.constants import WORKER_STATS_DIR
+from utils.metrics import RequestMetricsMiddleware, render_metrics
+from utils.worker_stats import read_worker_stats, start_stats_publisher, stop_stats_publisher, write_worker_stats
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
-# Create all database tables (if they don't exist)
-db_models.Base.metadata.create_all(bind=engine)
+# The database and its schema are created by the bootstrap command (python -m bootstrap),
+# importing the application does not connect to the database
 
 # Get the logger instance
 logger = SingletonLogger().get_logger()
@@ -22,31 +32,110 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Request bodies sent with Content-Encoding gzip or zstd are decompressed while they are read
+app.add_middleware(RequestDecompressionMiddleware)
+# With a read replica, clients read their own writes from the primary for a while
+if DB_REPLICA_URL:
+    app.add_middleware(ReadYourWritesMiddleware)
+# The request durations include the decompression
+app.add_middleware(RequestMetricsMiddleware)
+# Added last to be the outermost middleware, every record logged while handling a request has its id
+app.add_middleware(RequestContextMiddleware)
+
+def collect_worker_stats():
+    """
+    Returns the pool usage of this process, published for the other workers.
+    """
+    return {"pool": get_pool_stats()}
+
+def read_all_worker_stats():
+    """
+    Publishes the current stats of this worker and reads those of every worker.
+    """
+    write_worker_stats(collect_worker_stats())
+    return read_worker_stats()
+
 @app.on_event("startup")
 async def startup_event():
     """
-    Event handler that logs a message when the API starts.
+    Event handler that logs a message when the API starts, loads the report queries
+    and starts the background ingestion workers and the stats publisher.
     """
     logger.info("Starting API")
+    load_queries()
+    if not WORKER_STATS_DIR:
+        # With several workers, the gunicorn master does it once before forking them
+        await run_in_threadpool(fail_interrupted_jobs)
+    start_ingestion_workers()
+    start_stats_publisher(collect_worker_stats)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """
-    Event handler that logs a message when the API shuts down.
+    Event handler that logs a message when the API shuts down and stops the ingestion workers,
+    the stats publisher, the CSV parser processes and the log writer thread.
     """
     logger.info("Shutting down API")
+    await stop_ingestion_workers()
+    await stop_stats_publisher(collect_worker_stats)
+    shutdown_parse_pool()
+    SingletonLogger().stop()
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
     """
-    Simple endpoint that returns a health check status.
+    Liveness probe, it answers as long as the process serves requests and never touches the database.
 
     Returns:
         A dictionary containing a "status" key with the value "ok".
     """
     return {"status": "ok"}
 
+@app.get("/health/ready")
+def readiness_check():
+    """
+    Readiness probe, the instance should only get traffic while a pooled connection answers a query.
+
+    Returns:
+        A dictionary containing a "status" key with the value "ok", or a 503 response
+        with the reason when the database is not reachable or the pool is exhausted.
+    """
+    reason = check_ready()
+    if reason is not None:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "reason": reason})
+    return {"status": "ok"}
+
+@app.get("/health/pool")
+def pool_stats():
+    """
+    Endpoint that exposes the database connection pool usage.
+
+    Returns:
+        A dictionary with the pool settings, the connections checked in, checked out
+        and in overflow, and a histogram of the time spent waiting for a connection.
+        With several workers (WORKER_STATS_DIR), the totals of every worker and the
+        stats of each one.
+    """
+    if WORKER_STATS_DIR:
+        return merge_pool_stats(read_all_worker_stats())
+    return get_pool_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Endpoint that exposes the metrics in the Prometheus text format, added up over
+    every worker when several serve the API (PROMETHEUS_MULTIPROC_DIR).
+
+    Returns:
+        The request durations by route, the rows ingested and the batch flushes by table,
+        the database operation errors by category, the report query durations and the
+        connection pool usage.
+    """
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # Include routers for entity functionalities
 app.include_router(router=dept_router)
 app.include_router(router=job_router)
-app.include_router(router=employee_router)
\ No newline at end of file
+app.include_router(router=employee_router)
+app.include_router(router=ingestion_router)
\ No newline at end of file
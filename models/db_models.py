@@ -1,7 +1,7 @@
 from database import Base
 
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, DDL, Index, Text, event
 
 class Department(Base):
     """
@@ -41,6 +41,11 @@ class Employee(Base):
     """
     __tablename__ = "employees"
 
+    __table_args__ = (
+        # Hiring date ranges scans (i.e. a year) covering the department and job, for index only scans
+        Index("ix_employees_datetime_department_job", "datetime", "department_id", "job_id"),
+    )
+
     # Unique identifier (primary key) for the employee
     id = Column(Integer, primary_key=True, index=True)
 
@@ -51,10 +56,10 @@ class Employee(Base):
     datetime = Column(DateTime)
 
     # Foreign key referencing the ID of the department the employee belongs to
-    department_id = Column(Integer, ForeignKey("departments.id"))
+    department_id = Column(Integer, ForeignKey("departments.id"), index=True)
 
     # Foreign key referencing the ID of the job the employee holds
-    job_id = Column(Integer, ForeignKey("jobs.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
 
     # Relationship with the Department model
     # Represents a many-to-one relationship: An Employee belongs to one Department
@@ -62,4 +67,180 @@ class Employee(Base):
 
     # Relationship with the Job model
     # Represents a many-to-one relationship: An Employee holds one Job
-    job = relationship("Job", back_populates="employees")
\ No newline at end of file
+    job = relationship("Job", back_populates="employees")
+
+class HiresRollup(Base):
+    """
+    Represents the number of employees hired per department, job and quarter.
+
+    It is maintained by statement level triggers on the employees table, so every
+    insert path (ORM, COPY) keeps it up to date in the same transaction, and the
+    reports read it instead of scanning every employee.
+    """
+    __tablename__ = "hires_rollup"
+
+    __table_args__ = (
+        # The reports filter by year
+        Index("ix_hires_rollup_year", "year"),
+    )
+
+    # Department of the hired employees (no foreign key, the table is derived from employees)
+    department_id = Column(Integer, primary_key=True)
+
+    # Job of the hired employees
+    job_id = Column(Integer, primary_key=True)
+
+    # Year of the hiring date
+    year = Column(Integer, primary_key=True)
+
+    # Quarter of the hiring date (1 to 4)
+    quarter = Column(Integer, primary_key=True)
+
+    # Number of employees hired
+    hires = Column(Integer, nullable=False, default=0)
+
+class IngestionJob(Base):
+    """
+    Represents a file load running in the background ingestion workers.
+
+    Stored in the database so any API process can report its progress.
+    """
+    __tablename__ = "ingestion_jobs"
+
+    # Unique identifier of the job (UUID hex)
+    id = Column(String, primary_key=True)
+
+    # Table loaded by the job (employees, departments or jobs)
+    table = Column(String, nullable=False)
+
+    # queued, running, succeeded or failed
+    state = Column(String, nullable=False)
+
+    # Number of rows parsed and sent to the database
+    rows_processed = Column(Integer, nullable=False, default=0)
+
+    # Number of batches sent to the database, committed together when the job succeeds
+    batches_loaded = Column(Integer, nullable=False, default=0)
+
+    # Error message when the job failed
+    error = Column(String)
+
+    # Dates and times the job was queued, started and finished
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+class IngestionRejectedRow(Base):
+    """
+    Represents a record rejected by a background load run with partial=true.
+    """
+    __tablename__ = "ingestion_rejected_rows"
+
+    # Job that rejected the record
+    job_id = Column(String, ForeignKey("ingestion_jobs.id", ondelete="CASCADE"), primary_key=True)
+
+    # Position of the record in the uploaded file, starting at 1 (header excluded)
+    row = Column(Integer, primary_key=True)
+
+    # Reason the record was rejected
+    reason = Column(String, nullable=False)
+
+    # The rejected record, as JSON
+    record = Column(Text, nullable=False)
+
+# Trigger function applying the rows inserted, deleted or updated in a statement to the rollup.
+# Employees without hiring date, department or job are not part of the reports.
+HIRES_ROLLUP_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION hires_rollup_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM hires_rollup;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE hires_rollup r
+        SET hires = r.hires - o.hires
+        FROM (
+            SELECT department_id, job_id,
+                   EXTRACT(YEAR FROM datetime)::int AS year,
+                   EXTRACT(QUARTER FROM datetime)::int AS quarter,
+                   COUNT(*) AS hires
+            FROM old_rows
+            WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ) o
+        WHERE r.department_id = o.department_id AND r.job_id = o.job_id
+          AND r.year = o.year AND r.quarter = o.quarter;
+
+        DELETE FROM hires_rollup WHERE hires <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO hires_rollup (department_id, job_id, year, quarter, hires)
+        SELECT department_id, job_id,
+               EXTRACT(YEAR FROM datetime)::int,
+               EXTRACT(QUARTER FROM datetime)::int,
+               COUNT(*)
+        FROM new_rows
+        WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (department_id, job_id, year, quarter)
+        DO UPDATE SET hires = hires_rollup.hires + EXCLUDED.hires;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+# Transition tables need one trigger per event
+HIRES_ROLLUP_TRIGGERS = DDL("""
+DROP TRIGGER IF EXISTS employees_hires_rollup_insert ON employees;
+CREATE TRIGGER employees_hires_rollup_insert AFTER INSERT ON employees
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hires_rollup_refresh();
+
+DROP TRIGGER IF EXISTS employees_hires_rollup_update ON employees;
+CREATE TRIGGER employees_hires_rollup_update AFTER UPDATE ON employees
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hires_rollup_refresh();
+
+DROP TRIGGER IF EXISTS employees_hires_rollup_delete ON employees;
+CREATE TRIGGER employees_hires_rollup_delete AFTER DELETE ON employees
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION hires_rollup_refresh();
+
+DROP TRIGGER IF EXISTS employees_hires_rollup_truncate ON employees;
+CREATE TRIGGER employees_hires_rollup_truncate AFTER TRUNCATE ON employees
+    FOR EACH STATEMENT EXECUTE FUNCTION hires_rollup_refresh()
+""")
+
+# Fill the rollup from the existing employees when it is created on a populated database
+HIRES_ROLLUP_BACKFILL = DDL("""
+INSERT INTO hires_rollup (department_id, job_id, year, quarter, hires)
+SELECT department_id, job_id,
+       EXTRACT(YEAR FROM datetime)::int,
+       EXTRACT(QUARTER FROM datetime)::int,
+       COUNT(*)
+FROM employees
+WHERE datetime IS NOT NULL AND department_id IS NOT NULL AND job_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM hires_rollup)
+GROUP BY 1, 2, 3, 4
+""")
+
+@event.listens_for(Base.metadata, "after_create")
+def create_missing_indexes(target, connection, **kw):
+    """
+    Creates declared indexes missing on tables that already existed.
+
+    create_all only creates the indexes of the tables it creates, so indexes
+    added to existing models would never reach older databases.
+    """
+    for table in target.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+# Run after every table exists, the triggers reference both employees and hires_rollup
+for ddl in (HIRES_ROLLUP_FUNCTION, HIRES_ROLLUP_TRIGGERS, HIRES_ROLLUP_BACKFILL):
+    event.listen(Base.metadata, "after_create", ddl.execute_if(dialect="postgresql"))
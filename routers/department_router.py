@@ -1,12 +1,17 @@
-from typing import List
-
-from database import get_db
-from schemas.schemas import DepartmentCreate
-from services.department_service import create_departments, create_departments_csv, get_quarter_hires,get_hires_over_avg
+from database import get_db, get_read_db
+from schemas.schemas import DepartmentCreate, batch_request_body
+from services.department_service import create_departments, create_departments_csv_stream, create_departments_ndjson_stream, create_departments_file, get_quarter_hires_table, get_hires_over_avg_table, rebuild_hires_rollup
+from services.report_formats import negotiate_media_type, render_report
+from services.ingestion_service import enqueue_ingestion
+from services.file_formats import upload_format, upload_compression
+from services.utils import iter_file_chunks, spooled_file, read_json_batch
+from utils.compression import decompress_chunks
+from utils.constants import DEFAULT_REPORT_YEAR, PARALLEL_PARSE_MIN_BYTES, INGESTION_SPOOL_DIR, NOT_ACCEPTABLE_MSG, NDJSON_MEDIA_TYPE, UNSUPPORTED_FILE_FORMAT_MSG
 
 from sqlalchemy.orm import Session
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
 
 dept_router = APIRouter(
     prefix="/departments",
@@ -14,64 +19,148 @@ dept_router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@dept_router.post("/upload", description="Upload CSV to create departments")
+@dept_router.post("/upload", description="Upload a CSV, Parquet or Arrow file to create departments")
 async def upload_csv(
     file: UploadFile,
+    background: bool = False,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Uploads a CSV file containing department data and creates departments in the database.
+    Uploads a CSV, Parquet or Arrow IPC file containing department data and creates departments in the database.
 
     Args:
-        file: The uploaded CSV file containing department records.
+        file: The uploaded file (.csv, .parquet, .arrow, .feather or .ipc, optionally compressed
+              as .gz or .zst) containing department records.
+        background: Queue the load for the background workers instead of waiting for it.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
+    Returns:
+        The number of departments created successfully (the created count and the rejected rows with
+        partial=true), or with background=true a 202 Accepted response with the job id to
+        follow at /ingestion/{job_id}.
+
     Raises:
-        HTTPException: 400 Bad Request if the uploaded file is not a CSV or an error occurs during processing.
+        HTTPException: 400 Bad Request if the file format is not supported or an error occurs during processing.
     """
 
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    file_format = upload_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_FORMAT_MSG)
 
-    content = await file.read()
+    # The file is read, decompressed and inserted chunk by chunk to keep memory usage bounded
+    chunks = iter_file_chunks(file)
+    compression = upload_compression(file.filename)
+    if compression:
+        chunks = decompress_chunks(chunks, compression)
     try:
-        await create_departments_csv(content, db)
+        if background:
+            job_id = await enqueue_ingestion("departments", chunks, partial, file_format)
+            return JSONResponse(status_code=202, content={"job_id": job_id})
+        if file_format != "csv" or (file.size is not None and file.size >= PARALLEL_PARSE_MIN_BYTES):
+            # Parquet and Arrow files are read from disk, as are large CSV files, which are
+            # parsed by several processes reading byte ranges of the file
+            async with spooled_file(chunks, INGESTION_SPOOL_DIR) as path:
+                return await create_departments_file(path, db, partial=partial, file_format=file_format)
+        return await create_departments_csv_stream(chunks, db, partial=partial)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
 
-@dept_router.post("/batch", description="Create departments from a list")
+@dept_router.post("/stream", description="Create departments from a raw text/csv request body")
+async def stream_csv(
+    request: Request,
+    partial: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Creates departments from a CSV request body, parsing and inserting it while it is received.
+
+    Args:
+        request: The incoming request, with a text/csv body containing department records.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
+        db: A SQLAlchemy database session dependency.
+
+    Returns:
+        The number of departments created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
+
+    Raises:
+        HTTPException: 400 Bad Request if the body is not CSV or an error occurs during processing.
+    """
+
+    if not request.headers.get("content-type", "").startswith("text/csv"):
+        raise HTTPException(status_code=400, detail="Only text/csv request bodies are allowed")
+
+    try:
+        return await create_departments_csv_stream(request.stream(), db, partial=partial)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@dept_router.post(
+    "/batch",
+    description="Create departments from a JSON list or an application/x-ndjson stream",
+    openapi_extra=batch_request_body(DepartmentCreate)
+)
 async def batch_insert(
-    data: List[DepartmentCreate],
+    request: Request,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Creates departments in the database from a list of dictionaries representing department data.
+    Creates departments in the database from a JSON array or an NDJSON stream of department records.
+
+    An application/x-ndjson body is validated line by line while it is received and loaded
+    in batches, so its size does not bound the memory usage.
 
     Args:
-        data: A list of DepartmentCreate objects representing department data.
+        request: The incoming request, with a JSON array or one DepartmentCreate record per line.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
     Returns:
-        The number of departments created successfully.
+        The number of departments created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
 
     Raises:
-        HTTPException: If an error occurs during department creation.
+        RequestValidationError: 422 Unprocessable Entity if the JSON array is not valid.
+        HTTPException: 400 Bad Request if an NDJSON line is not valid or an error occurs during department creation.
     """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        try:
+            return await create_departments_ndjson_stream(request.stream(), db, partial=partial)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail= str(e))
+
+    data = await read_json_batch(request, DepartmentCreate)
+    try:
+        return await create_departments(data, db, partial=partial)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@dept_router.get("/quarter_hires", description="Number of employees hired for each job and department in 2021 (or the requested year) divided by quarter ordered alphabetically by department and job")
+async def quarter_hires(request: Request, year: int = DEFAULT_REPORT_YEAR, db: Session = Depends(get_read_db)):
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=NOT_ACCEPTABLE_MSG)
     try:
-        return await create_departments(data, db)
+        return render_report(await get_quarter_hires_table(db, year), media_type)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
 
-@dept_router.get("/quarter_hires", description="Number of employees hired for each job and department in 2021 divided by quarter ordered alphabetically by department and job")
-async def quarter_hires(db: Session = Depends(get_db)):
+@dept_router.get("/hires_over_avg", description="List of ids, name and number of employees hired of each department that hired more employees than the mean of employees hired in 2021 (or the requested year) for all the departments.")
+async def hires_over_avg(request: Request, year: int = DEFAULT_REPORT_YEAR, db: Session = Depends(get_read_db)):
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=NOT_ACCEPTABLE_MSG)
     try:
-        return await get_quarter_hires(db)
+        return render_report(await get_hires_over_avg_table(db, year), media_type)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
 
-@dept_router.get("/hires_over_avg", description="List of ids, name and number of employees hired of each department that hired more employees than the mean of employees hired in 2021 for all the departments.")
-async def hires_over_avg(db: Session = Depends(get_db)):
+@dept_router.post("/hires_rollup/rebuild", description="Recompute the pre-aggregated hires used by the reports for 2021 (or the requested year)")
+async def rebuild_rollup(year: int = DEFAULT_REPORT_YEAR, db: Session = Depends(get_db)):
     try:
-        return await get_hires_over_avg(db)
+        return await rebuild_hires_rollup(db, year)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
\ No newline at end of file
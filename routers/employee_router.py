@@ -1,12 +1,48 @@
-from typing import List
+from datetime import datetime
+from typing import Optional
 
 from database import get_db
-from schemas.schemas import EmployeeCreate
-from services.employee_service import create_employees, create_employees_csv
+from schemas.schemas import EmployeeCreate, batch_request_body
+from services.employee_service import (
+    create_employees,
+    create_employees_csv_stream,
+    create_employees_ndjson_stream,
+    create_employees_file,
+    validate_employees_csv_stream,
+    validate_employees_file,
+    list_employees,
+    stream_employees)
+from services.ingestion_service import enqueue_ingestion
+from services.file_formats import upload_format, upload_compression
+from services.utils import iter_file_chunks, spooled_file, read_json_batch
+from utils.compression import decompress_chunks
+from utils.constants import (
+    PARALLEL_PARSE_MIN_BYTES,
+    INGESTION_SPOOL_DIR,
+    EMPLOYEES_PAGE_SIZE,
+    EMPLOYEES_MAX_PAGE_SIZE,
+    NDJSON_MEDIA_TYPE,
+    UNSUPPORTED_FILE_FORMAT_MSG)
 
 from sqlalchemy.orm import Session
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def get_page_db(request: Request):
+    """
+    Creates and returns a database session for the paginated employee listing.
+
+    NDJSON streams read through their own session, which lives as long as the response
+    is being sent, so no session is checked out for them.
+
+    Yields:
+        A database session object closed after the request is finished, or None for NDJSON streams.
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        yield None
+    else:
+        yield from get_db()
 
 employee_router = APIRouter(
     prefix="/employees",
@@ -14,50 +50,204 @@ employee_router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@employee_router.post("/upload", description="Upload CSV to create employees")
+@employee_router.get("", description="List employees, paginated by id or streamed as NDJSON")
+async def get_employees(
+    department_id: Optional[int] = None,
+    job_id: Optional[int] = None,
+    hired_from: Optional[datetime] = None,
+    hired_to: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(EMPLOYEES_PAGE_SIZE, ge=1, le=EMPLOYEES_MAX_PAGE_SIZE),
+    db: Optional[Session] = Depends(get_page_db)
+):
+    """
+    Lists employees ordered by id, optionally filtered by department, job and hiring date range.
+
+    Pages are requested with the next_after_id of the previous page as after_id. With an
+    Accept: application/x-ndjson header every matching employee after after_id is streamed,
+    one JSON object per line, ignoring limit.
+
+    Args:
+        department_id: Only employees of this department.
+        job_id: Only employees with this job.
+        hired_from: Only employees hired at or after this date.
+        hired_to: Only employees hired before this date.
+        after_id: Only employees with a greater id.
+        limit: Maximum number of employees of the page.
+        db: A SQLAlchemy database session dependency, None when streaming NDJSON.
+
+    Returns:
+        The employees of the page and the next_after_id cursor (None on the last page),
+        or the streamed NDJSON response.
+
+    Raises:
+        HTTPException: 400 Bad Request if an error occurs while querying the employees.
+    """
+    if db is None:
+        return StreamingResponse(
+            stream_employees(department_id, job_id, hired_from, hired_to, after_id),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+
+    try:
+        return await list_employees(db, department_id, job_id, hired_from, hired_to, after_id, limit)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@employee_router.post("/upload", description="Upload a CSV, Parquet or Arrow file to create employees")
 async def upload_csv(
     file: UploadFile,
+    background: bool = False,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Uploads a CSV file containing employee data and creates employees in the database.
+    Uploads a CSV, Parquet or Arrow IPC file containing employee data and creates employees in the database.
 
     Args:
-        file: The uploaded CSV file containing employee records.
+        file: The uploaded file (.csv, .parquet, .arrow, .feather or .ipc, optionally compressed
+              as .gz or .zst) containing employee records.
+        background: Queue the load for the background workers instead of waiting for it.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
+    Returns:
+        The number of employees created successfully (the created count and the rejected rows with
+        partial=true), or with background=true a 202 Accepted response with the job id to
+        follow at /ingestion/{job_id}.
+
     Raises:
-        HTTPException: 400 Bad Request if the uploaded file is not a CSV or an error occurs during processing.
+        HTTPException: 400 Bad Request if the file format is not supported or an error occurs during processing.
     """
 
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    file_format = upload_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_FORMAT_MSG)
 
-    content = await file.read()
+    # The file is read, decompressed and inserted chunk by chunk to keep memory usage bounded
+    chunks = iter_file_chunks(file)
+    compression = upload_compression(file.filename)
+    if compression:
+        chunks = decompress_chunks(chunks, compression)
     try:
-        await create_employees_csv(content, db)
+        if background:
+            job_id = await enqueue_ingestion("employees", chunks, partial, file_format)
+            return JSONResponse(status_code=202, content={"job_id": job_id})
+        if file_format != "csv" or (file.size is not None and file.size >= PARALLEL_PARSE_MIN_BYTES):
+            # Parquet and Arrow files are read from disk, as are large CSV files, which are
+            # parsed by several processes reading byte ranges of the file
+            async with spooled_file(chunks, INGESTION_SPOOL_DIR) as path:
+                return await create_employees_file(path, db, partial=partial, file_format=file_format)
+        return await create_employees_csv_stream(chunks, db, partial=partial)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
 
-@employee_router.post("/batch", description="Create employees from a list")
+@employee_router.post("/validate", description="Report the conflicts of an employees file without loading it")
+async def validate_csv(
+    file: UploadFile,
+    db: Session = Depends(get_db)
+):
+    """
+    Checks a CSV, Parquet or Arrow IPC file of employees against the database and reports every conflict,
+    without inserting it.
+
+    Args:
+        file: The uploaded file (.csv, .parquet, .arrow, .feather or .ipc, optionally compressed
+              as .gz or .zst) containing employee records.
+        db: A SQLAlchemy database session dependency.
+
+    Returns:
+        The number of rows read and the conflicting rows (duplicate ids, unknown departments
+        or jobs) with their row number, reason and record.
+
+    Raises:
+        HTTPException: 400 Bad Request if the file format is not supported or an error occurs during processing.
+    """
+
+    file_format = upload_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_FORMAT_MSG)
+
+    chunks = iter_file_chunks(file)
+    compression = upload_compression(file.filename)
+    if compression:
+        chunks = decompress_chunks(chunks, compression)
+    try:
+        if file_format != "csv":
+            # Parquet and Arrow files are read from disk
+            async with spooled_file(chunks, INGESTION_SPOOL_DIR) as path:
+                return await validate_employees_file(path, db, file_format=file_format)
+        return await validate_employees_csv_stream(chunks, db)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@employee_router.post("/stream", description="Create employees from a raw text/csv request body")
+async def stream_csv(
+    request: Request,
+    partial: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Creates employees from a CSV request body, parsing and inserting it while it is received.
+
+    Args:
+        request: The incoming request, with a text/csv body containing employee records.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
+        db: A SQLAlchemy database session dependency.
+
+    Returns:
+        The number of employees created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
+
+    Raises:
+        HTTPException: 400 Bad Request if the body is not CSV or an error occurs during processing.
+    """
+
+    if not request.headers.get("content-type", "").startswith("text/csv"):
+        raise HTTPException(status_code=400, detail="Only text/csv request bodies are allowed")
+
+    try:
+        return await create_employees_csv_stream(request.stream(), db, partial=partial)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@employee_router.post(
+    "/batch",
+    description="Create employees from a JSON list or an application/x-ndjson stream",
+    openapi_extra=batch_request_body(EmployeeCreate)
+)
 async def batch_insert(
-    data: List[EmployeeCreate],
+    request: Request,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Creates employees in the database from a list of dictionaries representing employee data.
+    Creates employees in the database from a JSON array or an NDJSON stream of employee records.
+
+    An application/x-ndjson body is validated line by line while it is received and loaded
+    in batches, so its size does not bound the memory usage.
 
     Args:
-        data: A list of EmployeeCreate objects representing employee data.
+        request: The incoming request, with a JSON array or one EmployeeCreate record per line.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
     Returns:
-        The number of employees created successfully.
+        The number of employees created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
 
     Raises:
-        HTTPException: If an error occurs during employee creation.
+        RequestValidationError: 422 Unprocessable Entity if the JSON array is not valid.
+        HTTPException: 400 Bad Request if an NDJSON line is not valid or an error occurs during employee creation.
     """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        try:
+            return await create_employees_ndjson_stream(request.stream(), db, partial=partial)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail= str(e))
+
+    data = await read_json_batch(request, EmployeeCreate)
     try:
-        return await create_employees(data, db)
+        return await create_employees(data, db, partial=partial)
     except Exception as e:
-        raise HTTPException(status_code=400, detail= str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail= str(e))
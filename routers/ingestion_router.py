@@ -0,0 +1,51 @@
+from database import DB_REPLICA_URL, get_db, primary_pin_cookie
+from services.ingestion_service import get_ingestion_job
+from utils.constants import INGESTION_JOB_NOT_FOUND_MSG
+
+from sqlalchemy.orm import Session
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+ingestion_router = APIRouter(
+    prefix="/ingestion",
+    tags=["Ingestion"],
+    responses={404: {"description": "Not found"}}
+)
+
+@ingestion_router.get("/{job_id}", description="State and progress of a background upload")
+async def ingestion_status(
+    job_id: str,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """
+    Returns the state of an upload queued with background=true.
+
+    With a read replica, the status of a succeeded job pins the client to the primary
+    for DB_REPLICA_PIN_SECONDS after the job committed its rows, so its reports
+    include them even if the replica lags behind.
+
+    Args:
+        job_id: The job identifier returned by the upload endpoint.
+        response: The response, to set the pin cookie.
+        db: A SQLAlchemy database session dependency.
+
+    Returns:
+        The job state (queued, running, succeeded or failed), rows processed, batches
+        loaded, throughput in rows per second, error message and rows rejected by a
+        partial load.
+
+    Raises:
+        HTTPException: 404 Not Found if the job does not exist, 400 Bad Request if an error occurs.
+    """
+    try:
+        job = await get_ingestion_job(job_id, db)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=INGESTION_JOB_NOT_FOUND_MSG)
+    if DB_REPLICA_URL is not None and job["state"] == "succeeded":
+        cookie = primary_pin_cookie(job["finished_at"].timestamp())
+        if cookie:
+            response.headers.append("set-cookie", cookie)
+    return job
@@ -1,12 +1,16 @@
-from typing import List
-
 from database import get_db
-from schemas.schemas import JobCreate
-from services.job_service import create_jobs, create_jobs_csv
+from schemas.schemas import JobCreate, batch_request_body
+from services.job_service import create_jobs, create_jobs_csv_stream, create_jobs_ndjson_stream, create_jobs_file
+from services.ingestion_service import enqueue_ingestion
+from services.file_formats import upload_format, upload_compression
+from services.utils import iter_file_chunks, spooled_file, read_json_batch
+from utils.compression import decompress_chunks
+from utils.constants import PARALLEL_PARSE_MIN_BYTES, INGESTION_SPOOL_DIR, NDJSON_MEDIA_TYPE, UNSUPPORTED_FILE_FORMAT_MSG
 
 from sqlalchemy.orm import Session
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
 
 job_router = APIRouter(
     prefix="/jobs",
@@ -14,50 +18,121 @@ job_router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@job_router.post("/upload", description="Upload CSV to create jobs")
+@job_router.post("/upload", description="Upload a CSV, Parquet or Arrow file to create jobs")
 async def upload_csv(
     file: UploadFile,
+    background: bool = False,
+    partial: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Uploads a CSV, Parquet or Arrow IPC file containing job data and creates jobs in the database.
+
+    Args:
+        file: The uploaded file (.csv, .parquet, .arrow, .feather or .ipc, optionally compressed
+              as .gz or .zst) containing job records.
+        background: Queue the load for the background workers instead of waiting for it.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
+        db: A SQLAlchemy database session dependency.
+
+    Returns:
+        The number of jobs created successfully (the created count and the rejected rows with
+        partial=true), or with background=true a 202 Accepted response with the job id to
+        follow at /ingestion/{job_id}.
+
+    Raises:
+        HTTPException: 400 Bad Request if the file format is not supported or an error occurs during processing.
+    """
+
+    file_format = upload_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FILE_FORMAT_MSG)
+
+    # The file is read, decompressed and inserted chunk by chunk to keep memory usage bounded
+    chunks = iter_file_chunks(file)
+    compression = upload_compression(file.filename)
+    if compression:
+        chunks = decompress_chunks(chunks, compression)
+    try:
+        if background:
+            job_id = await enqueue_ingestion("jobs", chunks, partial, file_format)
+            return JSONResponse(status_code=202, content={"job_id": job_id})
+        if file_format != "csv" or (file.size is not None and file.size >= PARALLEL_PARSE_MIN_BYTES):
+            # Parquet and Arrow files are read from disk, as are large CSV files, which are
+            # parsed by several processes reading byte ranges of the file
+            async with spooled_file(chunks, INGESTION_SPOOL_DIR) as path:
+                return await create_jobs_file(path, db, partial=partial, file_format=file_format)
+        return await create_jobs_csv_stream(chunks, db, partial=partial)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail= str(e))
+
+@job_router.post("/stream", description="Create jobs from a raw text/csv request body")
+async def stream_csv(
+    request: Request,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Uploads a CSV file containing job data and creates jobs in the database.
+    Creates jobs from a CSV request body, parsing and inserting it while it is received.
 
     Args:
-        file: The uploaded CSV file containing job records.
+        request: The incoming request, with a text/csv body containing job records.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
+    Returns:
+        The number of jobs created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
+
     Raises:
-        HTTPException: 400 Bad Request if the uploaded file is not a CSV or an error occurs during processing.
+        HTTPException: 400 Bad Request if the body is not CSV or an error occurs during processing.
     """
 
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    if not request.headers.get("content-type", "").startswith("text/csv"):
+        raise HTTPException(status_code=400, detail="Only text/csv request bodies are allowed")
 
-    content = await file.read()
     try:
-        await create_jobs_csv(content, db)
+        return await create_jobs_csv_stream(request.stream(), db, partial=partial)
     except Exception as e:
         raise HTTPException(status_code=400, detail= str(e))
 
-@job_router.post("/batch", description="Create jobs from a list")
+@job_router.post(
+    "/batch",
+    description="Create jobs from a JSON list or an application/x-ndjson stream",
+    openapi_extra=batch_request_body(JobCreate)
+)
 async def batch_insert(
-    data: List[JobCreate],
+    request: Request,
+    partial: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Creates jobs in the database from a list of dictionaries representing job data.
+    Creates jobs in the database from a JSON array or an NDJSON stream of job records.
+
+    An application/x-ndjson body is validated line by line while it is received and loaded
+    in batches, so its size does not bound the memory usage.
 
     Args:
-        data: A list of JobCreate objects representing job data.
+        request: The incoming request, with a JSON array or one JobCreate record per line.
+        partial: Commit the valid rows and report the rejected ones instead of rolling back everything.
         db: A SQLAlchemy database session dependency.
 
     Returns:
-        The number of jobs created successfully.
+        The number of jobs created successfully, or with partial=true the created count and
+        the rejected rows with their row number and reason.
 
     Raises:
-        HTTPException: If an error occurs during job creation.
+        RequestValidationError: 422 Unprocessable Entity if the JSON array is not valid.
+        HTTPException: 400 Bad Request if an NDJSON line is not valid or an error occurs during job creation.
     """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        try:
+            return await create_jobs_ndjson_stream(request.stream(), db, partial=partial)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail= str(e))
+
+    data = await read_json_batch(request, JobCreate)
     try:
-        return await create_jobs(data, db)
+        return await create_jobs(data, db, partial=partial)
     except Exception as e:
-        raise HTTPException(status_code=400, detail= str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail= str(e))
@@ -1,3 +1,5 @@
+from typing import Any, Dict, Type
+
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -23,4 +25,19 @@ class EmployeeCreate(BaseModel):
     name: str
     datetime: datetime
     department_id: int
-    job_id: int
\ No newline at end of file
+    job_id: int
+
+def batch_request_body(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Returns the OpenAPI request body of a /batch endpoint, a JSON array or NDJSON records.
+    """
+    schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": schema}},
+                "application/x-ndjson": {"schema": schema}
+            }
+        }
+    }
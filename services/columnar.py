@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Iterator, Sequence, Tuple, Union
+
+from sqlalchemy import DateTime, Integer, Table
+
+def to_columns(records: List[Dict[str, Any]], columns: List[str]) -> Dict[str, List[Any]]:
+    """
+    Turns a batch of records into one list of values per column.
+
+    Missing fields are None, like in a CSV row with fewer fields than columns.
+
+    Args:
+        records (List[Dict[str, Any]]): The records of the batch.
+        columns (List[str]): The column names, in table order.
+
+    Returns:
+        Dict[str, List[Any]]: The values of each column, in record order.
+
+    Raises:
+        TypeError: If a record has fields that are not columns (i.e. extra CSV fields).
+    """
+    expected = set(columns)
+    for record in records:
+        if not expected.issuperset(record):
+            raise TypeError(f"Unexpected fields: {set(record) - expected}")
+    return {column: [record.get(column) for record in records] for column in columns}
+
+def empty_to_none(values: List[Any]) -> List[Any]:
+    """
+    Replaces the empty or blank strings of a column with None.
+    """
+    return [None if value is None or (type(value) is str and not value.strip()) else value for value in values]
+
+def _parse_integers(values: List[Any]) -> List[Any]:
+    try:
+        return [int(value) if type(value) is str else value for value in values]
+    except ValueError as e:
+        raise TypeError(f"Invalid integer value: {e}")
+
+def _parse_datetime(value: str) -> Any:
+    # Python 3.10 fromisoformat does not accept the Z suffix
+    text = value[:-1] + "+00:00" if value.endswith("Z") else value
+    try:
+        # PostgreSQL ignores the offset of a literal stored in a timestamp without
+        # time zone column, the parsed value is kept naive to store the same time
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        # Other formats accepted by PostgreSQL are sent as text, it remains the judge
+        return value
+
+def _parse_datetimes(values: List[Any]) -> List[Any]:
+    return [_parse_datetime(value) if type(value) is str else value for value in values]
+
+def column_converters(table: Table) -> Dict[str, List[Callable[[List[Any]], List[Any]]]]:
+    """
+    Returns the conversions applied to the values of each column of a table.
+
+    Args:
+        table (Table): The table the batches are loaded into.
+
+    Returns:
+        Dict[str, List[Callable[[List[Any]], List[Any]]]]: The functions to apply, in order,
+                                                           to the list of values of each column.
+    """
+    converters = {}
+    for column in table.columns:
+        steps = []
+        if column.nullable:
+            steps.append(empty_to_none)
+        if isinstance(column.type, Integer):
+            steps.append(_parse_integers)
+        elif isinstance(column.type, DateTime):
+            steps.append(_parse_datetimes)
+        converters[column.key] = steps
+    return converters
+
+def coerce_column(table: Table, name: str, values: List[Any]) -> List[Any]:
+    """
+    Converts the values of a single column to the Python type of the table column.
+
+    Args:
+        table (Table): The table the batch is loaded into.
+        name (str): The column name.
+        values (List[Any]): The values of the column.
+
+    Returns:
+        List[Any]: The converted values, values already converted are kept as they are.
+
+    Raises:
+        TypeError: If a value of an integer column is not an integer.
+    """
+    for step in column_converters(table)[name]:
+        values = step(values)
+    return values
+
+def coerce_columns(table: Table, columns: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    """
+    Converts the column lists of a batch to the Python types of the table columns.
+
+    Each conversion runs once per column over the whole list instead of once per
+    field of every record: empty values of nullable columns become None, integer
+    columns are parsed with int and datetime columns with datetime.fromisoformat.
+
+    Args:
+        table (Table): The table the batch is loaded into.
+        columns (Dict[str, List[Any]]): The values of each column.
+
+    Returns:
+        Dict[str, List[Any]]: The converted values of each column.
+
+    Raises:
+        TypeError: If a value of an integer column is not an integer.
+    """
+    converted = {}
+    for name, steps in column_converters(table).items():
+        values = columns[name]
+        for step in steps:
+            values = step(values)
+        converted[name] = values
+    return converted
+
+def column_rows(columns: Dict[str, List[Any]]) -> Iterator[Tuple[Any, ...]]:
+    """
+    Iterates over the rows of a columnar batch, as tuples in column order.
+
+    Args:
+        columns (Dict[str, List[Any]]): The values of each column.
+
+    Returns:
+        Iterator[Tuple[Any, ...]]: The value tuple of each record.
+    """
+    return zip(*columns.values())
+
+class ColumnBatch:
+    """
+    A batch of records stored as one list of values per column.
+
+    It is sliced and indexed like a list of records, so the validation, the loaders and
+    the partial loads share the column lists of a batch. Indexing builds the dictionary
+    of a single record, i.e. to report a rejected one.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), []))
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Dict[str, Any], "ColumnBatch"]:
+        if isinstance(key, slice):
+            return ColumnBatch({name: values[key] for name, values in self.columns.items()})
+        return {name: values[key] for name, values in self.columns.items()}
+
+    def take(self, indexes: Sequence[int]) -> "ColumnBatch":
+        """
+        Returns the records at the given positions, in that order.
+        """
+        return ColumnBatch({name: [values[index] for index in indexes] for name, values in self.columns.items()})
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        Iterates over the value tuple of each record, in column order.
+        """
+        return column_rows(self.columns)
+
+def column_batch(records: Union[List[Dict[str, Any]], ColumnBatch], columns: List[str]) -> ColumnBatch:
+    """
+    Turns a batch of records into a ColumnBatch, unless it already is one.
+
+    Raises:
+        TypeError: If a record has fields that are not columns (i.e. extra CSV fields).
+    """
+    if isinstance(records, ColumnBatch):
+        return records
+    return ColumnBatch(to_columns(records, columns))
@@ -0,0 +1,221 @@
+import csv
+import functools
+import time
+from io import StringIO
+from typing import Dict, Any, List, AsyncIterable, Awaitable, Callable, Optional, Sequence, Union
+
+import psycopg2
+from psycopg2.extras import execute_values
+from sqlalchemy import String, Table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+
+from services.columnar import ColumnBatch, column_batch, empty_to_none, column_rows
+from services.partial_load import Batch, save_partially, drop_rejected
+from services.preflight import conflicts_error
+from utils.cache import report_cache
+from utils.metrics import batch_flush_duration, batch_flush_rows, rows_ingested, timed
+from utils.sql_timing import observe_statement, set_batch
+
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+def build_copy_statement(table: Table, db: Session) -> str:
+    """
+    Builds the COPY FROM STDIN statement used to load CSV rows into a table.
+
+    Text columns that cannot be null are listed in FORCE_NOT_NULL, so an empty
+    value is stored as an empty string, like the ORM does, instead of NULL.
+
+    Args:
+        table (Table): The table to load.
+        db (Session): The SQLAlchemy database session, used to quote identifiers.
+
+    Returns:
+        str: The COPY statement.
+    """
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    columns = ", ".join(quote(column.name) for column in table.columns)
+    options = ["FORMAT csv"]
+    not_null_text = [quote(column.name) for column in table.columns
+                     if not column.nullable and not column.primary_key and isinstance(column.type, String)]
+    if not_null_text:
+        options.append(f"FORCE_NOT_NULL ({', '.join(not_null_text)})")
+    return f"COPY {quote(table.name)} ({columns}) FROM STDIN WITH ({', '.join(options)})"
+
+def records_to_csv(table: Table, records: Batch) -> StringIO:
+    """
+    Serializes records in the CSV layout expected by the COPY statement.
+
+    Empty values in nullable columns are written as NULL.
+
+    Args:
+        table (Table): The table the records belong to.
+        records (Batch): The records to serialize, as a list or as column lists.
+
+    Returns:
+        StringIO: A buffer with one CSV line per record, positioned at the start.
+
+    Raises:
+        TypeError: If a record has fields that are not columns of the table.
+    """
+    # A copy, the column lists of the batch are shared with the validation and the retries
+    columns = dict(column_batch(records, table.columns.keys()).columns)
+    for column in table.columns:
+        if column.nullable:
+            columns[column.key] = empty_to_none(columns[column.key])
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(column_rows(columns))
+    buffer.seek(0)
+    return buffer
+
+def copy_records(table: Table, records: Batch, db: Session) -> None:
+    """
+    Loads a batch of records into a table using PostgreSQL COPY FROM STDIN.
+
+    The COPY runs on the connection of the session, inside its transaction, so it
+    is committed or rolled back together with the rest of the session work.
+    Driver errors are translated to the SQLAlchemy exceptions handled by db_operation.
+
+    Args:
+        table (Table): The table to load.
+        records (Batch): The records of the batch, as a list or as column lists.
+        db (Session): The SQLAlchemy database session.
+
+    Raises:
+        TypeError: If a record has fields that are not columns of the table.
+        DBAPIError: If PostgreSQL rejects the data (IntegrityError, DataError, ...).
+    """
+    if not len(records):
+        return
+
+    statement = build_copy_statement(table, db)
+    buffer = records_to_csv(table, records)
+    connection = db.connection()
+    cursor = connection.connection.cursor()
+    start = time.perf_counter()
+    try:
+        cursor.copy_expert(statement, buffer)
+        # COPY does not go through the engine events, its duration is recorded here
+        observe_statement(statement, time.perf_counter() - start)
+    except psycopg2.Error as e:
+        raise DBAPIError.instance(statement, None, e, psycopg2.Error, dialect=connection.dialect) from e
+    finally:
+        cursor.close()
+
+def insert_rows(table: Table, batch: ColumnBatch, db: Session) -> None:
+    """
+    Inserts a batch of converted column lists with multi-row INSERT statements.
+
+    The value tuples of the batch are bound as they are, without building a
+    dictionary per record. Like COPY, the statement runs on the connection of the
+    session, inside its transaction.
+
+    Args:
+        table (Table): The table to load.
+        batch (ColumnBatch): The values of each column, already converted to Python types.
+        db (Session): The SQLAlchemy database session.
+
+    Raises:
+        DBAPIError: If PostgreSQL rejects the data (IntegrityError, DataError, ...).
+    """
+    if not len(batch):
+        return
+
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    names = ", ".join(quote(name) for name in batch.columns)
+    statement = f"INSERT INTO {quote(table.name)} ({names}) VALUES %s"
+    connection = db.connection()
+    cursor = connection.connection.cursor()
+    start = time.perf_counter()
+    try:
+        execute_values(cursor, statement, batch.rows(), page_size=len(batch))
+        # The statement does not go through the engine events, its duration is recorded here
+        observe_statement(statement, time.perf_counter() - start)
+    except psycopg2.Error as e:
+        raise DBAPIError.instance(statement, None, e, psycopg2.Error, dialect=connection.dialect) from e
+    finally:
+        cursor.close()
+
+def _to_column_batch(table: Table, batch: List[Dict[str, Any]]) -> Batch:
+    try:
+        return column_batch(batch, table.columns.keys())
+    except TypeError:
+        # Records with extra fields are left to the loader, which rejects them
+        return batch
+
+async def copy_batches(
+    table: Table,
+    batches: AsyncIterable[List[Dict[str, Any]]],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False,
+    validate: Optional[Callable[[Batch, Sequence[int]], List[Dict[str, Any]]]] = None
+) -> Union[int, Dict[str, Any]]:
+    """
+    Loads batches of records with COPY as they arrive and commits them at the end.
+
+    Each batch is converted to column lists once, shared by the validation and the COPY.
+
+    Args:
+        table (Table): The table to load.
+        batches (AsyncIterable[List[Dict[str, Any]]]): The parsed records, batch by batch.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Load each batch under a savepoint and reject the failing records
+                        instead of rolling back the whole load.
+        validate (Optional[Callable[[Batch, Sequence[int]], List[Dict[str, Any]]]]):
+            Pre-flight validation run on each batch before loading it, returning the
+            conflicting records with their row number and reason.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of records loaded or, when partial, a dictionary
+                                    with the records created and the rejected ones.
+
+    Raises:
+        ProcessingError: If the validation finds conflicts and the load is not partial, listing them
+                         after validating the whole upload.
+    """
+    count = 0
+    rejected = []
+    number = 0
+    async for batch in batches:
+        number += 1
+        # The statements of the batch are attributed to it in the slow query log
+        set_batch(number)
+        size = len(batch)
+        # Position of each record in the upload, to report the rejected ones
+        rows = range(count + 1, count + 1 + size)
+        batch = await run_in_threadpool(_to_column_batch, table, batch)
+        if validate:
+            conflicts = await run_in_threadpool(validate, batch, rows)
+            rejected.extend(conflicts)
+            if rejected and not partial:
+                # The load fails, the rest of the upload is only validated to report every conflict
+                count += size
+                continue
+            batch, rows = drop_rejected(batch, rows, conflicts)
+
+        batch_flush_rows.labels(table.name).observe(len(batch))
+        with timed(batch_flush_duration.labels(table.name)):
+            if partial:
+                save = functools.partial(copy_records, table)
+                rejected.extend(await run_in_threadpool(save_partially, batch, rows, save, db))
+            else:
+                await run_in_threadpool(copy_records, table, batch, db)
+        count += size
+        if progress:
+            await progress(size)
+
+    if rejected and not partial:
+        raise conflicts_error(rejected)
+    await run_in_threadpool(db.commit)  # Commit all changes at the end
+    report_cache.bump_generation()  # Cached reports are outdated after new data is committed
+    rows_ingested.labels(table.name).inc(count - len(rejected))
+    if partial:
+        return {"created": count - len(rejected), "rejected": sorted(rejected, key=lambda item: item["row"])}
+    return count
@@ -1,20 +1,25 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterable, Awaitable, Callable, Optional, Union
 
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 
 from models.db_models import Department
-from services.utils import process_csv
+from schemas.schemas import DepartmentCreate
+from services.copy_loader import copy_batches
+from services.file_formats import file_batches
+from services.partial_load import partial_result, save_partially
+from services.query_registry import execute_query
+from services.report_formats import ReportTable
+from services.utils import process_csv, stream_csv, stream_ndjson
 from utils.constants import *
+from utils.cache import cached_report, report_cache
 from utils.decorators import db_operation
 from utils.log_manager import SingletonLogger
+from utils.metrics import batch_flush_duration, batch_flush_rows, rows_ingested, report_query_duration, timed
+from utils.sql_timing import set_batch
 
 # Ensure type safety
 logger = SingletonLogger().get_logger()
 
-# Get queries dir
-QUERY_DIR = os.path.join(os.path.dirname(__file__), 'queries')
-
 async def create_departments_csv(file_content: bytes, db: Session) -> int:
     """
     Creates departments from a CSV file.
@@ -30,7 +35,102 @@ async def create_departments_csv(file_content: bytes, db: Session) -> int:
     return await create_departments(records, db)
 
 @db_operation
-async def create_departments(data: List[Dict[str, Any]], db: Session) -> int:
+async def create_departments_csv_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates departments from a CSV byte stream, loading each batch with COPY as soon as it is parsed.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The content of the CSV file, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of departments created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_csv(chunks, Department.__table__.columns.keys())
+    return await copy_batches(Department.__table__, batches, db, progress, partial)
+
+@db_operation
+async def create_departments_ndjson_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates departments from an NDJSON byte stream, validating each line as it arrives and
+    loading each batch with COPY as soon as it is complete.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The NDJSON content, one department per line, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of departments created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a line is not a valid department, a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_ndjson(chunks, DepartmentCreate)
+    return await copy_batches(Department.__table__, batches, db, progress, partial)
+
+@db_operation
+async def create_departments_file(
+    path: str,
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False,
+    file_format: str = "csv"
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates departments from a CSV, Parquet or Arrow IPC file on disk.
+
+    Large CSV files are parsed in the parser processes, Parquet and Arrow files are
+    read as typed record batches without parsing text.
+
+    Args:
+        path (str): Path of the file.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+        file_format (str): csv, parquet or arrow.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of departments created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = file_batches(path, file_format, Department.__table__.columns.keys())
+    return await copy_batches(Department.__table__, batches, db, progress, partial)
+
+def _save_departments(batch: List[Dict[str, Any]], db: Session) -> None:
+    """
+    Adds a batch of departments to the session and flushes it to the database.
+
+    Args:
+        batch (List[Dict[str, Any]]): Department records of a single batch.
+        db (Session): The SQLAlchemy database session.
+    """
+    db.bulk_save_objects([Department(**item) for item in batch])
+    db.flush()  # Flush after each batch to persist to database
+
+@db_operation
+def create_departments(data: List[Dict[str, Any]], db: Session, partial: bool = False) -> Union[int, Dict[str, Any]]:
     """
     Creates departments in the database in batches.
 
@@ -38,91 +138,128 @@ async def create_departments(data: List[Dict[str, Any]], db: Session) -> int:
         data (List[Dict[str, Any]]): A list of dictionaries, where each dictionary
                                     represents a department record.
         db (Session): The SQLAlchemy database session.
+        partial (bool): Save each batch under a savepoint and reject the failing records
+                        instead of rolling back every batch.
 
     Returns:
-        int: The number of departments created successfully.
+        Union[int, Dict[str, Any]]: The number of departments created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows,
+                                    with their row number, reason and record.
 
     Raises:
         Exception: If a duplicate record is found or an error occurs during processing.
     """
+    rejected = []
+    # Position of each record in the upload, to report the rejected ones
+    rows = range(1, len(data) + 1)
     for i in range(0, len(data), BATCH_SIZE):
+        set_batch(i // BATCH_SIZE + 1)
         batch = data[i:i + BATCH_SIZE]
-        departments = [Department(**item) for item in batch]
-        db.bulk_save_objects(departments)
-        db.flush()  # Flush after each batch to persist to database
+        batch_flush_rows.labels(Department.__tablename__).observe(len(batch))
+        with timed(batch_flush_duration.labels(Department.__tablename__)):
+            if partial:
+                rejected.extend(save_partially(batch, rows[i:i + BATCH_SIZE], _save_departments, db))
+            else:
+                _save_departments(batch, db)
 
     db.commit()  # Commit all changes at the end
+    report_cache.bump_generation()  # Cached reports are outdated after new data is committed
+    rows_ingested.labels(Department.__tablename__).inc(len(data) - len(rejected))
+    if partial:
+        return partial_result(data, rejected)
     return len(data)
 
+@cached_report
 @db_operation
-async def get_quarter_hires(db: Session) -> List[Dict[str, Any]]:
+def get_quarter_hires_table(db: Session, year: int = DEFAULT_REPORT_YEAR) -> ReportTable:
     """
-    Executes the SQL query to fetch the number of hires per quarter from the database for the 2021 year.
+    Executes the SQL query to fetch the number of hires per quarter from the database for a year.
 
     Args:
         db (Session): SQLAlchemy database session used to interact with the database.
+        year (int): The year to report, 2021 by default.
 
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries containing the results of the query.
-                              Each dictionary represents a row in the result set.
+        ReportTable: The column names and a tuple per row of the result set.
 
     Raises:
         Exception: If errors occur. Specific cases are catched and logged
     """
-    query_file = os.path.join(QUERY_DIR, 'quarters_hires.sql')
+    # Execute the prepared query, the rows are fetched inside the timed block
+    with timed(report_query_duration.labels("quarter_hires")):
+        result = execute_query('quarters_hires', db, {"year": year})
+        return ReportTable(tuple(result.keys()), tuple(tuple(row) for row in result))
 
-    try:
-        # Read the query from the file
-        with open(query_file, 'r') as file:
-            query = file.read()
-    except FileNotFoundError:
-        logger.error(f"Query file {query_file} not found.")
-        raise Exception(GENERIC_ERROR_MSG)
-    except IOError as e:
-        logger.error(f"Error reading the query file {query_file}: {e}")
-        raise Exception(GENERIC_ERROR_MSG)
-
-    # Execute the query
-    result = db.execute(text(query))
+async def get_quarter_hires(db: Session, year: int = DEFAULT_REPORT_YEAR) -> List[Dict[str, Any]]:
+    """
+    Number of hires per quarter for each department and job in a year, as dictionaries.
 
-    # Convert the result into a list of dictionaries (explicit column mapping)
-    column_names = result.keys()  # Retrieve column names from the query result
+    Args:
+        db (Session): SQLAlchemy database session used to interact with the database.
+        year (int): The year to report, 2021 by default.
 
-    return [dict(zip(column_names, row)) for row in result]
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries containing the results of the query.
+                              Each dictionary represents a row in the result set.
+    """
+    return (await get_quarter_hires_table(db, year)).records()
 
+@cached_report
 @db_operation
-async def get_hires_over_avg(db: Session) -> List[Dict[str, Any]]:
+def get_hires_over_avg_table(db: Session, year: int = DEFAULT_REPORT_YEAR) -> ReportTable:
     """
     List of ids, name and number of employees hired of each department that hired more
-    employees than the mean of employees hired in 2021 for all the departments.
+    employees than the mean of employees hired in a year (2021 by default) for all the departments.
 
     Args:
         db (Session): SQLAlchemy database session used to interact with the database.
+        year (int): The year to report, 2021 by default.
 
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries containing the results of the query.
-                              Each dictionary represents a row in the result set.
+        ReportTable: The column names and a tuple per row of the result set.
 
     Raises:
         Exception: If errors occur. Specific cases are catched and logged
     """
-    query_file = os.path.join(QUERY_DIR, 'hires_over_avg.sql')
+    # Execute the prepared query, the rows are fetched inside the timed block
+    with timed(report_query_duration.labels("hires_over_avg")):
+        result = execute_query('hires_over_avg', db, {"year": year})
+        return ReportTable(tuple(result.keys()), tuple(tuple(row) for row in result))
 
-    try:
-        # Read the query from the file
-        with open(query_file, 'r') as file:
-            query = file.read()
-    except FileNotFoundError:
-        logger.error(f"Query file {query_file} not found.")
-        raise Exception(GENERIC_ERROR_MSG)
-    except IOError as e:
-        logger.error(f"Error reading the query file {query_file}: {e}")
-        raise Exception(GENERIC_ERROR_MSG)
+async def get_hires_over_avg(db: Session, year: int = DEFAULT_REPORT_YEAR) -> List[Dict[str, Any]]:
+    """
+    Departments that hired more employees than the mean in a year, as dictionaries.
 
-    # Execute the query
-    result = db.execute(text(query))
+    Args:
+        db (Session): SQLAlchemy database session used to interact with the database.
+        year (int): The year to report, 2021 by default.
+
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries containing the results of the query.
+                              Each dictionary represents a row in the result set.
+    """
+    return (await get_hires_over_avg_table(db, year)).records()
+
+@db_operation
+def rebuild_hires_rollup(db: Session, year: int = DEFAULT_REPORT_YEAR) -> int:
+    """
+    Recomputes the hires rollup of a year from the employees table.
 
-    # Convert the result into a list of dictionaries (explicit column mapping)
-    column_names = result.keys()  # Retrieve column names from the query result
+    The triggers keep the rollup up to date, this repairs it after loads that bypass
+    them (i.e. restores with triggers disabled). It reads the employees of the year
+    through a range scan on the hiring date index.
 
-    return [dict(zip(column_names, row)) for row in result]
\ No newline at end of file
+    Args:
+        db (Session): SQLAlchemy database session used to interact with the database.
+        year (int): The year to rebuild, 2021 by default.
+
+    Returns:
+        int: The number of rollup rows written for the year.
+
+    Raises:
+        Exception: If errors occur. Specific cases are catched and logged
+    """
+    result = execute_query('rebuild_hires_rollup', db, {"year": year})
+    db.commit()
+    report_cache.bump_generation()  # Cached reports are outdated after new data is committed
+    return result.rowcount
@@ -1,14 +1,27 @@
-from typing import Dict, Any, List
+import json
+from datetime import datetime
+from typing import Dict, Any, List, AsyncIterable, Awaitable, Callable, Iterator, Optional, Union
 
 from sqlalchemy.exc import IntegrityError, OperationalError, DatabaseError
-from sqlalchemy.inspection import inspect
+from sqlalchemy import select, Select
 from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 
+from database import SessionLocal
 from models.db_models import Employee
-from services.utils import process_csv
+from schemas.schemas import EmployeeCreate
+from services.columnar import ColumnBatch, column_batch, coerce_columns
+from services.copy_loader import copy_batches, insert_rows
+from services.file_formats import file_batches
+from services.partial_load import Batch, partial_result, save_partially, drop_rejected
+from services.preflight import conflicts_error, employee_validator
+from services.utils import process_csv, stream_csv, stream_ndjson
 from utils.constants import *
+from utils.cache import report_cache
 from utils.decorators import db_operation
 from utils.log_manager import SingletonLogger
+from utils.metrics import batch_flush_duration, batch_flush_rows, rows_ingested, timed
+from utils.sql_timing import set_batch
 
 # Ensure type safety
 logger = SingletonLogger().get_logger()
@@ -28,7 +41,165 @@ async def create_employees_csv(file_content: bytes, db: Session) -> int:
     return await create_employees(records, db)
 
 @db_operation
-async def create_employees(data: List[Dict[str, Any]], db: Session) -> int:
+async def create_employees_csv_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates employees from a CSV byte stream, loading each batch with COPY as soon as it is parsed.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The content of the CSV file, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of employees created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_csv(chunks, Employee.__table__.columns.keys())
+    return await copy_batches(Employee.__table__, batches, db, progress, partial, employee_validator(db))
+
+@db_operation
+async def create_employees_ndjson_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates employees from an NDJSON byte stream, validating each line as it arrives and
+    loading each batch with COPY as soon as it is complete.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The NDJSON content, one employee per line, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of employees created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a line is not a valid employee, a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_ndjson(chunks, EmployeeCreate)
+    return await copy_batches(Employee.__table__, batches, db, progress, partial, employee_validator(db))
+
+@db_operation
+async def create_employees_file(
+    path: str,
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False,
+    file_format: str = "csv"
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates employees from a CSV, Parquet or Arrow IPC file on disk.
+
+    Large CSV files are parsed in the parser processes, Parquet and Arrow files are
+    read as typed record batches without parsing text.
+
+    Args:
+        path (str): Path of the file.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+        file_format (str): csv, parquet or arrow.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of employees created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = file_batches(path, file_format, Employee.__table__.columns.keys())
+    return await copy_batches(Employee.__table__, batches, db, progress, partial, employee_validator(db))
+
+async def _validate_employee_batches(batches: AsyncIterable[Batch], db: Session) -> Dict[str, Any]:
+    """
+    Reports every conflict of batches of employees without inserting anything.
+    """
+    validate = employee_validator(db)
+    count = 0
+    conflicts = []
+    async for batch in batches:
+        conflicts.extend(await run_in_threadpool(validate, batch, range(count + 1, count + 1 + len(batch))))
+        count += len(batch)
+    return {"rows": count, "conflicts": conflicts}
+
+@db_operation
+async def validate_employees_csv_stream(chunks: AsyncIterable[bytes], db: Session) -> Dict[str, Any]:
+    """
+    Reports every conflict of a CSV byte stream of employees without inserting anything.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The content of the CSV file, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+
+    Returns:
+        Dict[str, Any]: The number of rows read and the conflicting ones (duplicate ids and
+                        unknown departments or jobs), with their row number, reason and record.
+    """
+    return await _validate_employee_batches(stream_csv(chunks, Employee.__table__.columns.keys()), db)
+
+@db_operation
+async def validate_employees_file(path: str, db: Session, file_format: str = "csv") -> Dict[str, Any]:
+    """
+    Reports every conflict of a CSV, Parquet or Arrow IPC file of employees without inserting anything.
+
+    Args:
+        path (str): Path of the file.
+        db (Session): The SQLAlchemy database session.
+        file_format (str): csv, parquet or arrow.
+
+    Returns:
+        Dict[str, Any]: The number of rows read and the conflicting ones (duplicate ids and
+                        unknown departments or jobs), with their row number, reason and record.
+    """
+    return await _validate_employee_batches(file_batches(path, file_format, Employee.__table__.columns.keys()), db)
+
+def _employee_columns(batch: Batch) -> ColumnBatch:
+    """
+    Converts employee records to column lists of Python values, column by column.
+
+    Raises:
+        TypeError: If a record has unexpected fields or invalid integer values.
+    """
+    if isinstance(batch, ColumnBatch):
+        return batch
+    table = Employee.__table__
+    return ColumnBatch(coerce_columns(table, column_batch(batch, table.columns.keys()).columns))
+
+def _save_employees(batch: Batch, db: Session) -> None:
+    """
+    Inserts a batch of employees.
+
+    The batch is converted to one list per column, so empty values, integers and
+    datetimes are converted column by column instead of building an ORM object per
+    record, and the row tuples are sent in a single multi-row insert.
+
+    Args:
+        batch (Batch): Employee records of a single batch, or their converted column lists.
+        db (Session): The SQLAlchemy database session.
+
+    Raises:
+        TypeError: If a record has unexpected fields or invalid integer values.
+    """
+    if not len(batch):
+        return
+    insert_rows(Employee.__table__, _employee_columns(batch), db)
+
+@db_operation
+def create_employees(data: List[Dict[str, Any]], db: Session, partial: bool = False) -> Union[int, Dict[str, Any]]:
     """
     Creates employees in the database in batches.
 
@@ -36,26 +207,157 @@ async def create_employees(data: List[Dict[str, Any]], db: Session) -> int:
         data (List[Dict[str, Any]]): A list of dictionaries, where each dictionary
                                     represents a employee record.
         db (Session): The SQLAlchemy database session.
+        partial (bool): Save each batch under a savepoint and reject the failing records
+                        instead of rolling back every batch.
 
     Returns:
-        int: The number of employees created successfully.
+        Union[int, Dict[str, Any]]: The number of employees created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows,
+                                    with their row number, reason and record.
 
     Raises:
         Exception: If a duplicate record is found or an error occurs during processing.
     """
-    nullable_columns = [column.key for column in inspect(Employee).columns if column.nullable]
-    for i in range(0, len(data), BATCH_SIZE):
-        batch = data[i:i + BATCH_SIZE]
-        # Replace empty values in nullable columns for None
-        employees = [
-            Employee(**{
-                key: (None if isinstance(value, str) and value.strip() == "" and key in nullable_columns else value)
-                for key, value in item.items()
-            })
-            for item in batch
-        ]
-        db.bulk_save_objects(employees)
-        db.flush()  # Flush after each batch to persist to database
+    # Position of each record in the upload, to report the rejected ones
+    rows = range(1, len(data) + 1)
+    # Converted once, the validation and the inserts share the column lists
+    try:
+        records = _employee_columns(data)
+    except TypeError:
+        # Malformed records are left to the inserts, which reject them batch by batch
+        records = data
+    # Every conflict with the database or inside the upload is found in a single query
+    rejected = employee_validator(db)(records, rows)
+    if rejected and not partial:
+        raise conflicts_error(rejected)
+    records, rows = drop_rejected(records, rows, rejected)
+
+    for i in range(0, len(records), BATCH_SIZE):
+        set_batch(i // BATCH_SIZE + 1)
+        batch = records[i:i + BATCH_SIZE]
+        batch_flush_rows.labels(Employee.__tablename__).observe(len(batch))
+        with timed(batch_flush_duration.labels(Employee.__tablename__)):
+            if partial:
+                rejected.extend(save_partially(batch, rows[i:i + BATCH_SIZE], _save_employees, db))
+            else:
+                _save_employees(batch, db)
 
     db.commit()  # Commit all changes at the end
+    report_cache.bump_generation()  # Cached reports are outdated after new data is committed
+    rows_ingested.labels(Employee.__tablename__).inc(len(data) - len(rejected))
+    if partial:
+        return partial_result(data, rejected)
     return len(data)
+
+def _employees_query(
+    department_id: Optional[int] = None,
+    job_id: Optional[int] = None,
+    hired_from: Optional[datetime] = None,
+    hired_to: Optional[datetime] = None,
+    after_id: Optional[int] = None
+) -> Select:
+    """
+    Builds the query listing employees by id, with the optional filters.
+
+    Columns are selected instead of the Employee entity, so walking the rows does
+    not fill the identity map of the session.
+
+    Args:
+        department_id (Optional[int]): Only employees of this department.
+        job_id (Optional[int]): Only employees with this job.
+        hired_from (Optional[datetime]): Only employees hired at or after this date.
+        hired_to (Optional[datetime]): Only employees hired before this date.
+        after_id (Optional[int]): Only employees with a greater id (keyset pagination cursor).
+
+    Returns:
+        Select: The query, ordered by id.
+    """
+    query = select(Employee.id, Employee.name, Employee.datetime, Employee.department_id, Employee.job_id)
+    if department_id is not None:
+        query = query.where(Employee.department_id == department_id)
+    if job_id is not None:
+        query = query.where(Employee.job_id == job_id)
+    if hired_from is not None:
+        query = query.where(Employee.datetime >= hired_from)
+    if hired_to is not None:
+        query = query.where(Employee.datetime < hired_to)
+    if after_id is not None:
+        # Keyset pagination, the primary key index seeks to the cursor instead of skipping rows like OFFSET
+        query = query.where(Employee.id > after_id)
+    return query.order_by(Employee.id)
+
+@db_operation
+def list_employees(
+    db: Session,
+    department_id: Optional[int] = None,
+    job_id: Optional[int] = None,
+    hired_from: Optional[datetime] = None,
+    hired_to: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = EMPLOYEES_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Returns a page of employees ordered by id.
+
+    Args:
+        db (Session): The SQLAlchemy database session.
+        department_id (Optional[int]): Only employees of this department.
+        job_id (Optional[int]): Only employees with this job.
+        hired_from (Optional[datetime]): Only employees hired at or after this date.
+        hired_to (Optional[datetime]): Only employees hired before this date.
+        after_id (Optional[int]): The next_after_id of the previous page, None for the first page.
+        limit (int): Maximum number of employees of the page.
+
+    Returns:
+        Dict[str, Any]: The employees of the page and the next_after_id cursor of the
+                        following page, None when this is the last one.
+    """
+    # One more row tells whether there is a next page
+    rows = db.execute(_employees_query(department_id, job_id, hired_from, hired_to, after_id).limit(limit + 1)).all()
+    items = [dict(row._mapping) for row in rows[:limit]]
+    return {
+        "items": items,
+        "next_after_id": items[-1]["id"] if len(rows) > limit else None
+    }
+
+def stream_employees(
+    department_id: Optional[int] = None,
+    job_id: Optional[int] = None,
+    hired_from: Optional[datetime] = None,
+    hired_to: Optional[datetime] = None,
+    after_id: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Yields every matching employee as a line of newline delimited JSON.
+
+    The rows are read through a server-side cursor BATCH_SIZE at a time, so memory
+    does not grow with the number of employees. The generator uses its own session,
+    which lives as long as the response is being sent.
+
+    Args:
+        department_id (Optional[int]): Only employees of this department.
+        job_id (Optional[int]): Only employees with this job.
+        hired_from (Optional[datetime]): Only employees hired at or after this date.
+        hired_to (Optional[datetime]): Only employees hired before this date.
+        after_id (Optional[int]): Only employees with a greater id, to resume a stream.
+
+    Yields:
+        bytes: One JSON object per employee, ending with a newline.
+    """
+    db = SessionLocal()
+    try:
+        query = _employees_query(department_id, job_id, hired_from, hired_to, after_id)
+        result = db.execute(query.execution_options(yield_per=BATCH_SIZE))
+        for rows in result.partitions():
+            yield "".join(
+                json.dumps({
+                    "id": row.id,
+                    "name": row.name,
+                    "datetime": row.datetime.isoformat() if row.datetime else None,
+                    "department_id": row.department_id,
+                    "job_id": row.job_id
+                }) + "\n"
+                for row in rows
+            ).encode("utf-8")
+    finally:
+        db.close()
@@ -0,0 +1,168 @@
+import os
+from typing import List, Optional, AsyncIterator, Iterator
+
+from fastapi.concurrency import run_in_threadpool
+
+from services.columnar import ColumnBatch
+from services.parallel_csv import csv_file_batches
+from services.partial_load import Batch
+from utils.compression import FILE_ENCODINGS
+from utils.constants import BATCH_SIZE, ARROW_ERROR_MSG, PYARROW_REQUIRED_MSG
+from utils.exceptions import ProcessingError
+from utils.log_manager import SingletonLogger
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Optional dependency, only needed for Parquet and Arrow uploads
+    pyarrow = None
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Upload formats by file extension
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow"
+}
+
+def upload_compression(filename: Optional[str]) -> Optional[str]:
+    """
+    Returns the compression of an uploaded file from its extension (i.e. employees.csv.gz).
+
+    Args:
+        filename: The name of the uploaded file.
+
+    Returns:
+        The encoding (gzip or zstd), or None if the file is not compressed.
+    """
+    if not filename:
+        return None
+    return FILE_ENCODINGS.get(os.path.splitext(filename)[1].lower())
+
+def upload_format(filename: Optional[str]) -> Optional[str]:
+    """
+    Returns the format of an uploaded file from its extension, ignoring a compression extension.
+
+    Args:
+        filename: The name of the uploaded file.
+
+    Returns:
+        The format (csv, parquet or arrow), or None if it is not supported.
+    """
+    if not filename:
+        return None
+    name, extension = os.path.splitext(filename)
+    if extension.lower() in FILE_ENCODINGS:
+        extension = os.path.splitext(name)[1]
+    return FILE_FORMATS.get(extension.lower())
+
+def _record_batches(path: str, file_format: str) -> Iterator["pyarrow.RecordBatch"]:
+    """
+    Reads the record batches of a Parquet or Arrow IPC file (file or stream format).
+    """
+    if file_format == "parquet":
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE)
+        return
+    with pyarrow.memory_map(path) as source:
+        try:
+            reader = pyarrow.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pyarrow.ArrowInvalid:
+            source.seek(0)
+            batches = pyarrow.ipc.open_stream(source)
+        yield from batches
+
+def _arrow_columns(data: "pyarrow.Table", columns: List[str]) -> ColumnBatch:
+    """
+    Converts the rows of an Arrow table to the column lists of a batch, column by column.
+    """
+    names = set(data.schema.names)
+    return ColumnBatch({
+        name: data.column(name).to_pylist() if name in names else [None] * data.num_rows
+        for name in columns
+    })
+
+async def arrow_file_batches(
+    path: str,
+    file_format: str,
+    columns: List[str],
+    batch_size: int = BATCH_SIZE
+) -> AsyncIterator[ColumnBatch]:
+    """
+    Reads a Parquet or Arrow IPC file in batches of typed column lists.
+
+    Values keep the types of the file (integers, timestamps...), nothing is parsed
+    from text, and each Arrow column is converted as a whole, without building a
+    dictionary per record. Columns are matched by name with the table columns,
+    missing ones are null.
+
+    Args:
+        path: Path of the file.
+        file_format: parquet or arrow.
+        columns: The column names of the table.
+        batch_size: Number of records per yielded batch.
+
+    Yields:
+        Batches of at most batch_size records, as one list of values per column.
+
+    Raises:
+        ProcessingError: If pyarrow is not installed or the file cannot be read.
+        TypeError: If the file has columns that are not columns of the table.
+    """
+    if pyarrow is None:
+        raise ProcessingError(PYARROW_REQUIRED_MSG)
+
+    batches = _record_batches(path, file_format)
+    try:
+        # Record batches read and not yielded yet, they are regrouped in batch_size rows
+        pending = []
+        pending_rows = 0
+        while True:
+            record_batch = await run_in_threadpool(next, batches, None)
+            if record_batch is None:
+                break
+            unexpected = set(record_batch.schema.names) - set(columns)
+            if unexpected:
+                raise TypeError(f"Unexpected columns: {unexpected}")
+            pending.append(record_batch)
+            pending_rows += record_batch.num_rows
+            while pending_rows >= batch_size:
+                data = pyarrow.Table.from_batches(pending)
+                yield await run_in_threadpool(_arrow_columns, data.slice(0, batch_size), columns)
+                data = data.slice(batch_size)
+                pending, pending_rows = data.to_batches(), data.num_rows
+        if pending_rows:
+            yield await run_in_threadpool(_arrow_columns, pyarrow.Table.from_batches(pending), columns)
+    except pyarrow.ArrowException as e:
+        logger.error("Could not read the %s file: %s", file_format, e)
+        raise ProcessingError(ARROW_ERROR_MSG)
+    finally:
+        batches.close()
+
+def file_batches(
+    path: str,
+    file_format: str,
+    columns: List[str],
+    batch_size: int = BATCH_SIZE
+) -> AsyncIterator[Batch]:
+    """
+    Reads a file of any upload format in batches of records.
+
+    Args:
+        path: Path of the file.
+        file_format: csv, parquet or arrow.
+        columns: The column names of the table.
+        batch_size: Number of records per yielded batch.
+
+    Returns:
+        An async iterator over batches of at most batch_size records, lists of dictionaries
+        for CSV files and column lists for Parquet and Arrow files.
+    """
+    if file_format == "csv":
+        return csv_file_batches(path, columns, batch_size)
+    return arrow_file_batches(path, file_format, columns, batch_size)
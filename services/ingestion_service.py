@@ -0,0 +1,301 @@
+import os
+import glob
+import json
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Any, List, AsyncIterable, Awaitable, Callable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models.db_models import IngestionJob, IngestionRejectedRow
+from services.department_service import create_departments_file
+from services.employee_service import create_employees_file
+from services.job_service import create_jobs_file
+from services.utils import spool_chunks
+from utils.constants import *
+from utils.decorators import db_operation
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# File loader of each table that can be ingested in the background
+LOADERS: Dict[str, Callable[..., Awaitable[int]]] = {
+    "employees": create_employees_file,
+    "departments": create_departments_file,
+    "jobs": create_jobs_file
+}
+
+# Jobs accepted by this process waiting for a worker, as (job id, table, spooled file path, partial, format)
+_queue: "Optional[asyncio.Queue]" = None
+_workers: List[asyncio.Task] = []
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _update_job(job_id: str, **values: Any) -> None:
+    """
+    Updates a job in its own short transaction, so progress is visible while the load runs.
+
+    Args:
+        job_id (str): The job identifier.
+        values: Column values to set.
+    """
+    db = SessionLocal()
+    try:
+        db.query(IngestionJob).filter(IngestionJob.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+def _fail_jobs(error: str, job_ids: Optional[List[str]] = None) -> int:
+    """
+    Fails jobs that will not finish, in their own transaction.
+
+    Args:
+        error (str): The error stored in the jobs.
+        job_ids (Optional[List[str]]): The jobs to fail, every queued or running job by default.
+
+    Returns:
+        int: The number of jobs failed.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(IngestionJob).filter(IngestionJob.state.in_(("queued", "running")))
+        if job_ids is not None:
+            query = query.filter(IngestionJob.id.in_(job_ids))
+        failed = query.update({"state": "failed", "error": error, "finished_at": _now()}, synchronize_session=False)
+        db.commit()
+        return failed
+    finally:
+        db.close()
+
+def _save_rejected(job_id: str, rejected: List[Dict[str, Any]]) -> None:
+    """
+    Stores the records rejected by a partial load.
+
+    Args:
+        job_id (str): The job identifier.
+        rejected (List[Dict[str, Any]]): The rejected rows, with their row number, reason and record.
+    """
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects([
+            IngestionRejectedRow(job_id=job_id, row=item["row"], reason=item["reason"],
+                                 record=json.dumps(item["record"], default=str))
+            for item in rejected
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def _create_job(job_id: str, table: str) -> None:
+    """
+    Stores a new queued job.
+
+    Args:
+        job_id (str): The job identifier.
+        table (str): The table to load.
+    """
+    db = SessionLocal()
+    try:
+        db.add(IngestionJob(id=job_id, table=table, state="queued", rows_processed=0,
+                            batches_loaded=0, created_at=_now()))
+        db.commit()
+    finally:
+        db.close()
+
+async def enqueue_ingestion(
+    table: str,
+    chunks: AsyncIterable[bytes],
+    partial: bool = False,
+    file_format: str = "csv"
+) -> str:
+    """
+    Saves an upload to disk and queues its load for the background workers.
+
+    Args:
+        table (str): The table to load (employees, departments or jobs).
+        chunks (AsyncIterable[bytes]): The content of the file, chunk by chunk.
+        partial (bool): Reject the failing records instead of failing the whole job.
+        file_format (str): csv, parquet or arrow.
+
+    Returns:
+        str: The job identifier, to query its progress.
+    """
+    if table not in LOADERS:
+        raise ValueError(f"Table {table} cannot be ingested")
+    if _queue is None:
+        raise RuntimeError("Ingestion workers are not running")
+
+    path = await spool_chunks(chunks, INGESTION_SPOOL_DIR)
+    job_id = uuid.uuid4().hex
+    try:
+        await run_in_threadpool(_create_job, job_id, table)
+    except BaseException:
+        os.remove(path)
+        raise
+    await _queue.put((job_id, table, path, partial, file_format))
+    logger.info("Ingestion job %s queued for %s", job_id, table, extra={"job_id": job_id, "table": table})
+    return job_id
+
+async def _run_job(job_id: str, table: str, path: str, partial: bool = False, file_format: str = "csv") -> None:
+    """
+    Loads a spooled file, recording the progress of the job after each batch.
+
+    Args:
+        job_id (str): The job identifier.
+        table (str): The table to load.
+        path (str): The spooled file, removed when the job ends.
+        partial (bool): Store the rejected records instead of failing the job.
+        file_format (str): csv, parquet or arrow.
+    """
+    rows = 0
+    batches = 0
+
+    async def progress(batch_size: int) -> None:
+        nonlocal rows, batches
+        rows += batch_size
+        batches += 1
+        await run_in_threadpool(_update_job, job_id, rows_processed=rows, batches_loaded=batches)
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        await run_in_threadpool(_update_job, job_id, state="running", started_at=_now())
+        result = await LOADERS[table](path, db, progress=progress, partial=partial, file_format=file_format)
+        if partial and result["rejected"]:
+            await run_in_threadpool(_save_rejected, job_id, result["rejected"])
+        await run_in_threadpool(_update_job, job_id, state="succeeded", finished_at=_now())
+        logger.info("Ingestion job %s loaded %d rows into %s", job_id, rows, table,
+                    extra={"job_id": job_id, "table": table, "rows": rows, "duration": time.perf_counter() - start})
+    except asyncio.CancelledError:
+        # The API is shutting down, the load is rolled back when its session closes
+        logger.warning("Ingestion job %s cancelled by the shutdown", job_id,
+                       extra={"job_id": job_id, "table": table, "rows": rows, "duration": time.perf_counter() - start})
+        await run_in_threadpool(_fail_jobs, INGESTION_SHUTDOWN_MSG, [job_id])
+        raise
+    except Exception as e:
+        logger.error("Ingestion job %s failed: %s", job_id, e,
+                     extra={"job_id": job_id, "table": table, "rows": rows, "duration": time.perf_counter() - start})
+        await run_in_threadpool(_update_job, job_id, state="failed", error=str(e), finished_at=_now())
+    finally:
+        await run_in_threadpool(db.close)
+        os.remove(path)
+
+async def _worker() -> None:
+    """
+    Runs queued jobs one at a time until cancelled.
+    """
+    while True:
+        job_id, table, path, partial, file_format = await _queue.get()
+        try:
+            await _run_job(job_id, table, path, partial, file_format)
+        except Exception as e:
+            # Failures are recorded in the job, this only protects the worker
+            logger.error("Unexpected error in ingestion worker for job %s: %s", job_id, e, extra={"job_id": job_id})
+        finally:
+            _queue.task_done()
+
+def start_ingestion_workers(workers: int = INGESTION_WORKERS) -> None:
+    """
+    Starts the background ingestion workers of this process.
+
+    Args:
+        workers (int): Number of jobs run concurrently.
+    """
+    global _queue
+    _queue = asyncio.Queue()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(workers))
+
+async def stop_ingestion_workers() -> None:
+    """
+    Stops the background ingestion workers.
+
+    The jobs being loaded are cancelled and, like the jobs still queued, fail with
+    INGESTION_SHUTDOWN_MSG. Their spooled files are removed.
+    """
+    global _queue
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    queued = []
+    while _queue is not None and not _queue.empty():
+        queued.append(_queue.get_nowait())
+    _queue = None
+    for _, _, path, _, _ in queued:
+        os.remove(path)
+    if queued:
+        await run_in_threadpool(_fail_jobs, INGESTION_SHUTDOWN_MSG, [job[0] for job in queued])
+        logger.warning("%d queued ingestion jobs failed by the shutdown", len(queued))
+
+def fail_interrupted_jobs() -> int:
+    """
+    Fails the jobs left queued or running by a previous run of the API, and removes
+    the files it spooled to INGESTION_SPOOL_DIR.
+
+    Called once when the server starts, before any worker takes jobs.
+
+    Returns:
+        int: The number of jobs failed.
+    """
+    if INGESTION_SPOOL_DIR:
+        for path in glob.glob(os.path.join(INGESTION_SPOOL_DIR, "*.upload")):
+            os.remove(path)
+    try:
+        failed = _fail_jobs(INGESTION_SHUTDOWN_MSG)
+    except SQLAlchemyError as e:
+        # The API still starts while the database is not reachable
+        logger.error("Could not fail the interrupted ingestion jobs: %s", e)
+        return 0
+    if failed:
+        logger.warning("%d ingestion jobs interrupted by a previous run failed", failed)
+    return failed
+
+@db_operation
+def get_ingestion_job(job_id: str, db: Session) -> Optional[Dict[str, Any]]:
+    """
+    Returns the state and progress of an ingestion job.
+
+    Args:
+        job_id (str): The job identifier.
+        db (Session): The SQLAlchemy database session.
+
+    Returns:
+        Optional[Dict[str, Any]]: The job, with its throughput in rows per second and
+                                  the rows rejected by a partial load, or None if it does not exist.
+    """
+    job = db.get(IngestionJob, job_id)
+    if job is None:
+        return None
+
+    throughput = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or _now()) - job.started_at).total_seconds()
+        throughput = job.rows_processed / elapsed if elapsed > 0 else None
+
+    rejected = (db.query(IngestionRejectedRow)
+                .filter(IngestionRejectedRow.job_id == job_id)
+                .order_by(IngestionRejectedRow.row)
+                .all())
+
+    return {
+        "job_id": job.id,
+        "table": job.table,
+        "state": job.state,
+        "rows_processed": job.rows_processed,
+        "batches_loaded": job.batches_loaded,
+        "rows_per_second": throughput,
+        "error": job.error,
+        "rejected": [{"row": item.row, "reason": item.reason, "record": json.loads(item.record)} for item in rejected],
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
@@ -1,11 +1,18 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterable, Awaitable, Callable, Optional, Union
 from sqlalchemy.orm import Session
 
 from models.db_models import Job
-from services.utils import process_csv
+from schemas.schemas import JobCreate
+from services.copy_loader import copy_batches
+from services.file_formats import file_batches
+from services.partial_load import partial_result, save_partially
+from services.utils import process_csv, stream_csv, stream_ndjson
 from utils.constants import *
+from utils.cache import report_cache
 from utils.decorators import db_operation
 from utils.log_manager import SingletonLogger
+from utils.metrics import batch_flush_duration, batch_flush_rows, rows_ingested, timed
+from utils.sql_timing import set_batch
 
 # Ensure type safety
 logger = SingletonLogger().get_logger()
@@ -25,7 +32,102 @@ async def create_jobs_csv(file_content: bytes, db: Session) -> int:
     return await create_jobs(records, db)
 
 @db_operation
-async def create_jobs(data: List[Dict[str, Any]], db: Session) -> int:
+async def create_jobs_csv_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates jobs from a CSV byte stream, loading each batch with COPY as soon as it is parsed.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The content of the CSV file, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of jobs created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_csv(chunks, Job.__table__.columns.keys())
+    return await copy_batches(Job.__table__, batches, db, progress, partial)
+
+@db_operation
+async def create_jobs_ndjson_stream(
+    chunks: AsyncIterable[bytes],
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates jobs from an NDJSON byte stream, validating each line as it arrives and
+    loading each batch with COPY as soon as it is complete.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The NDJSON content, one job per line, chunk by chunk.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of jobs created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a line is not a valid job, a duplicate record is found or an error occurs during processing.
+    """
+    batches = stream_ndjson(chunks, JobCreate)
+    return await copy_batches(Job.__table__, batches, db, progress, partial)
+
+@db_operation
+async def create_jobs_file(
+    path: str,
+    db: Session,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    partial: bool = False,
+    file_format: str = "csv"
+) -> Union[int, Dict[str, Any]]:
+    """
+    Creates jobs from a CSV, Parquet or Arrow IPC file on disk.
+
+    Large CSV files are parsed in the parser processes, Parquet and Arrow files are
+    read as typed record batches without parsing text.
+
+    Args:
+        path (str): Path of the file.
+        db (Session): The SQLAlchemy database session.
+        progress (Optional[Callable[[int], Awaitable[None]]]): Called with the size of each loaded batch.
+        partial (bool): Reject the failing records instead of rolling back the whole load.
+        file_format (str): csv, parquet or arrow.
+
+    Returns:
+        Union[int, Dict[str, Any]]: The number of jobs created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows.
+
+    Raises:
+        Exception: If a duplicate record is found or an error occurs during processing.
+    """
+    batches = file_batches(path, file_format, Job.__table__.columns.keys())
+    return await copy_batches(Job.__table__, batches, db, progress, partial)
+
+def _save_jobs(batch: List[Dict[str, Any]], db: Session) -> None:
+    """
+    Adds a batch of jobs to the session and flushes it to the database.
+
+    Args:
+        batch (List[Dict[str, Any]]): Job records of a single batch.
+        db (Session): The SQLAlchemy database session.
+    """
+    db.bulk_save_objects([Job(**item) for item in batch])
+    db.flush()  # Flush after each batch to persist to database
+
+@db_operation
+def create_jobs(data: List[Dict[str, Any]], db: Session, partial: bool = False) -> Union[int, Dict[str, Any]]:
     """
     Creates jobs in the database in batches.
 
@@ -33,18 +135,33 @@ async def create_jobs(data: List[Dict[str, Any]], db: Session) -> int:
         data (List[Dict[str, Any]]): A list of dictionaries, where each dictionary
                                     represents a job record.
         db (Session): The SQLAlchemy database session.
+        partial (bool): Save each batch under a savepoint and reject the failing records
+                        instead of rolling back every batch.
 
     Returns:
-        int: The number of jobs created successfully.
+        Union[int, Dict[str, Any]]: The number of jobs created successfully or, when partial,
+                                    a dictionary with the created count and the rejected rows,
+                                    with their row number, reason and record.
 
     Raises:
         Exception: If a duplicate record is found or an error occurs during processing.
     """
+    rejected = []
+    # Position of each record in the upload, to report the rejected ones
+    rows = range(1, len(data) + 1)
     for i in range(0, len(data), BATCH_SIZE):
+        set_batch(i // BATCH_SIZE + 1)
         batch = data[i:i + BATCH_SIZE]
-        jobs = [Job(**item) for item in batch]
-        db.bulk_save_objects(jobs)
-        db.flush()  # Flush after each batch to persist to database
+        batch_flush_rows.labels(Job.__tablename__).observe(len(batch))
+        with timed(batch_flush_duration.labels(Job.__tablename__)):
+            if partial:
+                rejected.extend(save_partially(batch, rows[i:i + BATCH_SIZE], _save_jobs, db))
+            else:
+                _save_jobs(batch, db)
 
     db.commit()  # Commit all changes at the end
+    report_cache.bump_generation()  # Cached reports are outdated after new data is committed
+    rows_ingested.labels(Job.__tablename__).inc(len(data) - len(rejected))
+    if partial:
+        return partial_result(data, rejected)
     return len(data)
\ No newline at end of file
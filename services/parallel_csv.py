@@ -0,0 +1,226 @@
+import os
+import csv
+import asyncio
+import multiprocessing
+from io import StringIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+
+from services.utils import read_fieldnames, iter_path_chunks, stream_csv
+from utils.constants import (
+    BATCH_SIZE,
+    CHUNK_SIZE,
+    PARSE_WORKERS,
+    PARSE_RANGE_BYTES,
+    PARALLEL_PARSE_MIN_BYTES,
+    UNICODE_DECODE_ERROR_MSG,
+    CSV_ERROR_MSG)
+from utils.exceptions import ProcessingError
+from utils.log_manager import SingletonLogger
+
+# This module is imported by the parser processes, it must not import the database
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Process pool shared by the uploads, created on first use
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn avoids forking a process that runs the server threads
+        _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def shutdown_parse_pool() -> None:
+    """
+    Stops the parser processes, if they were started.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _first_record_end(path: str) -> Tuple[int, str]:
+    """
+    Finds the end of the first CSV record of a file.
+
+    Args:
+        path: Path of the CSV file.
+
+    Returns:
+        The byte offset right after the first record and its decoded text.
+    """
+    with open(path, 'rb') as file:
+        content = b''
+        while True:
+            block = file.read(CHUNK_SIZE)
+            content += block
+            quotes = 0
+            start = 0
+            while True:
+                newline = content.find(b'\n', start)
+                if newline == -1:
+                    break
+                quotes += content.count(b'"', start, newline)
+                if quotes % 2 == 0:
+                    return newline + 1, content[:newline + 1].decode('utf-8')
+                start = newline + 1
+            if not block:
+                return len(content), content.decode('utf-8')
+
+def split_ranges(path: str, start: int, range_bytes: int = PARSE_RANGE_BYTES) -> List[Tuple[int, int]]:
+    """
+    Splits a CSV file into byte ranges of about range_bytes that end at record boundaries.
+
+    A newline only ends a record when the number of quotes since the previous
+    boundary is even, so quoted fields with line breaks are never split. The
+    file is scanned with bytes.find/count, without parsing it.
+
+    Args:
+        path: Path of the CSV file.
+        start: Byte offset of the first record (after the header row, if any).
+        range_bytes: Approximate size of each range.
+
+    Returns:
+        The (start, end) byte offsets of every range, in file order.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    begin = start
+    target = begin + range_bytes
+    # Quotes seen since the beginning of the current range
+    quotes = 0
+    with open(path, 'rb') as file:
+        file.seek(start)
+        offset = start
+        while True:
+            block = file.read(CHUNK_SIZE)
+            if not block:
+                break
+            # Quotes of the block before pos are already counted
+            pos = 0
+            while offset + len(block) > target:
+                newline = block.find(b'\n', max(target - offset, pos))
+                if newline == -1:
+                    break
+                quotes += block.count(b'"', pos, newline)
+                pos = newline
+                if quotes % 2 == 0:
+                    ranges.append((begin, offset + newline + 1))
+                    begin = offset + newline + 1
+                    target = begin + range_bytes
+                    quotes = 0
+                    pos = newline + 1
+                else:
+                    # The newline is inside a quoted field, try the next one
+                    target = offset + newline + 1
+            quotes += block.count(b'"', pos)
+            offset += len(block)
+    if begin < size:
+        ranges.append((begin, size))
+    return ranges
+
+def _parse_range(path: str, start: int, end: int, fieldnames: List[str]) -> List[Dict[str, Any]]:
+    """
+    Parses a byte range of a CSV file, run in the parser processes.
+
+    Records with more fields than columns keep them under the None key, like in
+    stream_csv, so the loader rejects them (or, in a partial load, only them).
+
+    Args:
+        path: Path of the CSV file.
+        start: Byte offset of the first record of the range.
+        end: Byte offset right after the last record of the range.
+        fieldnames: Column names of the records.
+
+    Returns:
+        The records of the range as dictionaries.
+    """
+    with open(path, 'rb') as file:
+        file.seek(start)
+        content = file.read(end - start)
+    return list(csv.DictReader(StringIO(content.decode('utf-8')), fieldnames=fieldnames))
+
+async def parse_csv_parallel(
+    path: str,
+    columns: List[str],
+    batch_size: int = BATCH_SIZE,
+    workers: int = PARSE_WORKERS,
+    range_bytes: int = PARSE_RANGE_BYTES
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Parses a CSV file in a process pool and yields its records in batches, in file order.
+
+    At most two ranges per worker are in flight, so memory is bounded by the
+    range size and not by the file size.
+
+    Args:
+        path: Path of the CSV file.
+        columns: A list of column names expected in the CSV file.
+        batch_size: Number of records per yielded batch.
+        workers: Number of parser processes.
+        range_bytes: Approximate size of the range parsed by each task.
+
+    Yields:
+        Lists of at most batch_size dictionaries, where each dictionary
+        represents a row of data from the CSV file.
+
+    Raises:
+        ProcessingError: If the content cannot be decoded with UTF-8 or parsed as CSV.
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    try:
+        header_end, first_record = await loop.run_in_executor(None, _first_record_end, path)
+        fieldnames, has_header = read_fieldnames(first_record, columns)
+        start = header_end if has_header else 0
+        ranges = await loop.run_in_executor(None, split_ranges, path, start, range_bytes)
+
+        executor = _get_executor()
+        batch = []
+        for range_start, range_end in ranges:
+            pending.append(loop.run_in_executor(executor, _parse_range, path, range_start, range_end, fieldnames))
+            if len(pending) < workers * 2:
+                continue
+            batch.extend(await pending.popleft())
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+
+        while pending:
+            batch.extend(await pending.popleft())
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            yield batch
+
+    except UnicodeDecodeError as e:
+        logger.error("Could not decode file content: %s", e)
+        raise ProcessingError(UNICODE_DECODE_ERROR_MSG)
+    except csv.Error as e:
+        logger.error("CSV parsing error: %s", e)
+        raise ProcessingError(CSV_ERROR_MSG)
+    finally:
+        # Ranges not consumed yet when the load fails or is cancelled
+        for future in pending:
+            future.cancel()
+
+def csv_file_batches(path: str, columns: List[str], batch_size: int = BATCH_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Parses a CSV file in batches, in parallel when it is large enough to pay off.
+
+    Args:
+        path: Path of the CSV file.
+        columns: A list of column names expected in the CSV file.
+        batch_size: Number of records per yielded batch.
+
+    Returns:
+        An async iterator over lists of at most batch_size dictionaries.
+    """
+    if PARSE_WORKERS <= 1 or os.path.getsize(path) < PARALLEL_PARSE_MIN_BYTES:
+        return stream_csv(iter_path_chunks(path), columns, batch_size)
+    return parse_csv_parallel(path, columns, batch_size)
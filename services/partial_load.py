@@ -0,0 +1,95 @@
+from typing import Dict, Any, List, Callable, Sequence, Tuple, Union
+
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.orm import Session
+
+from services.columnar import ColumnBatch
+from utils.decorators import describe_error
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Errors caused by the records themselves, any other error still aborts the whole load
+RECORD_ERRORS = (IntegrityError, DataError, TypeError)
+
+# A list of records or the column lists of a batch
+Batch = Union[List[Dict[str, Any]], ColumnBatch]
+
+def save_partially(
+    batch: Batch,
+    rows: Sequence[int],
+    save: Callable[[Batch, Session], None],
+    db: Session
+) -> List[Dict[str, Any]]:
+    """
+    Saves a batch under a savepoint, bisecting it when it fails to isolate the rejected records.
+
+    A failed savepoint only discards its own rows, so the records saved before it
+    stay in the transaction. A batch with k bad records costs about k * log2(len(batch))
+    extra savepoints, and a clean batch a single one.
+
+    Args:
+        batch (Batch): The records to save, as a list or as column lists.
+        rows (Sequence[int]): Position of each record of the batch in the upload, starting at 1.
+        save (Callable[[Batch, Session], None]): Saves and flushes a batch.
+        db (Session): The SQLAlchemy database session.
+
+    Returns:
+        List[Dict[str, Any]]: The rejected records, each one with its row number,
+                              the reason it was rejected and the record itself.
+    """
+    if not batch:
+        return []
+    try:
+        with db.begin_nested():
+            save(batch, db)
+        return []
+    except RECORD_ERRORS as e:
+        if len(batch) == 1:
+            logger.warning("Row %s rejected: %s", rows[0], e)
+            return [{"row": rows[0], "reason": describe_error(e), "record": batch[0]}]
+
+    middle = len(batch) // 2
+    return (save_partially(batch[:middle], rows[:middle], save, db)
+            + save_partially(batch[middle:], rows[middle:], save, db))
+
+def partial_result(data: List[Dict[str, Any]], rejected: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Builds the result of a partial load of a list of records.
+
+    Args:
+        data (List[Dict[str, Any]]): The records as uploaded.
+        rejected (List[Dict[str, Any]]): The rejected records, with their row number and reason.
+
+    Returns:
+        Dict[str, Any]: The created count and the rejected rows sorted by row number,
+                        each one with the record as uploaded, not as converted for the insert.
+    """
+    for item in rejected:
+        item["record"] = data[item["row"] - 1]
+    return {"created": len(data) - len(rejected), "rejected": sorted(rejected, key=lambda item: item["row"])}
+
+def drop_rejected(
+    batch: Batch,
+    rows: Sequence[int],
+    rejected: List[Dict[str, Any]]
+) -> Tuple[Batch, List[int]]:
+    """
+    Removes the rejected records from a batch.
+
+    Args:
+        batch (Batch): The records of the batch, as a list or as column lists.
+        rows (Sequence[int]): Position of each record of the batch in the upload.
+        rejected (List[Dict[str, Any]]): The rejected records, with their row number.
+
+    Returns:
+        Tuple[Batch, List[int]]: The remaining records and their positions.
+    """
+    if not rejected:
+        return batch, list(rows)
+    rejected_rows = {item["row"] for item in rejected}
+    kept = [index for index, row in enumerate(rows) if row not in rejected_rows]
+    if isinstance(batch, ColumnBatch):
+        return batch.take(kept), [rows[index] for index in kept]
+    return [batch[index] for index in kept], [rows[index] for index in kept]
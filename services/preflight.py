@@ -0,0 +1,107 @@
+from typing import Dict, Any, List, Callable, Sequence
+
+from sqlalchemy.orm import Session
+
+from models.db_models import Employee
+from services.columnar import column_batch, coerce_column
+from services.partial_load import Batch
+from services.query_registry import execute_query
+from utils.constants import (
+    CONFLICT_ROWS_IN_ERROR,
+    CONFLICT_ROWS_MSG,
+    FOREIGN_KEY_VIOLATION_MSG,
+    UNIQUE_CONSTRAINT_VIOLATION_MSG)
+from utils.decorators import ERROR_CATEGORIES
+from utils.exceptions import ProcessingError
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+def employee_validator(db: Session) -> Callable[[Batch, Sequence[int]], List[Dict[str, Any]]]:
+    """
+    Returns a pre-flight validation of employee records, to run on each batch of an upload before inserting it.
+
+    The distinct ids, department ids and job ids of a batch are checked against
+    the database in a single query, and ids repeated in the upload are detected
+    with a set kept across the batches of the same upload, so every conflict is
+    found before any insert is attempted. The database constraints still apply
+    to rows written concurrently by other uploads.
+
+    Args:
+        db (Session): The SQLAlchemy database session.
+
+    Returns:
+        Callable[[Batch, Sequence[int]], List[Dict[str, Any]]]: A function
+        receiving a batch (a list of records or its column lists) and the position of each record in the upload, and returning
+        the conflicting records with their row number, reason and record.
+    """
+    # Ids of the records of the upload accepted so far
+    seen_ids = set()
+
+    def validate(batch: Batch, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        if not len(batch):
+            return []
+        table = Employee.__table__
+        try:
+            # Only the checked columns are converted, values already converted are kept
+            columns = column_batch(batch, table.columns.keys()).columns
+            ids, department_ids, job_ids = (
+                coerce_column(table, name, columns[name]) for name in ("id", "department_id", "job_id"))
+        except TypeError as e:
+            # Malformed records are left to the insert, which rejects them with the data type error
+            logger.warning("Pre-flight validation skipped for a malformed batch: %s", e)
+            return []
+
+        result = execute_query("employee_conflicts", db, {
+            "ids": list(set(ids) - {None}),
+            "department_ids": list(set(department_ids) - {None}),
+            "job_ids": list(set(job_ids) - {None})
+        })
+        missing = {"id": set(), "department_id": set(), "job_id": set()}
+        for field, value in result:
+            missing[field].add(value)
+
+        conflicts = []
+        for index, row in enumerate(rows):
+            if ids[index] in missing["id"] or ids[index] in seen_ids:
+                reason = UNIQUE_CONSTRAINT_VIOLATION_MSG
+            elif department_ids[index] in missing["department_id"] or job_ids[index] in missing["job_id"]:
+                reason = FOREIGN_KEY_VIOLATION_MSG
+            else:
+                seen_ids.add(ids[index])
+                continue
+            conflicts.append({"row": row, "reason": reason, "record": batch[index]})
+
+        if conflicts:
+            logger.warning("Pre-flight validation found %d conflicting employees", len(conflicts), extra={"rows": len(conflicts)})
+        return conflicts
+
+    return validate
+
+def conflicts_error(conflicts: List[Dict[str, Any]]) -> ProcessingError:
+    """
+    Builds the error of a load aborted by the conflicts found in its records.
+
+    The message lists the first CONFLICT_ROWS_IN_ERROR rows of each reason and how
+    many more there are, i.e. "Duplicate record found, rows: 4, 7 and 12 more".
+
+    Args:
+        conflicts (List[Dict[str, Any]]): The conflicting records, with their row number and reason.
+
+    Returns:
+        ProcessingError: The error, labelled with the category of the first conflicting row.
+    """
+    conflicts = sorted(conflicts, key=lambda item: item["row"])
+    rows_by_reason: Dict[str, List[int]] = {}
+    for item in conflicts:
+        rows_by_reason.setdefault(item["reason"], []).append(item["row"])
+
+    parts = []
+    for reason, rows in rows_by_reason.items():
+        listed = ", ".join(str(row) for row in rows[:CONFLICT_ROWS_IN_ERROR])
+        if len(rows) > CONFLICT_ROWS_IN_ERROR:
+            listed += f" and {len(rows) - CONFLICT_ROWS_IN_ERROR} more"
+        parts.append(CONFLICT_ROWS_MSG.format(reason=reason, rows=listed))
+    reason = conflicts[0]["reason"]
+    return ProcessingError("; ".join(parts), ERROR_CATEGORIES[reason])
@@ -0,0 +1,11 @@
+SELECT 'department_id' AS field, v.id
+FROM unnest(CAST(:department_ids AS integer[])) AS v(id) -- Departments referenced by the upload that do not exist
+WHERE NOT EXISTS (SELECT 1 FROM departments d WHERE d.id = v.id)
+UNION ALL
+SELECT 'job_id' AS field, v.id
+FROM unnest(CAST(:job_ids AS integer[])) AS v(id) -- Jobs referenced by the upload that do not exist
+WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.id = v.id)
+UNION ALL
+SELECT 'id' AS field, e.id
+FROM employees e -- Employee ids of the upload already taken
+WHERE e.id = ANY(CAST(:ids AS integer[]))
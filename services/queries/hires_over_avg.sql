@@ -1,19 +1,15 @@
-WITH mean_2021 AS (
-    SELECT AVG(emp_count) AS mean_count
-    FROM (
-        SELECT COUNT(e.id) AS emp_count
-        FROM employees e
-        INNER JOIN departments d ON e.department_id = d.id
-        WHERE EXTRACT(YEAR FROM e.datetime) = 2021
-        GROUP BY d.department
-    ) dc
+WITH department_hires AS (
+    SELECT
+        department_id,
+        SUM(hires) AS hired
+    FROM hires_rollup -- Pre-aggregated hires, maintained by triggers on employees
+    WHERE year = :year
+    GROUP BY department_id
 )
 SELECT
-    department,
-    COUNT(1) AS hired
-FROM employees e
-INNER JOIN departments d ON e.department_id = d.id
-WHERE EXTRACT(YEAR FROM datetime) = 2021
-GROUP BY department
-HAVING COUNT(1) > (SELECT mean_count FROM mean_2021)
-ORDER BY HIRED DESC
\ No newline at end of file
+    d.department,
+    dh.hired
+FROM department_hires dh
+INNER JOIN departments d ON d.id = dh.department_id
+WHERE dh.hired > (SELECT AVG(hired) FROM department_hires)
+ORDER BY dh.hired DESC
\ No newline at end of file
@@ -0,0 +1,28 @@
+WITH fresh AS (
+    SELECT
+        department_id,
+        job_id,
+        EXTRACT(YEAR FROM datetime)::int AS year,
+        EXTRACT(QUARTER FROM datetime)::int AS quarter,
+        COUNT(*) AS hires
+    FROM employees
+    -- Half-open range on the raw column, so the (datetime, department_id, job_id) index is used
+    WHERE datetime >= make_timestamp(:year, 1, 1, 0, 0, 0)
+      AND datetime < make_timestamp(:year + 1, 1, 1, 0, 0, 0)
+      AND department_id IS NOT NULL
+      AND job_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+),
+removed AS (
+    DELETE FROM hires_rollup r
+    WHERE r.year = :year
+      AND NOT EXISTS (
+          SELECT 1 FROM fresh f
+          WHERE f.department_id = r.department_id AND f.job_id = r.job_id AND f.quarter = r.quarter
+      )
+)
+INSERT INTO hires_rollup (department_id, job_id, year, quarter, hires)
+SELECT department_id, job_id, year, quarter, hires
+FROM fresh
+ON CONFLICT (department_id, job_id, year, quarter)
+DO UPDATE SET hires = EXCLUDED.hires
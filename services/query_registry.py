@@ -0,0 +1,163 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Session
+
+from utils.constants import USE_PREPARED_STATEMENTS, GENERIC_ERROR_MSG
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Get queries dir
+QUERY_DIR = os.path.join(os.path.dirname(__file__), 'queries')
+
+# Bind parameters use the :name syntax, "::" casts are not parameters
+PARAMETER_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+@dataclass(frozen=True)
+class RegisteredQuery:
+    """
+    A SQL query loaded from the queries directory.
+    """
+    # File name without the .sql extension, also used as prepared statement name
+    name: str
+    # Query text with :name bind parameters
+    sql: str
+    # Bind parameter names, in order of first appearance
+    parameters: List[str]
+    # Query text with the bind parameters replaced by $1..$n, for PREPARE
+    prepared_sql: str
+
+# Loaded queries by name
+_queries: Dict[str, RegisteredQuery] = {}
+
+def _parse_query(name: str, sql: str) -> RegisteredQuery:
+    """
+    Validates a query and extracts its bind parameters.
+
+    Args:
+        name (str): The query name.
+        sql (str): The query text.
+
+    Returns:
+        RegisteredQuery: The parsed query.
+
+    Raises:
+        ValueError: If the query is empty or has more than one statement.
+    """
+    sql = sql.strip().rstrip(';').strip()
+    if not sql:
+        raise ValueError(f"Query {name} is empty")
+    if ';' in sql:
+        raise ValueError(f"Query {name} must contain a single statement")
+    if not re.fullmatch(r"\w+", name):
+        raise ValueError(f"Query name {name} is not a valid identifier")
+
+    parameters = []
+    for parameter in PARAMETER_PATTERN.findall(sql):
+        if parameter not in parameters:
+            parameters.append(parameter)
+    prepared_sql = PARAMETER_PATTERN.sub(lambda match: f"${parameters.index(match.group(1)) + 1}", sql)
+    return RegisteredQuery(name, sql, parameters, prepared_sql)
+
+def load_queries(query_dir: str = QUERY_DIR) -> Dict[str, RegisteredQuery]:
+    """
+    Loads and validates every .sql file of the queries directory.
+
+    Meant to be called once at startup, so requests never read query files.
+
+    Args:
+        query_dir (str): Directory containing the .sql files.
+
+    Returns:
+        Dict[str, RegisteredQuery]: The loaded queries by name.
+
+    Raises:
+        Exception: If a file cannot be read or contains an invalid query.
+    """
+    queries = {}
+    for file_name in sorted(os.listdir(query_dir)):
+        if not file_name.endswith('.sql'):
+            continue
+        query_file = os.path.join(query_dir, file_name)
+        try:
+            with open(query_file, 'r') as file:
+                query = _parse_query(file_name[:-len('.sql')], file.read())
+        except (IOError, ValueError) as e:
+            logger.error("Error loading the query file %s: %s", query_file, e)
+            raise Exception(GENERIC_ERROR_MSG)
+        queries[query.name] = query
+
+    _queries.clear()
+    _queries.update(queries)
+    logger.info("Loaded queries: %s", ", ".join(queries))
+    return queries
+
+def get_query(name: str) -> RegisteredQuery:
+    """
+    Returns a registered query, loading the registry if it was not loaded yet.
+
+    Args:
+        name (str): The query name (file name without extension).
+
+    Returns:
+        RegisteredQuery: The query.
+
+    Raises:
+        Exception: If the query does not exist.
+    """
+    if not _queries:
+        load_queries()
+    if name not in _queries:
+        logger.error("Query %s not found in %s.", name, QUERY_DIR)
+        raise Exception(GENERIC_ERROR_MSG)
+    return _queries[name]
+
+def execute_query(name: str, db: Session, params: Optional[Dict[str, Any]] = None) -> Result:
+    """
+    Executes a registered query as a server-side prepared statement.
+
+    The statement is prepared once per database connection, so later executions
+    on the same pooled connection skip parsing and planning the query text.
+    When USE_PREPARED_STATEMENTS is disabled (i.e. behind a transaction pooler)
+    the query text is sent on every execution.
+
+    Args:
+        name (str): The query name (file name without extension).
+        db (Session): The SQLAlchemy database session.
+        params (Optional[Dict[str, Any]]): Values for the bind parameters.
+
+    Returns:
+        Result: The query result.
+
+    Raises:
+        ValueError: If a bind parameter has no value.
+    """
+    query = get_query(name)
+    params = params or {}
+    missing = [parameter for parameter in query.parameters if parameter not in params]
+    if missing:
+        raise ValueError(f"Missing parameters for query {name}: {missing}")
+
+    if not USE_PREPARED_STATEMENTS:
+        return db.execute(text(query.sql), params)
+
+    connection = db.connection()
+    # The info dictionary lives as long as the DBAPI connection, like its prepared statements
+    prepared = connection.connection.info.setdefault("prepared_statements", set())
+    if name not in prepared:
+        connection.exec_driver_sql(f"PREPARE {name} AS {query.prepared_sql}")
+        prepared.add(name)
+
+    if not query.parameters:
+        return connection.exec_driver_sql(f"EXECUTE {name}")
+    placeholders = ", ".join(f"%({parameter})s" for parameter in query.parameters)
+    return connection.exec_driver_sql(
+        f"EXECUTE {name} ({placeholders})",
+        {parameter: params[parameter] for parameter in query.parameters}
+    )
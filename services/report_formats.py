@@ -0,0 +1,129 @@
+import csv
+from dataclasses import dataclass
+from decimal import Decimal
+from io import BytesIO, StringIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import Response
+
+from utils.constants import (
+    JSON_MEDIA_TYPE,
+    COLUMNAR_JSON_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+    ARROW_STREAM_MEDIA_TYPE)
+
+try:
+    import pyarrow
+except ImportError:  # Optional dependency, only needed for Arrow responses
+    pyarrow = None
+
+@dataclass(frozen=True)
+class ReportTable:
+    """
+    The result of a report query, with the column names once and a tuple per row.
+    """
+    columns: Tuple[str, ...]
+    rows: Tuple[Tuple[Any, ...], ...]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """
+        Returns the rows as dictionaries keyed by column name.
+        """
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+def available_media_types() -> List[str]:
+    """
+    Returns the report media types this process can produce, in order of preference.
+    """
+    media_types = [JSON_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, CSV_MEDIA_TYPE]
+    if pyarrow is not None:
+        media_types.append(ARROW_STREAM_MEDIA_TYPE)
+    return media_types
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """
+    Picks the report media type for an Accept header.
+
+    Media ranges are tried by decreasing quality, keeping the header order on ties.
+    Wildcards pick the first available type they match, JSON for */*.
+
+    Args:
+        accept (Optional[str]): The Accept header of the request.
+
+    Returns:
+        Optional[str]: The media type to produce, or None if none is acceptable.
+    """
+    available = available_media_types()
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    ranges = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *parameters = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(ranges):
+        if media_type == "*/*":
+            return JSON_MEDIA_TYPE
+        if media_type.endswith("/*"):
+            prefix = media_type[:-1]
+            match = next((available_type for available_type in available if available_type.startswith(prefix)), None)
+            if match:
+                return match
+        elif media_type in available:
+            return media_type
+    return None
+
+def _default(value: Any) -> Any:
+    # Numeric aggregates may be returned as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _to_arrow(table: ReportTable) -> bytes:
+    columns = list(zip(*table.rows)) if table.rows else [()] * len(table.columns)
+    arrow_table = pyarrow.table({name: list(values) for name, values in zip(table.columns, columns)})
+    sink = BytesIO()
+    with pyarrow.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue()
+
+def render_report(table: ReportTable, media_type: str) -> Response:
+    """
+    Serializes a report in the negotiated media type.
+
+    The rows go straight from their tuples to the output, without jsonable_encoder:
+    JSON objects are encoded with orjson, the columnar JSON form and CSV write the
+    column names once followed by the values of each row, and Arrow IPC builds one
+    array per column.
+
+    Args:
+        table (ReportTable): The report result.
+        media_type (str): A media type returned by negotiate_media_type.
+
+    Returns:
+        Response: The serialized report.
+    """
+    if media_type == COLUMNAR_JSON_MEDIA_TYPE:
+        content = orjson.dumps({"columns": table.columns, "rows": table.rows}, default=_default)
+    elif media_type == CSV_MEDIA_TYPE:
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(table.columns)
+        writer.writerows(table.rows)
+        content = buffer.getvalue().encode("utf-8")
+    elif media_type == ARROW_STREAM_MEDIA_TYPE:
+        content = _to_arrow(table)
+    else:
+        content = orjson.dumps(table.records(), default=_default)
+    return Response(content=content, media_type=media_type)
@@ -1,7 +1,24 @@
+import os
 import csv
+import codecs
+import tempfile
+from contextlib import asynccontextmanager
 from io import StringIO
-from typing import List, Dict, Any
-from utils.constants import UNICODE_DECODE_ERROR_MSG, CSV_ERROR_MSG, GENERIC_ERROR_MSG
+from typing import List, Dict, Any, Optional, Tuple, Type, AsyncIterable, AsyncIterator
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from utils.constants import (
+    BATCH_SIZE,
+    CHUNK_SIZE,
+    UNICODE_DECODE_ERROR_MSG,
+    CSV_ERROR_MSG,
+    GENERIC_ERROR_MSG,
+    NDJSON_RECORD_ERROR_MSG)
+from utils.exceptions import ProcessingError
 from utils.log_manager import SingletonLogger
 
 # Ensure type safety
@@ -20,9 +37,8 @@ async def process_csv(file_content: bytes, columns: List[str]) -> List[Dict[str,
         from the CSV file, with keys corresponding to the column names.
 
     Raises:
-        UnicodeDecodeError: If the file content cannot be decoded with UTF-8.
-        csv.Error: If an error occurs during CSV parsing.
-        Exception: For any other unexpected errors.
+        ProcessingError: If the content cannot be decoded with UTF-8, parsed as CSV,
+                         or any other unexpected error occurs.
     """
     try:
         # Decode the bytes to a UTF-8 encoded string
@@ -41,11 +57,299 @@ async def process_csv(file_content: bytes, columns: List[str]) -> List[Dict[str,
         return list(csv_reader)
 
     except UnicodeDecodeError as e:
-        logger.error(f"Could not decode file content: {e}")
-        raise Exception(UNICODE_DECODE_ERROR_MSG)
+        logger.error("Could not decode file content: %s", e)
+        raise ProcessingError(UNICODE_DECODE_ERROR_MSG)
     except csv.Error as e:
-        logger.error(f"CSV parsing error: {e}")
-        raise Exception(CSV_ERROR_MSG)
+        logger.error("CSV parsing error: %s", e)
+        raise ProcessingError(CSV_ERROR_MSG)
     except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
-        raise Exception(GENERIC_ERROR_MSG)
\ No newline at end of file
+        logger.error("An unexpected error occurred: %s", e)
+        raise ProcessingError(GENERIC_ERROR_MSG)
+
+async def iter_file_chunks(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Reads an uploaded file in chunks instead of loading it at once.
+
+    Args:
+        file: The uploaded file.
+        chunk_size: Maximum number of bytes returned per chunk.
+
+    Yields:
+        The file content, chunk by chunk.
+    """
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+async def iter_path_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Reads a file from disk in chunks, without blocking the event loop.
+
+    Args:
+        path: Path of the file.
+        chunk_size: Maximum number of bytes returned per chunk.
+
+    Yields:
+        The file content, chunk by chunk.
+    """
+    with open(path, 'rb') as file:
+        while True:
+            chunk = await run_in_threadpool(file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+async def spool_chunks(chunks: AsyncIterable[bytes], directory: Optional[str] = None) -> str:
+    """
+    Writes a byte stream to a temporary file, i.e. to keep an upload after the request ends.
+
+    Args:
+        chunks: The content to write, chunk by chunk.
+        directory: Directory of the file, the system temporary directory by default.
+
+    Returns:
+        The path of the file, to be removed by the caller.
+    """
+    file = tempfile.NamedTemporaryFile(dir=directory, suffix='.upload', delete=False)
+    try:
+        async for chunk in chunks:
+            await run_in_threadpool(file.write, chunk)
+    except BaseException:
+        file.close()
+        os.remove(file.name)
+        raise
+    file.close()
+    return file.name
+
+@asynccontextmanager
+async def spooled_file(chunks: AsyncIterable[bytes], directory: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Writes a byte stream to a temporary file that is removed when the context exits.
+
+    Args:
+        chunks: The content to write, chunk by chunk.
+        directory: Directory of the file, the system temporary directory by default.
+
+    Yields:
+        The path of the file.
+    """
+    path = await spool_chunks(chunks, directory)
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+def _complete_records_end(text: str) -> int:
+    """
+    Finds where the last complete CSV record of a text ends.
+
+    A newline only ends a record when it is not inside a quoted field, which is
+    the case when the number of quotes seen before it is even.
+
+    Args:
+        text: Decoded CSV text, possibly ending with a partial record.
+
+    Returns:
+        The index right after the last record separator, 0 if there is none.
+    """
+    end = 0
+    quotes = 0
+    start = 0
+    while True:
+        newline = text.find('\n', start)
+        if newline == -1:
+            return end
+        quotes += text.count('"', start, newline)
+        if quotes % 2 == 0:
+            end = newline + 1
+        start = newline + 1
+
+def read_fieldnames(text: str, columns: List[str]) -> Tuple[List[str], bool]:
+    """
+    Resolves the field names of a CSV stream from its first record.
+
+    Args:
+        text: Text containing at least the first complete record.
+        columns: A list of column names expected in the CSV file.
+
+    Returns:
+        The field names to use and whether the first record is a header row.
+    """
+    first_row = next(csv.reader(StringIO(text)), [])
+    header = [name.strip() for name in first_row]
+    if sorted(header) == sorted(columns):
+        return header, True
+    return list(columns), False
+
+async def stream_csv(
+    chunks: AsyncIterable[bytes],
+    columns: List[str],
+    batch_size: int = BATCH_SIZE
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Incrementally parses a CSV byte stream into batches of dictionaries.
+
+    Only the current chunk and the current batch are kept in memory, so the
+    file size does not bound the memory usage. The header row is optional,
+    the expected columns are used when it is missing.
+
+    Args:
+        chunks: An async iterable with the content of the CSV file.
+        columns: A list of column names expected in the CSV file.
+        batch_size: Number of records per yielded batch.
+
+    Yields:
+        Lists of at most batch_size dictionaries, where each dictionary
+        represents a row of data from the CSV file.
+
+    Raises:
+        ProcessingError: If the content cannot be decoded with UTF-8 or parsed as CSV.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    fieldnames = None
+    pending = ''
+    batch = []
+
+    def parse(text: str) -> List[Dict[str, Any]]:
+        nonlocal fieldnames
+        if fieldnames is None:
+            fieldnames, has_header = read_fieldnames(text, columns)
+            reader = csv.DictReader(StringIO(text), fieldnames=fieldnames)
+            if has_header:
+                next(reader, None)
+            return list(reader)
+        return list(csv.DictReader(StringIO(text), fieldnames=fieldnames))
+
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            end = _complete_records_end(pending)
+            if end == 0:
+                continue
+            # Parsing is CPU bound, run it in the thread pool to keep the event loop responsive
+            batch.extend(await run_in_threadpool(parse, pending[:end]))
+            pending = pending[end:]
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+
+        # Parse the last record when the content does not end with a newline
+        pending += decoder.decode(b'', final=True)
+        if pending.strip():
+            batch.extend(await run_in_threadpool(parse, pending))
+        while batch:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    except UnicodeDecodeError as e:
+        logger.error("Could not decode file content: %s", e)
+        raise ProcessingError(UNICODE_DECODE_ERROR_MSG)
+    except csv.Error as e:
+        logger.error("CSV parsing error: %s", e)
+        raise ProcessingError(CSV_ERROR_MSG)
+
+async def stream_ndjson(
+    chunks: AsyncIterable[bytes],
+    model: Type[BaseModel],
+    batch_size: int = BATCH_SIZE
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Incrementally parses and validates an NDJSON byte stream into batches of dictionaries.
+
+    Each line is a JSON object validated against the model, the complete lines of every
+    chunk are validated at once as a single JSON array. Only the current chunk and the
+    current batch are kept in memory. Blank lines are ignored.
+
+    Args:
+        chunks: An async iterable with the NDJSON content.
+        model: The Pydantic model each record is validated against.
+        batch_size: Number of records per yielded batch.
+
+    Yields:
+        Lists of at most batch_size dictionaries, one per validated record.
+
+    Raises:
+        ProcessingError: If a line is not a valid record, with its line number.
+    """
+    adapter = TypeAdapter(List[model])
+    pending = b''
+    line_number = 0
+    batch = []
+
+    def validate(lines: List[bytes]) -> List[Dict[str, Any]]:
+        nonlocal line_number
+        numbers = []
+        records = []
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                numbers.append(line_number)
+                records.append(line)
+        if not records:
+            return []
+        try:
+            items = adapter.validate_json(b'[' + b','.join(records) + b']')
+            # A line holding several comma separated objects would still make a valid array
+            if len(items) == len(records):
+                return [item.model_dump() for item in items]
+        except ValidationError:
+            pass
+        # Validate the records one by one to report the first invalid line
+        validated = []
+        for number, record in zip(numbers, records):
+            try:
+                validated.append(model.model_validate_json(record).model_dump())
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(name) for name in error["loc"])
+                message = f"{field}: {error['msg']}" if field else error["msg"]
+                logger.error("NDJSON validation error on line %d: %s", number, message)
+                raise ProcessingError(NDJSON_RECORD_ERROR_MSG.format(line=number, error=message))
+        return validated
+
+    async for chunk in chunks:
+        pending += chunk
+        end = pending.rfind(b'\n') + 1
+        if end == 0:
+            continue
+        # Validation is CPU bound, run it in the thread pool to keep the event loop responsive
+        batch.extend(await run_in_threadpool(validate, pending[:end - 1].split(b'\n')))
+        pending = pending[end:]
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    # Validate the last line when the content does not end with a newline
+    if pending.strip():
+        batch.extend(await run_in_threadpool(validate, [pending]))
+    while batch:
+        yield batch[:batch_size]
+        batch = batch[batch_size:]
+
+async def read_json_batch(request: Request, model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """
+    Reads and validates a JSON array request body.
+
+    Args:
+        request: The incoming request, with a JSON array of records.
+        model: The Pydantic model each record is validated against.
+
+    Returns:
+        A list of dictionaries, one per validated record.
+
+    Raises:
+        RequestValidationError: If the body is not a valid array of records (422 response).
+        HTTPException: 400 Bad Request if the compressed body cannot be decompressed.
+    """
+    try:
+        body = await request.body()
+    except ProcessingError as e:
+        # The body is decompressed while it is read (i.e. truncated gzip content)
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        items = TypeAdapter(List[model]).validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+    return [item.model_dump() for item in items]
@@ -0,0 +1,36 @@
+from utils.cache import ReportCache
+
+
+def test_report_cache_generation_shared(tmp_path):
+    """
+    Tests a commit in one worker process invalidates the reports cached by the others.
+    """
+    path = str(tmp_path / "workers" / "report_generation")
+    # Each cache stands for the cache of a different worker
+    first, second = ReportCache(10, 300, path), ReportCache(10, 300, path)
+    assert first.generation == second.generation == 0
+
+    second.set("report", 1, second.generation)
+    assert second.get("report") == (True, 1)
+
+    first.bump_generation()
+    assert first.generation == second.generation == 1
+    assert second.get("report") == (False, None)
+
+    # A result computed before the commit is not cached
+    generation = second.generation
+    first.bump_generation()
+    second.set("report", 2, generation)
+    assert second.get("report") == (False, None)
+
+
+def test_report_cache_generation_local():
+    """
+    Tests the generation of a single process cache.
+    """
+    cache = ReportCache(10, 300)
+    cache.set("report", 1, cache.generation)
+    assert cache.get("report") == (True, 1)
+    cache.bump_generation()
+    assert cache.generation == 1
+    assert cache.get("report") == (False, None)
@@ -0,0 +1,100 @@
+import gzip
+import json
+import pytest
+
+from sqlalchemy.orm import Session
+
+from main import app
+from models.db_models import Department
+from services.department_service import create_departments_csv_stream
+from utils.compression import decompress_chunks
+from utils.constants import BATCH_SIZE, DECOMPRESSION_ERROR_MSG
+from tests.generator import (
+    get_valid_departments,
+    list_of_dicts_to_csv_bytes,
+    bytes_to_chunks)
+
+
+@pytest.mark.asyncio
+async def test_create_departments_gzip_stream(db: Session):
+    """
+    Tests loading departments from a gzip compressed CSV stream.
+    """
+    size = int(BATCH_SIZE*1.5)
+    valid_departments = get_valid_departments(size)
+    content = gzip.compress(list_of_dicts_to_csv_bytes(valid_departments, valid_departments[0].keys()))
+
+    chunks = decompress_chunks(bytes_to_chunks(content, 1024), "gzip")
+    assert await create_departments_csv_stream(chunks, db) == size
+
+    # Truncated content is rejected
+    chunks = decompress_chunks(bytes_to_chunks(content[:-100], 1024), "gzip")
+    with pytest.raises(Exception) as excinfo:
+        await create_departments_csv_stream(chunks, db)
+    assert DECOMPRESSION_ERROR_MSG == str(excinfo.value)
+
+    # Verify only the first load was added
+    departments = db.query(Department).all()
+    assert len(departments) == size
+
+
+@pytest.mark.asyncio
+async def test_batch_insert_corrupt_gzip_body(db: Session):
+    """
+    Tests a JSON array body with corrupt gzip content is answered with 400 Bad Request.
+    """
+    content = gzip.compress(json.dumps(get_valid_departments(10)).encode())[:-10]
+    received = [{"type": "http.request", "body": content, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return received.pop(0) if received else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/departments/batch",
+        "raw_path": b"/departments/batch",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-encoding", b"gzip")],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }, receive, send)
+
+    assert sent[0]["status"] == 400
+    assert json.loads(sent[1]["body"]) == {"detail": DECOMPRESSION_ERROR_MSG}
+    assert db.query(Department).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_create_departments_zstd_stream(db: Session):
+    """
+    Tests loading departments from a zstd compressed CSV stream of several frames.
+    """
+    zstandard = pytest.importorskip("zstandard")
+    size = int(BATCH_SIZE*1.5)
+    valid_departments = get_valid_departments(size)
+    content = list_of_dicts_to_csv_bytes(valid_departments, valid_departments[0].keys())
+    compressor = zstandard.ZstdCompressor()
+    middle = len(content) // 2
+    content = compressor.compress(content[:middle]) + compressor.compress(content[middle:])
+
+    chunks = decompress_chunks(bytes_to_chunks(content, 1024), "zstd")
+    assert await create_departments_csv_stream(chunks, db) == size
+
+    # Truncated content is rejected
+    chunks = decompress_chunks(bytes_to_chunks(content[:-100], 1024), "zstd")
+    with pytest.raises(Exception) as excinfo:
+        await create_departments_csv_stream(chunks, db)
+    assert DECOMPRESSION_ERROR_MSG == str(excinfo.value)
+
+    # Verify only the first load was added
+    departments = db.query(Department).all()
+    assert len(departments) == size
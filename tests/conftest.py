@@ -1,18 +1,21 @@
 import pytest
 
 from models.db_models import *
-from database import engine, Base, SessionLocal
+from bootstrap import bootstrap
+from database import Base, SessionLocal, get_engine
 
 from sqlalchemy import delete
 
+from utils.cache import report_cache
+
 @pytest.fixture(scope="session", autouse=True)
 def setup_test_database():
     """
     Create and drop the test database schema.
     """
-    Base.metadata.create_all(bind=engine)  # Create all tables
+    bootstrap()  # Create the database and all tables
     yield  # Tests run here
-    Base.metadata.drop_all(bind=engine)  # Drop all tables after tests
+    Base.metadata.drop_all(bind=get_engine())  # Drop all tables after tests
 
 # Fixture to provide a database session for tests
 @pytest.fixture
@@ -29,6 +32,10 @@ def db():
         session.execute(delete(Employee))
         session.execute(delete(Job))
         session.execute(delete(Department))
+        session.execute(delete(IngestionRejectedRow))
+        session.execute(delete(IngestionJob))
         session.commit()
+        # Cached reports refer to the deleted data
+        report_cache.bump_generation()
         # Close the session after the test
         session.close()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import json
+import os
+import pytest
+import subprocess
+import sys
+import threading
+
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+import database
+from database import ReadYourWritesMiddleware, PRIMARY_PIN_COOKIE, pool_limits
+from main import app
+from utils.constants import DB_POOL_EXHAUSTED_MSG
+from utils.decorators import db_operation
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    """
+    Replaces the engine of the application with one whose pool holds a single connection.
+    """
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.1)
+    engine = database._create_engine(database.DB_URL, "test")
+    monkeypatch.setattr(database, "get_engine", lambda: engine)
+    yield engine
+    engine.dispose()
+
+
+async def _get(path: str):
+    """
+    Sends a GET request to the application, without a server, and returns its status and JSON body.
+    """
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }, receive, send)
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return sent[0]["status"], json.loads(body)
+
+
+async def _call_middleware(status: int, method: str = "POST"):
+    """
+    Sends a response with the given status through ReadYourWritesMiddleware and returns its headers.
+    """
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    await ReadYourWritesMiddleware(app)({"type": "http", "method": method}, None, send)
+    return sent[0]["headers"]
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes_pin():
+    """
+    Tests the pin cookie is set on successful writes only.
+    """
+    headers = await _call_middleware(200)
+    assert headers[0][0] == b"set-cookie"
+    assert headers[0][1].decode("latin-1").startswith(f"{PRIMARY_PIN_COOKIE}=")
+
+    # Reads, failed writes and background uploads not committed yet are not pinned
+    assert await _call_middleware(200, "GET") == []
+    assert await _call_middleware(400) == []
+    assert await _call_middleware(202) == []
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes_pin_disabled(monkeypatch):
+    """
+    Tests successful writes get no cookie, and no error, when the pin is disabled.
+    """
+    monkeypatch.setattr(database, "DB_REPLICA_PIN_SECONDS", 0)
+    assert await _call_middleware(200) == []
+    assert await _call_middleware(201) == []
+
+
+@pytest.mark.asyncio
+async def test_db_operation_off_event_loop(db: Session):
+    """
+    Tests the blocking calls of synchronous operations run in the thread pool, not in the event loop thread.
+    """
+    @db_operation
+    def select_one(db: Session):
+        return threading.get_ident(), db.execute(text("SELECT 1")).scalar()
+
+    thread, value = await select_one(db)
+    assert value == 1
+    assert thread != threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats(small_pool):
+    """
+    Tests the pool usage reported by /health/pool and the pool metrics.
+    """
+    with small_pool.connect():
+        status, stats = await _get("/health/pool")
+        assert status == 200
+        assert (stats["pool_size"], stats["max_overflow"]) == (1, 0)
+        assert stats["checked_out"] == 1
+        assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "test"}) == 1
+
+        # The pool is exhausted, a second checkout gives up after DB_POOL_TIMEOUT
+        with pytest.raises(PoolTimeoutError):
+            small_pool.connect()
+
+    status, stats = await _get("/health/pool")
+    assert (stats["checked_out"], stats["checked_in"]) == (0, 1)
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds"]["count"] == 2
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "test"}) == 0
+    assert REGISTRY.get_sample_value("db_pool_timeouts_total", {"pool": "test"}) == 1
+
+
+@pytest.mark.asyncio
+async def test_ready_exhausted_pool(small_pool):
+    """
+    Tests the readiness probe answers 503 while every connection of the pool is checked out.
+    """
+    assert await _get("/health/ready") == (200, {"status": "ok"})
+    with small_pool.connect():
+        assert await _get("/health/ready") == (503, {"status": "unavailable", "reason": DB_POOL_EXHAUSTED_MSG})
+    assert await _get("/health/ready") == (200, {"status": "ok"})
+
+
+def test_import_does_not_connect():
+    """
+    Tests importing the application creates no engine, so it starts with the database unreachable.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = "import database, main; assert database._engine is None and database._replica_engine is None"
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, timeout=60,
+                            env={**os.environ, "DB_HOST": "unreachable.invalid", "DB_REPLICA_URL": ""})
+    assert result.returncode == 0
+
+
+def test_pool_limits():
+    """
+    Tests the split of the connection budget among the worker processes.
+    """
+    # Without a budget each pool keeps its own size
+    assert pool_limits(0, 4, 5, 10) == (5, 10)
+    # 10 connections each, 5 kept open and 5 as overflow
+    assert pool_limits(40, 4, 5, 10) == (5, 5)
+    # A budget below the pool size shrinks it, with no overflow
+    assert pool_limits(12, 4, 5, 10) == (3, 0)
+    with pytest.raises(ValueError):
+        pool_limits(3, 4, 5, 10)
@@ -1,19 +1,43 @@
+import json
 import pytest
 
+from datetime import datetime
+
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
-from models.db_models import Department
-from services.department_service import create_departments, create_departments_csv
+from database import SessionLocal
+from models.db_models import Department, Employee, HiresRollup
+from services.department_service import (
+    create_departments,
+    create_departments_csv,
+    create_departments_csv_stream,
+    create_departments_file,
+    get_quarter_hires,
+    get_quarter_hires_table,
+    get_hires_over_avg,
+    rebuild_hires_rollup)
+from services.employee_service import create_employees
+from services.job_service import create_jobs
+from services import parallel_csv
+from services.report_formats import negotiate_media_type, render_report
+from utils import cache
+from utils.cache import report_cache
 from utils.constants import (
     UNIQUE_CONSTRAINT_VIOLATION_MSG,
     DATA_TYPE_ERROR_MSG,
-    BATCH_SIZE)
+    BATCH_SIZE,
+    JSON_MEDIA_TYPE,
+    COLUMNAR_JSON_MEDIA_TYPE,
+    CSV_MEDIA_TYPE)
 from tests.generator import (
     get_valid_departments,
+    get_valid_jobs,
     get_invalid_departments_id,
     get_invalid_departments_name,
     list_of_dicts_to_csv_bytes,
-    list_of_dicts_to_json_bytes)
+    list_of_dicts_to_json_bytes,
+    bytes_to_chunks)
 
 @pytest.mark.asyncio
 async def test_create_departments_successfully(db: Session):
@@ -201,3 +225,256 @@ async def test_create_departments_with_wrong_format(db: Session):
     # Verify no departments were added
     departments = db.query(Department).all()
     assert len(departments) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_departments_with_wrong_format_csv_stream(db: Session):
+    """
+    Tests creating departments from a streamed json body instead of csv.
+    """
+    size = int(BATCH_SIZE*1.5)
+    invalid_departments = get_invalid_departments_name(size)
+    content = list_of_dicts_to_json_bytes(invalid_departments)
+
+    with pytest.raises(Exception) as excinfo:
+        await create_departments_csv_stream(bytes_to_chunks(content, 1024), db)
+    # Assert: Verify the exception message
+    assert DATA_TYPE_ERROR_MSG == str(excinfo.value)
+
+    # Verify no departments were added
+    departments = db.query(Department).all()
+    assert len(departments) == 0
+
+
+@pytest.mark.asyncio
+async def test_reports_by_year(db: Session):
+    """
+    Tests the report queries with the year bind parameter, executing them twice to reuse the prepared statements.
+    """
+    depts = get_valid_departments(3)
+    jobs = get_valid_jobs(2)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    # Department 0 hires 4 employees in 2021, department 1 hires 1 in 2021 and 2 in 2022
+    hires = [(0, 0, "2021-01-15"), (0, 0, "2021-02-01"), (0, 1, "2021-05-20"), (0, 1, "2021-12-31"),
+             (1, 0, "2021-07-01"), (1, 0, "2022-03-01"), (1, 1, "2022-08-01")]
+    employees = [{"id": i, "name": f"name{i}", "datetime": datetime.fromisoformat(hired),
+                  "department_id": dept, "job_id": job} for i, (dept, job, hired) in enumerate(hires)]
+    await create_employees(employees, db)
+
+    for _ in range(2):
+        # Skip the result cache so the second run reuses the prepared statements
+        report_cache.clear()
+        quarter_hires = await get_quarter_hires(db, 2021)
+        assert [(row["department"], row["job"], row["q1"], row["q2"], row["q3"], row["q4"]) for row in quarter_hires] == [
+            ("department0", "job0", 2, 0, 0, 0),
+            ("department0", "job1", 0, 1, 0, 1),
+            ("department1", "job0", 0, 0, 1, 0)]
+
+        # Mean of 2021 is 2.5 hires, only department 0 is over it
+        hires_over_avg = await get_hires_over_avg(db, 2021)
+        assert [(row["department"], row["hired"]) for row in hires_over_avg] == [("department0", 4)]
+
+    # Only department 1 hired in 2022, nobody is over the mean
+    assert await get_hires_over_avg(db, 2022) == []
+
+
+
+@pytest.mark.asyncio
+async def test_report_cache_invalidated_on_commit(db: Session):
+    """
+    Tests that cached reports are reused until new employees are committed.
+    """
+    depts = get_valid_departments(2)
+    jobs = get_valid_jobs(1)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+    await create_employees([{"id": 0, "name": "name0", "datetime": datetime(2021, 1, 1), "department_id": 0, "job_id": 0}], db)
+
+    first = await get_quarter_hires_table(db, 2021)
+    assert await get_quarter_hires_table(db, 2021) is first
+
+    await create_employees([{"id": 1, "name": "name1", "datetime": datetime(2021, 4, 1), "department_id": 1, "job_id": 0}], db)
+    second = await get_quarter_hires_table(db, 2021)
+    assert second is not first
+    assert [(row["department"], row["q1"], row["q2"]) for row in second.records()] == [("department0", 1, 0), ("department1", 0, 1)]
+
+
+
+@pytest.mark.asyncio
+async def test_report_cache_by_session_source(db: Session, monkeypatch):
+    """
+    Tests that reports read from the replica are cached apart from those read from the primary,
+    and not cached right after a write the replica may still lag behind.
+    """
+    await create_departments(get_valid_departments(2), db)
+    await create_jobs(get_valid_jobs(1), db)
+    await create_employees([{"id": 0, "name": "name0", "datetime": datetime(2021, 1, 1), "department_id": 0, "job_id": 0}], db)
+    primary = await get_quarter_hires_table(db, 2021)
+
+    # Flagged as a replica session, but bound to the test database
+    replica = SessionLocal(info={"replica": True})
+    try:
+        # Committed without bumping the cache generation, like a write of another worker
+        db.add(Employee(id=1, name="name1", datetime=datetime(2021, 4, 1), department_id=1, job_id=0))
+        db.commit()
+        fresh = await get_quarter_hires_table(replica, 2021)
+        assert fresh is not primary
+        assert len(fresh.rows) == 2
+        assert await get_quarter_hires_table(db, 2021) is primary
+        # The last write is within the replication lag window
+        assert await get_quarter_hires_table(replica, 2021) is not fresh
+
+        monkeypatch.setattr(cache, "DB_REPLICA_PIN_SECONDS", 0)
+        fresh = await get_quarter_hires_table(replica, 2021)
+        assert await get_quarter_hires_table(replica, 2021) is fresh
+    finally:
+        replica.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_hires_rollup(db: Session):
+    """
+    Tests that the rollup of a year is recomputed from the employees table.
+    """
+    depts = get_valid_departments(2)
+    jobs = get_valid_jobs(1)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+    await create_employees([
+        {"id": 0, "name": "name0", "datetime": datetime(2021, 1, 1), "department_id": 0, "job_id": 0},
+        {"id": 1, "name": "name1", "datetime": datetime(2021, 12, 31, 23, 59), "department_id": 1, "job_id": 0},
+        {"id": 2, "name": "name2", "datetime": datetime(2022, 1, 1), "department_id": 1, "job_id": 0}], db)
+    expected = await get_quarter_hires(db, 2021)
+
+    # Simulate a rollup out of sync with the employees
+    db.execute(delete(HiresRollup))
+    db.add(HiresRollup(department_id=0, job_id=0, year=2021, quarter=2, hires=5))
+    db.commit()
+
+    assert await rebuild_hires_rollup(db, 2021) == 2
+    assert await get_quarter_hires(db, 2021) == expected
+    # Other years are not touched
+    assert db.query(HiresRollup).filter(HiresRollup.year == 2022).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_create_departments_partial(db: Session):
+    """
+    Tests that a partial load commits the valid departments and reports the rejected ones with their row.
+    """
+    size = int(BATCH_SIZE*1.5)
+    invalid_departments = get_invalid_departments_id(size)
+    # A second bad record in the first batch
+    invalid_departments[10]["id"] = invalid_departments[3]["id"]
+
+    result = await create_departments(invalid_departments, db, partial=True)
+    assert result["created"] == size - 1
+    assert [(item["row"], item["reason"]) for item in result["rejected"]] == [
+        (11, UNIQUE_CONSTRAINT_VIOLATION_MSG),
+        (size + 1, UNIQUE_CONSTRAINT_VIOLATION_MSG)]
+    assert result["rejected"][0]["record"] == invalid_departments[10]
+
+    # Only the rejected rows are missing
+    assert db.query(Department).count() == size - 1
+
+    # The same through the COPY loader
+    db.execute(delete(Department))
+    db.commit()
+    columns = invalid_departments[0].keys()
+    content = list_of_dicts_to_csv_bytes(invalid_departments, columns)
+    result = await create_departments_csv_stream(bytes_to_chunks(content, 1024), db, partial=True)
+    assert result["created"] == size - 1
+    assert [item["row"] for item in result["rejected"]] == [11, size + 1]
+    assert result["rejected"][0]["record"]["department"] == "department10"
+    assert db.query(Department).count() == size - 1
+
+
+@pytest.mark.asyncio
+async def test_create_departments_partial_parallel(db: Session, tmp_path, monkeypatch):
+    """
+    Tests that a partial load of a file parsed by the parser processes only rejects its malformed rows.
+    """
+    # Every file is parsed in parallel
+    monkeypatch.setattr(parallel_csv, "PARALLEL_PARSE_MIN_BYTES", 0)
+    monkeypatch.setattr(parallel_csv, "PARSE_WORKERS", 2)
+    size = int(BATCH_SIZE*1.5)
+    departments = get_valid_departments(size)
+    columns = list(departments[0].keys())
+    lines = list_of_dicts_to_csv_bytes(departments, columns).decode("utf-8").splitlines()
+    # A record with more fields than columns
+    lines[10] += ",extra"
+    path = tmp_path / "departments.csv"
+    path.write_text("\n".join(lines) + "\n")
+
+    result = await create_departments_file(str(path), db, partial=True)
+    assert result["created"] == size - 1
+    assert [(item["row"], item["reason"]) for item in result["rejected"]] == [(11, DATA_TYPE_ERROR_MSG)]
+    assert db.query(Department).count() == size - 1
+
+
+@pytest.mark.asyncio
+async def test_report_formats(db: Session):
+    """
+    Tests the media types negotiated from the Accept header and the serialized reports.
+    """
+    depts = get_valid_departments(2)
+    jobs = get_valid_jobs(1)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+    await create_employees([{"id": 0, "name": "name0", "datetime": datetime(2021, 1, 1), "department_id": 0, "job_id": 0}], db)
+    table = await get_quarter_hires_table(db, 2021)
+
+    assert negotiate_media_type(None) == JSON_MEDIA_TYPE
+    assert negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+    assert negotiate_media_type("text/*") == CSV_MEDIA_TYPE
+    assert negotiate_media_type(f"{JSON_MEDIA_TYPE};q=0.5, {COLUMNAR_JSON_MEDIA_TYPE}") == COLUMNAR_JSON_MEDIA_TYPE
+    assert negotiate_media_type("application/xml") is None
+
+    response = render_report(table, JSON_MEDIA_TYPE)
+    assert json.loads(response.body) == table.records()
+
+    response = render_report(table, COLUMNAR_JSON_MEDIA_TYPE)
+    columnar = json.loads(response.body)
+    assert columnar["columns"] == ["department", "job", "q1", "q2", "q3", "q4"]
+    assert columnar["rows"] == [["department0", "job0", 1, 0, 0, 0]]
+
+    response = render_report(table, CSV_MEDIA_TYPE)
+    assert response.body.decode("utf-8") == "department,job,q1,q2,q3,q4\ndepartment0,job0,1,0,0,0\n"
+
+
+@pytest.mark.asyncio
+async def test_create_departments_parquet_and_arrow(db: Session, tmp_path):
+    """
+    Tests loading departments from Parquet and Arrow IPC files.
+    """
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    size = int(BATCH_SIZE*2.5)
+    valid_departments = get_valid_departments(size)
+    table = pyarrow.Table.from_pylist(valid_departments)
+
+    path = tmp_path / "departments.parquet"
+    pyarrow.parquet.write_table(table.slice(0, BATCH_SIZE), path)
+    assert await create_departments_file(str(path), db, file_format="parquet") == BATCH_SIZE
+
+    path = tmp_path / "departments.arrow"
+    with pyarrow.OSFile(str(path), "wb") as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.slice(BATCH_SIZE), max_chunksize=300)
+    assert await create_departments_file(str(path), db, file_format="arrow") == size - BATCH_SIZE
+
+    # Verify the departments were added
+    departments = db.query(Department).all()
+    assert {d.id for d in departments} == {d["id"] for d in valid_departments}
+
+    # Columns that are not in the table are rejected
+    path = tmp_path / "unexpected.parquet"
+    pyarrow.parquet.write_table(pyarrow.table({"id": [size], "department": ["other"], "extra": [1]}), path)
+    with pytest.raises(Exception) as excinfo:
+        await create_departments_file(str(path), db, file_format="parquet")
+    assert DATA_TYPE_ERROR_MSG == str(excinfo.value)
+
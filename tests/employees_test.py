@@ -1,15 +1,31 @@
+import json
 import pytest
 
+from datetime import datetime
+
 from sqlalchemy.orm import Session
+from starlette.requests import Request
 
 from models.db_models import Employee
-from services.employee_service import create_employees, create_employees_csv
+from routers.employee_router import get_page_db
+from services.employee_service import (
+    create_employees,
+    create_employees_csv,
+    create_employees_csv_stream,
+    create_employees_file,
+    validate_employees_csv_stream,
+    validate_employees_file,
+    list_employees,
+    stream_employees)
+from services.parallel_csv import parse_csv_parallel
 from services.department_service import create_departments
 from services.job_service import create_jobs
 from utils.constants import (
     UNIQUE_CONSTRAINT_VIOLATION_MSG,
     DATA_TYPE_ERROR_MSG,
     FOREIGN_KEY_VIOLATION_MSG,
+    CONFLICT_ROWS_MSG,
+    NDJSON_MEDIA_TYPE,
     BATCH_SIZE)
 from tests.generator import (
     get_valid_employees,
@@ -17,7 +33,8 @@ from tests.generator import (
     get_valid_departments,
     get_invalid_employees_id,
     list_of_dicts_to_csv_bytes,
-    list_of_dicts_to_json_bytes)
+    list_of_dicts_to_json_bytes,
+    bytes_to_chunks)
 from utils.log_manager import SingletonLogger
 
 logger = SingletonLogger().get_logger()
@@ -78,7 +95,7 @@ async def test_create_employees_with_duplicate_primary_key(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees(invalid_employees, db)
     # Assert: Verify the exception message
-    assert UNIQUE_CONSTRAINT_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
 
     # Over BATCH_SIZE scenario
     size = int(BATCH_SIZE*1.5)
@@ -87,7 +104,7 @@ async def test_create_employees_with_duplicate_primary_key(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees(invalid_employees, db)
     # Assert: Verify the exception message
-    assert UNIQUE_CONSTRAINT_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
 
     # Verify no employees were added
     employees = db.query(Employee).all()
@@ -115,7 +132,7 @@ async def test_create_employees_no_jobs(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees(valid_employees[:limit], db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -139,7 +156,7 @@ async def test_create_employees_no_dept(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees(valid_employees[:limit], db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -160,7 +177,7 @@ async def test_create_employees_no_dept_no_job(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees(valid_employees[:limit], db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -221,7 +238,7 @@ async def test_create_employees_with_duplicate_primary_key_csv(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees_csv(list_of_dicts_to_csv_bytes(invalid_employees, columns), db)
     # Assert: Verify the exception message
-    assert UNIQUE_CONSTRAINT_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
 
     # Over BATCH_SIZE scenario
     size = int(BATCH_SIZE*1.5)
@@ -230,7 +247,7 @@ async def test_create_employees_with_duplicate_primary_key_csv(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees_csv(list_of_dicts_to_csv_bytes(invalid_employees, columns), db)
     # Assert: Verify the exception message
-    assert UNIQUE_CONSTRAINT_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
 
     # Verify no employees were added
     employees = db.query(Employee).all()
@@ -259,7 +276,7 @@ async def test_create_employees_no_dept_csv(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees_csv(list_of_dicts_to_csv_bytes(valid_employees[:limit],columns), db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -284,7 +301,7 @@ async def test_create_employees_no_jobs_csv(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees_csv(list_of_dicts_to_csv_bytes(valid_employees[:limit],columns), db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -306,7 +323,7 @@ async def test_create_employees_no_dept_no_job_csv(db: Session):
     with pytest.raises(Exception) as excinfo:
         await create_employees_csv(list_of_dicts_to_csv_bytes(valid_employees[:limit],columns), db)
         # Assert: Verify the exception message
-    assert FOREIGN_KEY_VIOLATION_MSG == str(excinfo.value)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
 
 
 @pytest.mark.asyncio
@@ -343,4 +360,313 @@ async def test_create_employees_wrong_format(db: Session):
 
     # Verify the employees were added
     employees = db.query(Employee).all()
-    assert len(employees) == 0
\ No newline at end of file
+    assert len(employees) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_employees_successfully_csv_stream(db: Session):
+    """
+    Tests successful creation of employees from a CSV streamed in small chunks, with and without header.
+    """
+    size = int(BATCH_SIZE*2.5)
+    limit = int(BATCH_SIZE * 0.5)
+
+    # Get employees to create
+    jobs = get_valid_jobs(30)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(10)
+    dept_ids = [d["id"] for d in depts]
+    valid_employees = get_valid_employees(size,dept_ids,job_ids)
+    columns = list(valid_employees[0].keys())
+
+    # Create necessary jobs and departments
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    # Without header, chunks smaller than a record
+    content = list_of_dicts_to_csv_bytes(valid_employees[:limit], columns)
+    created_count = await create_employees_csv_stream(bytes_to_chunks(content, 7), db)
+    assert created_count == limit
+
+    # With header, over several batches
+    content = (",".join(columns) + "\n").encode("utf-8") + list_of_dicts_to_csv_bytes(valid_employees[limit:], columns)
+    created_count = await create_employees_csv_stream(bytes_to_chunks(content, 4096), db)
+    assert created_count == size-limit
+
+    # Verify the employees were added
+    employees = db.query(Employee).all()
+    assert len(employees) == size
+    assert {d.id for d in employees} == {d["id"] for d in valid_employees}
+
+
+@pytest.mark.asyncio
+async def test_create_employees_with_duplicate_primary_key_csv_stream(db: Session):
+    """
+    Tests that a duplicate in a later batch of a streamed CSV rolls back the batches already flushed.
+    """
+
+    # Get employees to create
+    jobs = get_valid_jobs(30)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(10)
+    dept_ids = [d["id"] for d in depts]
+
+    # Create necessary jobs and departments
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    size = int(BATCH_SIZE*1.5)
+    invalid_employees = get_invalid_employees_id(size,dept_ids,job_ids)
+    columns = invalid_employees[0].keys()
+    content = list_of_dicts_to_csv_bytes(invalid_employees, columns)
+
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_csv_stream(bytes_to_chunks(content, 1024), db)
+    # Assert: Verify the exception message
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
+
+    # Verify no employees were added
+    employees = db.query(Employee).all()
+    assert len(employees) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_employees_no_dept_csv_stream(db: Session):
+    """
+    Tests that the COPY loader maps foreign key violations like the ORM path.
+    """
+    size = int(BATCH_SIZE*1.6)
+
+    # Get employees to create
+    jobs = get_valid_jobs(30)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(10)
+    dept_ids = [d["id"] for d in depts]
+    valid_employees = get_valid_employees(size,dept_ids,job_ids)
+    columns = valid_employees[0].keys()
+
+    # Create jobs only
+    await create_jobs(jobs, db)
+
+    content = list_of_dicts_to_csv_bytes(valid_employees, columns)
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_csv_stream(bytes_to_chunks(content, 4096), db)
+    # Assert: Verify the exception message
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
+
+
+@pytest.mark.asyncio
+async def test_create_employees_invalid_datetime_csv_stream(db: Session):
+    """
+    Tests that the COPY loader maps invalid values to the data type error.
+    """
+    size = int(BATCH_SIZE*0.5)
+
+    # Get employees to create
+    jobs = get_valid_jobs(30)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(10)
+    dept_ids = [d["id"] for d in depts]
+    invalid_employees = get_valid_employees(size,dept_ids,job_ids)
+    invalid_employees[-1]["datetime"] = "not a date"
+    columns = invalid_employees[0].keys()
+
+    # Create necessary jobs and departments
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    content = list_of_dicts_to_csv_bytes(invalid_employees, columns)
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_csv_stream(bytes_to_chunks(content, 4096), db)
+    # Assert: Verify the exception message
+    assert DATA_TYPE_ERROR_MSG == str(excinfo.value)
+
+    # Verify no employees were added
+    employees = db.query(Employee).all()
+    assert len(employees) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_employees_file_parallel(db: Session, tmp_path):
+    """
+    Tests that a CSV file parsed by byte ranges in several processes keeps every record, in order.
+    """
+    size = int(BATCH_SIZE*2.5)
+
+    # Get employees to create
+    jobs = get_valid_jobs(30)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(10)
+    dept_ids = [d["id"] for d in depts]
+    valid_employees = get_valid_employees(size,dept_ids,job_ids)
+    # Quoted line breaks must not be taken as record boundaries
+    valid_employees[0]["name"] = "first\nlast"
+    columns = list(valid_employees[0].keys())
+
+    path = tmp_path / "employees.csv"
+    path.write_bytes((",".join(columns) + "\n").encode("utf-8") + list_of_dicts_to_csv_bytes(valid_employees, columns))
+
+    # Ranges much smaller than the file, so it is split in many tasks
+    records = [record async for batch in parse_csv_parallel(str(path), columns, BATCH_SIZE, 2, 4096) for record in batch]
+    assert [int(record["id"]) for record in records] == [e["id"] for e in valid_employees]
+    assert records[0]["name"] == "first\nlast"
+
+    # Create necessary jobs and departments
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    created_count = await create_employees_file(str(path), db)
+    assert created_count == size
+
+    # Verify the employees were added
+    employees = db.query(Employee).all()
+    assert len(employees) == size
+
+
+@pytest.mark.asyncio
+async def test_create_employees_columnar_coercion(db: Session):
+    """
+    Tests the conversion of raw CSV values: integers, ISO-8601 datetimes and empty values of nullable columns.
+    """
+    jobs = get_valid_jobs(3)
+    depts = get_valid_departments(3)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    records = [
+        {"id": "1", "name": "name1", "datetime": "2021-07-27T16:02:08Z", "department_id": "1", "job_id": "2"},
+        {"id": "2", "name": "name2", "datetime": "2021-07-27 16:02:08.5", "department_id": " ", "job_id": ""},
+        {"id": "3", "name": "name3", "datetime": "", "department_id": "2", "job_id": "1"}]
+    assert await create_employees(records, db) == 3
+
+    employees = {e.id: e for e in db.query(Employee).all()}
+    assert employees[1].datetime == datetime(2021, 7, 27, 16, 2, 8)
+    assert employees[1].department_id == 1
+    assert employees[2].datetime == datetime(2021, 7, 27, 16, 2, 8, 500000)
+    assert employees[2].department_id is None and employees[2].job_id is None
+    assert employees[3].datetime is None
+
+    # Integer columns reject values that are not integers
+    with pytest.raises(Exception) as excinfo:
+        await create_employees([{"id": "4", "name": "name4", "datetime": "", "department_id": "one", "job_id": "1"}], db)
+    assert DATA_TYPE_ERROR_MSG == str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_employees_preflight_conflicts(db: Session, tmp_path):
+    """
+    Tests that every duplicate id and unknown department or job is reported before inserting.
+    """
+    jobs = get_valid_jobs(5)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(5)
+    dept_ids = [d["id"] for d in depts]
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    size = int(BATCH_SIZE*1.5)
+    employees = get_valid_employees(size, dept_ids, job_ids)
+    await create_employees(employees[:10], db)
+
+    upload = employees[5:]  # Rows 1 to 5 are already in the database
+    upload[20]["department_id"] = 100  # Unknown department
+    upload[BATCH_SIZE + 3]["job_id"] = 100  # Unknown job, in the second batch
+    upload.append(dict(upload[30]))  # Repeated in the upload
+    expected = [(1, UNIQUE_CONSTRAINT_VIOLATION_MSG), (2, UNIQUE_CONSTRAINT_VIOLATION_MSG),
+                (3, UNIQUE_CONSTRAINT_VIOLATION_MSG), (4, UNIQUE_CONSTRAINT_VIOLATION_MSG),
+                (5, UNIQUE_CONSTRAINT_VIOLATION_MSG), (21, FOREIGN_KEY_VIOLATION_MSG),
+                (BATCH_SIZE + 4, FOREIGN_KEY_VIOLATION_MSG), (len(upload), UNIQUE_CONSTRAINT_VIOLATION_MSG)]
+    columns = list(upload[0].keys())
+    content = list_of_dicts_to_csv_bytes(upload, columns)
+
+    report = await validate_employees_csv_stream(bytes_to_chunks(content, 4096), db)
+    assert report["rows"] == len(upload)
+    assert [(item["row"], item["reason"]) for item in report["conflicts"]] == expected
+    assert db.query(Employee).count() == 10
+
+    # The same from a Parquet file
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+    path = tmp_path / "employees.parquet"
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(upload), path)
+    report = await validate_employees_file(str(path), db, file_format="parquet")
+    assert report["rows"] == len(upload)
+    assert [(item["row"], item["reason"]) for item in report["conflicts"]] == expected
+
+    # The conflicts abort the load before inserting and are listed in the error
+    message = "; ".join([
+        CONFLICT_ROWS_MSG.format(reason=UNIQUE_CONSTRAINT_VIOLATION_MSG, rows=f"1, 2, 3, 4, 5, {len(upload)}"),
+        CONFLICT_ROWS_MSG.format(reason=FOREIGN_KEY_VIOLATION_MSG, rows=f"21, {BATCH_SIZE + 4}")])
+    with pytest.raises(Exception) as excinfo:
+        await create_employees(upload, db)
+    assert str(excinfo.value) == message
+    assert db.query(Employee).count() == 10
+
+    # The COPY loader validates the whole upload to list every conflict
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_csv_stream(bytes_to_chunks(content, 4096), db)
+    assert str(excinfo.value) == message
+    assert db.query(Employee).count() == 10
+
+    # A partial load rejects every conflict and inserts the rest
+    result = await create_employees(upload, db, partial=True)
+    assert [(item["row"], item["reason"]) for item in result["rejected"]] == expected
+    assert result["created"] == len(upload) - len(expected)
+    assert db.query(Employee).count() == 10 + result["created"]
+
+
+@pytest.mark.asyncio
+async def test_list_employees(db: Session):
+    """
+    Tests walking the employees with keyset pagination and as an NDJSON stream, with filters.
+    """
+    jobs = get_valid_jobs(3)
+    job_ids = [j["id"] for j in jobs]
+    depts = get_valid_departments(3)
+    dept_ids = [d["id"] for d in depts]
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    size = int(BATCH_SIZE*2.5)
+    valid_employees = get_valid_employees(size, dept_ids, job_ids)
+    for i, employee in enumerate(valid_employees):
+        employee["datetime"] = datetime(2020 + i % 3, 6, 1)
+    await create_employees(valid_employees, db)
+
+    # Every page follows the cursor of the previous one
+    ids = []
+    after_id = None
+    while True:
+        page = await list_employees(db, after_id=after_id, limit=400)
+        ids.extend(item["id"] for item in page["items"])
+        after_id = page["next_after_id"]
+        if after_id is None:
+            break
+    assert ids == [e["id"] for e in valid_employees]
+
+    # Filters by department and half-open hiring date range
+    expected = [e["id"] for e in valid_employees
+                if e["department_id"] == dept_ids[0] and e["datetime"].year == 2021]
+    page = await list_employees(db, department_id=dept_ids[0], hired_from=datetime(2021, 1, 1),
+                                hired_to=datetime(2022, 1, 1), limit=size)
+    assert [item["id"] for item in page["items"]] == expected
+    assert page["next_after_id"] is None
+
+    # The stream returns the same rows, resuming after a given id
+    lines = b"".join(stream_employees(job_id=job_ids[1], after_id=100)).decode("utf-8").splitlines()
+    streamed = [json.loads(line) for line in lines]
+    assert [item["id"] for item in streamed] == [e["id"] for e in valid_employees
+                                                  if e["job_id"] == job_ids[1] and e["id"] > 100]
+    assert streamed[0]["datetime"] == valid_employees[streamed[0]["id"]]["datetime"].isoformat()
+
+
+def test_employees_stream_without_session():
+    """
+    Tests that listing employees as NDJSON does not check out a session, the stream opens its own.
+    """
+    def listing_db(accept: str):
+        request = Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+        return next(get_page_db(request))
+
+    assert listing_db(NDJSON_MEDIA_TYPE) is None
+    assert isinstance(listing_db("application/json"), Session)
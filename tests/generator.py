@@ -49,6 +49,18 @@ def list_of_dicts_to_json_bytes(data: List[Dict[str, Any]]):
 
     return json.dumps(data, cls=DateTimeEncoder).encode('utf-8')
 
+def list_of_dicts_to_ndjson_bytes(data: List[Dict[str, Any]]):
+    """
+    Converts a list of dictionaries to NDJSON bytes, one json object per line.
+
+    Args:
+        data (list): The list of dictionaries to convert.
+
+    Returns:
+        bytes: The converted data in NDJSON bytes format.
+    """
+    return b"".join(list_of_dicts_to_json_bytes(item) + b"\n" for item in data)
+
 def get_valid_departments(size: int) -> List[Dict[str, Any]]:
     """
     Generate a list of valid department dictionaries.
@@ -133,4 +145,15 @@ def get_invalid_employees_id(size: int, department_ids: List[int], job_ids: List
     """
     employees = [{"id": i, "name": f"name{i}", "datetime":datetime.now(), "department_id":random.choice(department_ids), "job_id":random.choice(job_ids)} for i in range(size)]
     employees.append({"id": 1, "name": "name1", "datetime":datetime.now(), "department_id":random.choice(department_ids), "job_id":random.choice(job_ids)})  # Duplicate ID
-    return employees
\ No newline at end of file
+    return employees
+
+async def bytes_to_chunks(content: bytes, chunk_size: int):
+    """
+    Split bytes into chunks, simulating a streamed file or request body.
+
+    :param content: The full content to stream.
+    :param chunk_size: Number of bytes per chunk.
+    :return: An async generator yielding the content chunk by chunk.
+    """
+    for i in range(0, len(content), chunk_size):
+        yield content[i:i + chunk_size]
@@ -0,0 +1,154 @@
+import asyncio
+import math
+import os
+import pytest
+
+from sqlalchemy.orm import Session
+
+from models.db_models import Department
+from services import ingestion_service
+from services.ingestion_service import (
+    enqueue_ingestion,
+    fail_interrupted_jobs,
+    get_ingestion_job,
+    start_ingestion_workers,
+    stop_ingestion_workers)
+from utils.constants import UNIQUE_CONSTRAINT_VIOLATION_MSG, INGESTION_SHUTDOWN_MSG, BATCH_SIZE
+from tests.generator import (
+    get_valid_departments,
+    get_invalid_departments_id,
+    list_of_dicts_to_csv_bytes,
+    bytes_to_chunks)
+
+async def run_ingestion(table: str, content: bytes, partial: bool = False) -> str:
+    """
+    Runs a background ingestion job until it finishes and returns its id.
+    """
+    start_ingestion_workers(1)
+    try:
+        job_id = await enqueue_ingestion(table, bytes_to_chunks(content, 1024), partial)
+        await ingestion_service._queue.join()
+    finally:
+        await stop_ingestion_workers()
+    return job_id
+
+
+@pytest.mark.asyncio
+async def test_background_ingestion_successfully(db: Session):
+    """
+    Tests a background load of departments and the progress reported by its job.
+    """
+    size = int(BATCH_SIZE*2.5)
+    valid_departments = get_valid_departments(size)
+    content = list_of_dicts_to_csv_bytes(valid_departments, valid_departments[0].keys())
+
+    job_id = await run_ingestion("departments", content)
+
+    job = await get_ingestion_job(job_id, db)
+    assert job["state"] == "succeeded"
+    assert job["rows_processed"] == size
+    assert job["batches_loaded"] == math.ceil(size / BATCH_SIZE)
+    assert job["error"] is None
+    assert job["finished_at"] >= job["started_at"]
+
+    # Verify the departments were added
+    assert db.query(Department).count() == size
+
+
+@pytest.mark.asyncio
+async def test_background_ingestion_failure(db: Session):
+    """
+    Tests that a failing background load is rolled back and reports the error.
+    """
+    size = int(BATCH_SIZE*1.5)
+    invalid_departments = get_invalid_departments_id(size)
+    content = list_of_dicts_to_csv_bytes(invalid_departments, invalid_departments[0].keys())
+
+    job_id = await run_ingestion("departments", content)
+
+    job = await get_ingestion_job(job_id, db)
+    assert job["state"] == "failed"
+    assert job["error"] == UNIQUE_CONSTRAINT_VIOLATION_MSG
+
+    # Verify no departments were added
+    assert db.query(Department).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_background_ingestion_partial(db: Session):
+    """
+    Tests that a partial background load succeeds and stores the rejected rows in its job.
+    """
+    size = int(BATCH_SIZE*1.5)
+    invalid_departments = get_invalid_departments_id(size)
+    content = list_of_dicts_to_csv_bytes(invalid_departments, invalid_departments[0].keys())
+
+    job_id = await run_ingestion("departments", content, partial=True)
+
+    job = await get_ingestion_job(job_id, db)
+    assert job["state"] == "succeeded"
+    assert job["rows_processed"] == size + 1
+    assert job["rejected"] == [{
+        "row": size + 1,
+        "reason": UNIQUE_CONSTRAINT_VIOLATION_MSG,
+        "record": {"id": "1", "department": "department"}}]
+
+    # Verify the valid departments were added
+    assert db.query(Department).count() == size
+
+
+@pytest.mark.asyncio
+async def test_unknown_ingestion_job(db: Session):
+    """
+    Tests querying a job that does not exist.
+    """
+    assert await get_ingestion_job("missing", db) is None
+
+
+@pytest.mark.asyncio
+async def test_background_ingestion_shutdown(db: Session, tmp_path, monkeypatch):
+    """
+    Tests the jobs being loaded and the jobs queued fail when the workers stop, and their files are removed.
+    """
+    monkeypatch.setattr(ingestion_service, "INGESTION_SPOOL_DIR", str(tmp_path))
+    started = asyncio.Event()
+
+    async def blocking_loader(path, db, **options):
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setitem(ingestion_service.LOADERS, "departments", blocking_loader)
+    content = list_of_dicts_to_csv_bytes(get_valid_departments(10), ["id", "department"])
+
+    start_ingestion_workers(1)
+    try:
+        running = await enqueue_ingestion("departments", bytes_to_chunks(content, 1024))
+        queued = await enqueue_ingestion("departments", bytes_to_chunks(content, 1024))
+        await started.wait()
+    finally:
+        await stop_ingestion_workers()
+
+    for job_id in (running, queued):
+        job = await get_ingestion_job(job_id, db)
+        assert job["state"] == "failed"
+        assert job["error"] == INGESTION_SHUTDOWN_MSG
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_fail_interrupted_jobs(db: Session, tmp_path, monkeypatch):
+    """
+    Tests the jobs left queued or running by a previous run fail when the API starts.
+    """
+    monkeypatch.setattr(ingestion_service, "INGESTION_SPOOL_DIR", str(tmp_path))
+    (tmp_path / "left.upload").write_bytes(b"id,department")
+    ingestion_service._create_job("queued", "departments")
+    ingestion_service._create_job("running", "departments")
+    ingestion_service._update_job("running", state="running")
+
+    assert fail_interrupted_jobs() == 2
+    for job_id in ("queued", "running"):
+        job = await get_ingestion_job(job_id, db)
+        assert job["state"] == "failed"
+        assert job["error"] == INGESTION_SHUTDOWN_MSG
+    assert os.listdir(tmp_path) == []
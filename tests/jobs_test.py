@@ -201,3 +201,24 @@ async def test_create_jobs_with_wrong_format(db: Session):
     # Verify no jobs were added
     jobs = db.query(Job).all()
     assert len(jobs) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_jobs_partial(db: Session):
+    """
+    Tests that a partial load commits the valid jobs and reports the rejected ones by row, with their record.
+    """
+    size = int(BATCH_SIZE*1.5)
+    invalid_jobs = get_invalid_jobs_id(size)
+    # Another bad record in each batch
+    invalid_jobs[BATCH_SIZE + 5]["id"] = invalid_jobs[3]["id"]
+    invalid_jobs[10]["id"] = invalid_jobs[3]["id"]
+
+    result = await create_jobs(invalid_jobs, db, partial=True)
+    assert result["created"] == size - 2
+    assert [item["row"] for item in result["rejected"]] == [11, BATCH_SIZE + 6, size + 1]
+    assert [item["record"] for item in result["rejected"]] == [
+        invalid_jobs[10], invalid_jobs[BATCH_SIZE + 5], invalid_jobs[size]]
+    assert all(item["reason"] == UNIQUE_CONSTRAINT_VIOLATION_MSG for item in result["rejected"])
+    assert db.query(Job).count() == size - 2
+
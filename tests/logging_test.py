@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+import pytest
+import queue
+
+from logging.handlers import QueueListener
+
+from sqlalchemy.orm import Session
+
+from services.department_service import create_departments
+from utils.log_manager import DroppingQueueHandler, JsonFormatter, SingletonLogger, parse_levels
+from tests.generator import get_valid_departments
+
+
+def test_queued_exception_json():
+    """
+    Tests the exception of a queued record reaches the JSON formatter of the listener.
+    """
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    front = DroppingQueueHandler(queue.Queue(10))
+    listener = QueueListener(front.queue, handler)
+
+    logger = logging.getLogger("tests.logging_test")
+    logger.propagate = False
+    logger.addHandler(front)
+    listener.start()
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("Load %s failed", "jobs")
+    finally:
+        listener.stop()
+        logger.removeHandler(front)
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "Load jobs failed"
+    assert entry["level"] == "ERROR"
+    assert "ZeroDivisionError" in entry["exception"]
+
+
+def test_parse_levels():
+    """
+    Tests the parsing of the per module log levels.
+    """
+    assert parse_levels("partial_load=error, sql_timing=DEBUG,,invalid") == {
+        "partial_load": logging.ERROR, "sql_timing": logging.DEBUG}
+
+
+@pytest.mark.asyncio
+async def test_rejected_rows_logs_rate_limited(db: Session):
+    """
+    Tests that the warnings of the rows rejected by a partial load are rate limited.
+    """
+    rate_limit = SingletonLogger().rate_limit
+    suppressed = rate_limit.suppressed_total
+    duplicates = rate_limit.limit * 3
+    departments = get_valid_departments(10)
+    departments += [{"id": 1, "department": f"duplicate{i}"} for i in range(duplicates)]
+
+    result = await create_departments(departments, db, partial=True)
+    assert len(result["rejected"]) == duplicates
+    # At most LOG_RATE_LIMIT of the repeated warnings are written
+    assert rate_limit.suppressed_total - suppressed >= duplicates - rate_limit.limit
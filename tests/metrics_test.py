@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+import pytest
+
+from prometheus_client import REGISTRY, multiprocess
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy.orm import Session
+
+from database import get_pool_stats, merge_pool_stats
+from services.department_service import create_departments
+from services.employee_service import create_employees, create_employees_csv_stream
+from services.job_service import create_jobs
+from utils import metrics, worker_stats
+from utils.constants import (
+    UNIQUE_CONSTRAINT_VIOLATION_MSG,
+    FOREIGN_KEY_VIOLATION_MSG,
+    BATCH_SIZE)
+from tests.generator import (
+    get_valid_employees,
+    get_valid_departments,
+    get_valid_jobs,
+    list_of_dicts_to_csv_bytes,
+    bytes_to_chunks)
+
+# Records the metrics of a worker process
+WORKER_SCRIPT = """
+from database import pool_checked_out
+from utils.metrics import rows_ingested
+
+rows_ingested.labels("jobs").inc(5)
+pool_checked_out.labels("primary").set(2)
+"""
+
+
+def _run_worker(metrics_dir: str) -> int:
+    """
+    Runs a worker process writing its metrics to metrics_dir and returns its pid.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    worker = subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT], cwd=root,
+                              env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": metrics_dir})
+    assert worker.wait() == 0
+    return worker.pid
+
+
+def _sample(name: str, **labels: str) -> float:
+    """
+    Returns a sample of the metrics of this process, 0 when it was never recorded.
+    """
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _samples() -> dict:
+    """
+    Returns the rendered metrics by sample name and labels.
+    """
+    return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(metrics.render_metrics().decode())
+            for sample in family.samples}
+
+
+def test_merge_worker_metrics(tmp_path, monkeypatch):
+    """
+    Tests that the metrics of several workers are added up, without the gauges of exited ones.
+    """
+    metrics_dir = str(tmp_path)
+    monkeypatch.setattr(metrics, "PROMETHEUS_MULTIPROC_DIR", metrics_dir)
+    first, _ = _run_worker(metrics_dir), _run_worker(metrics_dir)
+
+    samples = _samples()
+    assert samples[("rows_ingested_total", (("table", "jobs"),))] == 10
+    assert samples[("db_pool_checked_out", (("pool", "primary"),))] == 4
+
+    # The counters of an exited worker are kept, not its gauges
+    multiprocess.mark_process_dead(first, metrics_dir)
+    samples = _samples()
+    assert samples[("rows_ingested_total", (("table", "jobs"),))] == 10
+    assert samples[("db_pool_checked_out", (("pool", "primary"),))] == 2
+
+
+def test_merge_dead_worker_stats(tmp_path, monkeypatch):
+    """
+    Tests the pool stats of exited workers are kept, even when a later worker reuses their pid.
+    """
+    monkeypatch.setattr(worker_stats, "WORKER_STATS_DIR", str(tmp_path))
+    monkeypatch.setattr(worker_stats, "PROMETHEUS_MULTIPROC_DIR", "")
+    stats = get_pool_stats()
+    stats["timeouts"] = 1
+
+    # Three workers exit with the same pid, then a fourth one runs with it
+    for _ in range(3):
+        worker_stats.write_worker_stats({"pool": stats})
+        worker_stats.mark_worker_dead(os.getpid())
+    worker_stats.write_worker_stats({"pool": stats})
+
+    workers = worker_stats.read_worker_stats()
+    assert [worker["alive"] for worker in workers].count(False) == 3
+    assert {worker["pid"] for worker in workers} == {os.getpid()}
+    totals = merge_pool_stats(workers)
+    assert totals["workers"] == 1
+    assert totals["timeouts"] == 4
+
+
+@pytest.mark.asyncio
+async def test_create_jobs_metrics(db: Session):
+    """
+    Tests the metrics recorded by a load and by a failing load.
+    """
+    ingested = _sample("rows_ingested_total", table="jobs")
+    batches = _sample("batch_flush_rows_count", table="jobs")
+    duplicates = _sample("db_operation_errors_total", operation="create_jobs", category="duplicate")
+
+    size = int(BATCH_SIZE*1.5)
+    await create_jobs(get_valid_jobs(size), db)
+    assert _sample("rows_ingested_total", table="jobs") == ingested + size
+    assert _sample("batch_flush_rows_count", table="jobs") == batches + 2
+
+    # A failing load commits nothing and counts the error by category
+    with pytest.raises(Exception):
+        await create_jobs(get_valid_jobs(size), db)
+    assert _sample("rows_ingested_total", table="jobs") == ingested + size
+    assert _sample("db_operation_errors_total", operation="create_jobs", category="duplicate") == duplicates + 1
+
+    assert b'rows_ingested_total{table="jobs"}' in metrics.render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_create_employees_conflict_metrics(db: Session):
+    """
+    Tests the conflicts found before inserting are counted under their category.
+    """
+    jobs = get_valid_jobs(5)
+    depts = get_valid_departments(5)
+    employees = get_valid_employees(10, [d["id"] for d in depts], [j["id"] for j in jobs])
+
+    def errors(operation, category):
+        return _sample("db_operation_errors_total", operation=operation, category=category)
+
+    foreign_keys = errors("create_employees", "foreign_key")
+    duplicates = errors("create_employees_csv_stream", "duplicate")
+    processing = errors("create_employees", "processing")
+
+    # Unknown departments and jobs
+    with pytest.raises(Exception) as excinfo:
+        await create_employees(employees, db)
+    assert str(excinfo.value).startswith(FOREIGN_KEY_VIOLATION_MSG)
+    assert errors("create_employees", "foreign_key") == foreign_keys + 1
+
+    # Existing ids, loaded with COPY
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+    await create_employees(employees, db)
+    content = list_of_dicts_to_csv_bytes(employees, employees[0].keys())
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_csv_stream(bytes_to_chunks(content, 1024), db)
+    assert str(excinfo.value).startswith(UNIQUE_CONSTRAINT_VIOLATION_MSG)
+    assert errors("create_employees_csv_stream", "duplicate") == duplicates + 1
+    assert errors("create_employees", "processing") == processing
@@ -0,0 +1,109 @@
+import pytest
+
+from sqlalchemy.orm import Session
+
+from models.db_models import Employee, Job
+from services.department_service import create_departments
+from services.employee_service import create_employees, create_employees_ndjson_stream
+from services.job_service import create_jobs, create_jobs_ndjson_stream
+from utils.constants import (
+    UNIQUE_CONSTRAINT_VIOLATION_MSG,
+    FOREIGN_KEY_VIOLATION_MSG,
+    NDJSON_RECORD_ERROR_MSG,
+    CONFLICT_ROWS_MSG,
+    BATCH_SIZE)
+from tests.generator import (
+    get_valid_employees,
+    get_valid_departments,
+    get_valid_jobs,
+    list_of_dicts_to_ndjson_bytes,
+    bytes_to_chunks)
+
+
+@pytest.mark.asyncio
+async def test_create_jobs_ndjson_stream(db: Session):
+    """
+    Tests creating jobs from an NDJSON stream, validated line by line.
+    """
+    size = int(BATCH_SIZE*1.5)
+    valid_jobs = get_valid_jobs(size)
+    content = list_of_dicts_to_ndjson_bytes(valid_jobs)
+    assert await create_jobs_ndjson_stream(bytes_to_chunks(content, 1024), db) == size
+
+    # An invalid line is reported with its line number and nothing is loaded
+    invalid_jobs = [{"id": size + i, "job": f"job{size + i}"} for i in range(BATCH_SIZE)]
+    invalid_jobs[10]["id"] = "invalid"
+    content = list_of_dicts_to_ndjson_bytes(invalid_jobs)
+    with pytest.raises(Exception) as excinfo:
+        await create_jobs_ndjson_stream(bytes_to_chunks(content, 1024), db)
+    assert str(excinfo.value).startswith(NDJSON_RECORD_ERROR_MSG.format(line=11, error="id"))
+
+    # Verify only the valid stream was added
+    jobs = db.query(Job).all()
+    assert len(jobs) == size
+
+
+@pytest.mark.asyncio
+async def test_create_employees_ndjson_stream(db: Session):
+    """
+    Tests creating employees from an NDJSON stream, validated line by line.
+    """
+    jobs = get_valid_jobs(5)
+    depts = get_valid_departments(5)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    size = int(BATCH_SIZE*1.5)
+    employees = get_valid_employees(size, [d["id"] for d in depts], [j["id"] for j in jobs])
+    content = list_of_dicts_to_ndjson_bytes(employees)
+    assert await create_employees_ndjson_stream(bytes_to_chunks(content, 1024), db) == size
+
+    # An invalid line is reported with its line number and nothing is loaded
+    invalid_employees = get_valid_employees(size + 10, [d["id"] for d in depts], [j["id"] for j in jobs])[size:]
+    invalid_employees[3]["datetime"] = "not a date"
+    content = list_of_dicts_to_ndjson_bytes(invalid_employees)
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_ndjson_stream(bytes_to_chunks(content, 1024), db)
+    assert str(excinfo.value).startswith(NDJSON_RECORD_ERROR_MSG.format(line=4, error="datetime"))
+
+    # Verify only the valid stream was added
+    assert db.query(Employee).count() == size
+
+
+@pytest.mark.asyncio
+async def test_employees_ndjson_preflight_conflicts(db: Session):
+    """
+    Tests the duplicate ids and unknown departments or jobs of an NDJSON stream are found before inserting.
+    """
+    jobs = get_valid_jobs(5)
+    depts = get_valid_departments(5)
+    await create_departments(depts, db)
+    await create_jobs(jobs, db)
+
+    size = int(BATCH_SIZE*1.5)
+    employees = get_valid_employees(size, [d["id"] for d in depts], [j["id"] for j in jobs])
+    await create_employees(employees[:10], db)
+
+    upload = employees[5:]  # Rows 1 to 5 are already in the database
+    upload[20]["department_id"] = 100  # Unknown department
+    upload[BATCH_SIZE + 3]["job_id"] = 100  # Unknown job, in the second batch
+    upload.append(dict(upload[30]))  # Repeated in the upload
+    content = list_of_dicts_to_ndjson_bytes(upload)
+
+    # Every conflict is listed and nothing is inserted
+    with pytest.raises(Exception) as excinfo:
+        await create_employees_ndjson_stream(bytes_to_chunks(content, 1024), db)
+    assert str(excinfo.value) == "; ".join([
+        CONFLICT_ROWS_MSG.format(reason=UNIQUE_CONSTRAINT_VIOLATION_MSG, rows=f"1, 2, 3, 4, 5, {len(upload)}"),
+        CONFLICT_ROWS_MSG.format(reason=FOREIGN_KEY_VIOLATION_MSG, rows=f"21, {BATCH_SIZE + 4}")])
+    assert db.query(Employee).count() == 10
+
+    # A partial load rejects every conflict and inserts the rest
+    result = await create_employees_ndjson_stream(bytes_to_chunks(content, 1024), db, partial=True)
+    assert [(item["row"], item["reason"]) for item in result["rejected"]] == [
+        (1, UNIQUE_CONSTRAINT_VIOLATION_MSG), (2, UNIQUE_CONSTRAINT_VIOLATION_MSG),
+        (3, UNIQUE_CONSTRAINT_VIOLATION_MSG), (4, UNIQUE_CONSTRAINT_VIOLATION_MSG),
+        (5, UNIQUE_CONSTRAINT_VIOLATION_MSG), (21, FOREIGN_KEY_VIOLATION_MSG),
+        (BATCH_SIZE + 4, FOREIGN_KEY_VIOLATION_MSG), (len(upload), UNIQUE_CONSTRAINT_VIOLATION_MSG)]
+    assert result["created"] == len(upload) - 8
+    assert db.query(Employee).count() == 10 + result["created"]
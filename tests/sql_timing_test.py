@@ -0,0 +1,67 @@
+import json
+import pytest
+
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session
+
+from models.db_models import Department
+from services.department_service import create_departments, get_quarter_hires_table
+from utils import sql_timing
+from utils.cache import report_cache
+from utils.constants import BATCH_SIZE
+from tests.generator import get_valid_departments
+
+
+@pytest.mark.asyncio
+async def test_slow_statement_plans(db: Session, tmp_path, monkeypatch):
+    """
+    Tests the capture of the plans of slow statements, attributed to their operation.
+    """
+    plans = tmp_path / "slow_queries.jsonl"
+    monkeypatch.setattr(sql_timing, "SLOW_QUERY_SECONDS", 1e-9)
+    monkeypatch.setattr(sql_timing, "SLOW_QUERY_EXPLAIN", True)
+    monkeypatch.setattr(sql_timing, "SLOW_QUERY_EXPLAIN_FILE", str(plans))
+    monkeypatch.setattr(sql_timing, "_explained_at", {})
+
+    size = int(BATCH_SIZE*1.5)
+    assert await create_departments(get_valid_departments(size), db) == size
+    await get_quarter_hires_table(db, 2021)
+    # Run again instead of read from the cache
+    report_cache.bump_generation()
+    await get_quarter_hires_table(db, 2021)
+    assert db.query(Department).count() == size
+
+    entries = [json.loads(line) for line in plans.read_text().splitlines()]
+    assert "get_quarter_hires_table" in {entry["caller"] for entry in entries}
+    assert all(entry["plan"][0]["Plan"] for entry in entries)
+    # Plans are estimated, the statements are not run again
+    assert all("Actual Rows" not in entry["plan"][0]["Plan"] for entry in entries)
+    # The report query run twice is explained once
+    statements = [entry["statement"] for entry in entries]
+    assert len(statements) == len(set(statements))
+    assert REGISTRY.get_sample_value("sql_statement_duration_seconds_count", {"operation": "create_departments"}) > 0
+
+
+def test_explain_rate_limited(monkeypatch):
+    """
+    Tests a statement is explained at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds.
+    """
+    monkeypatch.setattr(sql_timing, "_explained_at", {})
+    assert sql_timing._should_explain("SELECT 1")
+    assert not sql_timing._should_explain("SELECT 1")
+    assert sql_timing._should_explain("SELECT 2")
+
+    monkeypatch.setattr(sql_timing, "SLOW_QUERY_EXPLAIN_INTERVAL", 0)
+    assert sql_timing._should_explain("SELECT 1")
+
+
+def test_statements_attributed_to_operation():
+    """
+    Tests the statements are attributed to the operation and batch running them.
+    """
+    assert sql_timing.describe_caller() == "unknown"
+    with sql_timing.sql_operation("create_employees"):
+        assert sql_timing.describe_caller() == "create_employees"
+        sql_timing.set_batch(3)
+        assert sql_timing.describe_caller() == "create_employees batch 3"
+    assert sql_timing.describe_caller() == "unknown"
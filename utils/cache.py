@@ -0,0 +1,162 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from utils.constants import DB_REPLICA_PIN_SECONDS, REPORT_CACHE_SIZE, REPORT_CACHE_TTL, WORKER_STATS_DIR
+
+# Type variable for the return type of the decorated function
+T = TypeVar('T')
+
+class ReportCache:
+    """
+    In-process LRU cache for report results with time-to-live eviction.
+
+    Entries are tagged with the write generation current when their computation
+    started. Services bump the generation after committing new data, which turns
+    every older entry into a miss. With a generation_path, the generation is the
+    size of that file and every bump appends a byte to it, so a commit in any
+    worker process invalidates the cache of every worker.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, generation_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation_path = generation_path
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._generation = 0
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @property
+    def generation(self) -> int:
+        if self.generation_path is None:
+            return self._generation
+        try:
+            return os.stat(self.generation_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def seconds_since_write(self) -> float:
+        """
+        Returns the seconds since the generation was last bumped, by any worker process.
+        """
+        if self.generation_path is None:
+            return time.time() - self._written_at
+        try:
+            return time.time() - os.stat(self.generation_path).st_mtime
+        except FileNotFoundError:
+            return float("inf")
+
+    def bump_generation(self) -> None:
+        """
+        Invalidates every cached result, called after data is committed.
+        """
+        with self._lock:
+            if self.generation_path is None:
+                self._generation += 1
+                self._written_at = time.time()
+            else:
+                os.makedirs(os.path.dirname(self.generation_path), exist_ok=True)
+                # Appends are atomic, the bumps of concurrent workers are all counted
+                fd = os.open(self.generation_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, b".")
+                finally:
+                    os.close(fd)
+            self._entries.clear()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Looks up a result.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            A tuple with whether the key was found and the cached value.
+        """
+        current = self.generation
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            generation, expires_at, value = entry
+            if generation != current or expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        """
+        Stores a result, unless data was committed while it was being computed.
+
+        Args:
+            key: The cache key.
+            value: The result to cache.
+            generation: The write generation read before computing the result.
+        """
+        current = self.generation
+        with self._lock:
+            if generation != current:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+# Shared cache for the report services, the worker processes share its generation through WORKER_STATS_DIR
+report_cache = ReportCache(
+    REPORT_CACHE_SIZE, REPORT_CACHE_TTL,
+    os.path.join(WORKER_STATS_DIR, "report_generation") if WORKER_STATS_DIR else None)
+
+def cached_report(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Caches the result of an async report service in the report cache.
+
+    The key is the function name and its arguments, ignoring the database session
+    except whether it reads from the replica: results read from a lagging replica are
+    never served to the clients pinned to the primary after their own writes. Replica
+    results are not cached until DB_REPLICA_PIN_SECONDS after the last write, when the
+    replica may not have replayed it yet.
+    A hit is returned without using the session, so no connection is checked out.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if not report_cache.enabled:
+            return await func(*args, **kwargs)
+
+        sessions = [value for value in (*args, *kwargs.values()) if isinstance(value, Session)]
+        replica = any(session.info.get("replica", False) for session in sessions)
+        key = (func.__name__,
+               replica,
+               tuple(arg for arg in args if not isinstance(arg, Session)),
+               tuple(sorted((name, value) for name, value in kwargs.items() if not isinstance(value, Session))))
+        hit, value = report_cache.get(key)
+        if hit:
+            return value
+
+        generation = report_cache.generation
+        value = await func(*args, **kwargs)
+        if replica and report_cache.seconds_since_write() < DB_REPLICA_PIN_SECONDS:
+            # Possibly read before the replica caught up with the last write
+            return value
+        report_cache.set(key, value, generation)
+        return value
+    return wrapper
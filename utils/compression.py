@@ -0,0 +1,164 @@
+import zlib
+from typing import AsyncIterable, AsyncIterator, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.constants import (
+    CHUNK_SIZE,
+    DECOMPRESSION_ERROR_MSG,
+    UNSUPPORTED_ENCODING_MSG,
+    ZSTD_REQUIRED_MSG)
+from utils.exceptions import ProcessingError
+from utils.log_manager import SingletonLogger
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for zstd content
+    zstandard = None
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Supported encodings, by Content-Encoding value and by file extension
+ENCODINGS = ("gzip", "zstd")
+FILE_ENCODINGS = {".gz": "gzip", ".zst": "zstd"}
+# Compressed bytes given to the zstd decompressor at a time. It has no max_length like zlib
+# and a block of a few bytes can expand to 128 KiB, so small steps bound its output
+ZSTD_INPUT_STEP = 32
+
+async def _gunzip(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    # wbits=31 reads the gzip header and trailer, a new decompressor starts each concatenated member
+    decompressor = zlib.decompressobj(wbits=31)
+    in_member = False
+    async for data in chunks:
+        while data:
+            in_member = True
+            # max_length bounds the output of each step, whatever the compression ratio
+            output = await run_in_threadpool(decompressor.decompress, data, CHUNK_SIZE)
+            if output:
+                yield output
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+                in_member = False
+            else:
+                data = decompressor.unconsumed_tail
+    if in_member:
+        raise zlib.error("Truncated gzip content")
+
+async def _unzstd(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    in_frame = False
+
+    def decompress(data: bytes) -> Tuple[bytes, bytes]:
+        # Decompresses about CHUNK_SIZE bytes, returns them and the input not consumed yet
+        nonlocal decompressor, in_frame
+        output = []
+        size = 0
+        position = 0
+        while position < len(data) and size < CHUNK_SIZE:
+            in_frame = True
+            output.append(decompressor.decompress(data[position:position + ZSTD_INPUT_STEP]))
+            size += len(output[-1])
+            position += ZSTD_INPUT_STEP
+            if decompressor.eof:
+                # A new decompressor starts each concatenated frame
+                data, position = decompressor.unused_data + data[position:], 0
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+                in_frame = False
+        return b"".join(output), data[position:]
+
+    async for data in chunks:
+        while data:
+            output, data = await run_in_threadpool(decompress, data)
+            if output:
+                yield output
+    if in_frame:
+        raise zstandard.ZstdError("Truncated zstd content")
+
+async def decompress_chunks(chunks: AsyncIterable[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """
+    Decompresses a byte stream chunk by chunk, without holding the whole content in memory.
+
+    Args:
+        chunks: The compressed content, chunk by chunk.
+        encoding: gzip or zstd.
+
+    Yields:
+        The decompressed content, chunk by chunk.
+
+    Raises:
+        ProcessingError: If the encoding is not supported or the content is not valid.
+    """
+    if encoding not in ENCODINGS:
+        raise ProcessingError(UNSUPPORTED_ENCODING_MSG)
+    if encoding == "zstd" and zstandard is None:
+        raise ProcessingError(ZSTD_REQUIRED_MSG)
+
+    errors = (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+    try:
+        async for output in (_gunzip(chunks) if encoding == "gzip" else _unzstd(chunks)):
+            yield output
+    except errors as e:
+        logger.error("Could not decompress %s content: %s", encoding, e)
+        raise ProcessingError(DECOMPRESSION_ERROR_MSG)
+
+class RequestDecompressionMiddleware:
+    """
+    ASGI middleware decompressing request bodies sent with Content-Encoding gzip or zstd.
+
+    The body is decompressed while the endpoint reads it, so streaming endpoints
+    never hold the whole decompressed payload. Requests with other encodings are
+    answered with 415 Unsupported Media Type.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+        if encoding not in ENCODINGS or (encoding == "zstd" and zstandard is None):
+            response = JSONResponse({"detail": UNSUPPORTED_ENCODING_MSG}, status_code=415)
+            await response(scope, receive, send)
+            return
+
+        # The endpoint sees the decompressed body, of unknown length. The scope is updated
+        # in place, the outer middlewares read what the routing adds to it (i.e. the route)
+        scope["headers"] = [(name, value) for name, value in scope["headers"]
+                            if name not in (b"content-encoding", b"content-length")]
+
+        async def compressed_body() -> AsyncIterator[bytes]:
+            while True:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return
+                yield message.get("body", b"")
+                if not message.get("more_body", False):
+                    return
+
+        decompressed = decompress_chunks(compressed_body(), encoding)
+        body_done = False
+
+        async def decompressed_receive() -> Message:
+            nonlocal body_done
+            if body_done:
+                # Later calls wait for the disconnection, like with the original receive
+                return await receive()
+            try:
+                chunk = await decompressed.__anext__()
+            except StopAsyncIteration:
+                body_done = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": chunk, "more_body": True}
+
+        await self.app(scope, decompressed_receive, send)
@@ -1,7 +1,68 @@
 import os
 
 # Define environment variables
+# Server processes (gunicorn workers), the connection budget and the parser processes are divided among them
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+# Directory where each worker publishes its pool usage to be aggregated, empty with a single process
+WORKER_STATS_DIR = os.getenv("WORKER_STATS_DIR", "")
+WORKER_STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", 5))
+# Directory where each worker writes its prometheus_client metrics, read by /metrics (multiprocess mode)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1000))
+# Number of bytes read at a time from uploaded files and streamed request bodies
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1024 * 1024))
+# Execute report queries as server-side prepared statements (disable behind transaction poolers)
+USE_PREPARED_STATEMENTS = os.getenv("USE_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+# Year used by the reports when none is requested
+DEFAULT_REPORT_YEAR = int(os.getenv("DEFAULT_REPORT_YEAR", 2021))
+# Report result cache, a size or TTL (in seconds) of 0 disables it
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 128))
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", 300))
+# Seconds a client reads from the primary after its own writes, longer than the replication lag.
+# Reports read from the replica within that time after a write are not cached
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", 30))
+
+# Parallel CSV parsing, number of parser processes, bytes per parsed range and minimum file size to use it
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", max((os.cpu_count() or 1) // WEB_CONCURRENCY, 1)))
+PARSE_RANGE_BYTES = int(os.getenv("PARSE_RANGE_BYTES", 8 * 1024 * 1024))
+PARALLEL_PARSE_MIN_BYTES = int(os.getenv("PARALLEL_PARSE_MIN_BYTES", 32 * 1024 * 1024))
+# Background ingestion jobs, number of concurrent jobs per process and directory for the uploaded files
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+INGESTION_SPOOL_DIR = os.getenv("INGESTION_SPOOL_DIR") or None
+# Employees listing, page size by default and maximum page size
+EMPLOYEES_PAGE_SIZE = int(os.getenv("EMPLOYEES_PAGE_SIZE", 100))
+EMPLOYEES_MAX_PAGE_SIZE = int(os.getenv("EMPLOYEES_MAX_PAGE_SIZE", 1000))
+# Conflicting rows of each reason listed in the error of a load, /employees/validate lists every one
+CONFLICT_ROWS_IN_ERROR = int(os.getenv("CONFLICT_ROWS_IN_ERROR", 10))
+
+# Statements slower than this many seconds are logged (0 disables it), optionally with their
+# EXPLAIN plan appended to a JSON lines file. The plan is estimated, the statement is not run
+# again, but each capture costs a planning round trip on the connection of the request, so a
+# statement is explained at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds per process
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", 1))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_EXPLAIN_FILE = os.getenv("SLOW_QUERY_EXPLAIN_FILE", "slow_queries.jsonl")
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+
+# Logging, default level and per module levels (i.e. "partial_load=ERROR,sql_timing=DEBUG"), text or json format
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Write the records from a background thread, records are dropped when the queue is full
+LOG_QUEUE = os.getenv("LOG_QUEUE", "true").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Warnings and errors logged per call site and window (in seconds), 0 disables the limit
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 10))
+LOG_RATE_LIMIT_WINDOW = float(os.getenv("LOG_RATE_LIMIT_WINDOW", 60))
+
+# Media types of the responses
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+# Column names once and the values of each row as an array
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.columnar+json"
+CSV_MEDIA_TYPE = "text/csv"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
 
 # Define exception messages
 GENERIC_ERROR_MSG = "An error occurred while processing the request, please try again later"
@@ -9,4 +70,17 @@ UNIQUE_CONSTRAINT_VIOLATION_MSG = "Duplicate record found"
 UNICODE_DECODE_ERROR_MSG = "An error occured reading the file, check file invalid characters"
 CSV_ERROR_MSG = "There was an error processing the CSV file. Please check the file for any formatting issues, such as incorrect commas or quotes."
 FOREIGN_KEY_VIOLATION_MSG = "Problems with the job or the department, verify they exist"
-DATA_TYPE_ERROR_MSG = "Data problems, please verify the data types and the file format"
\ No newline at end of file
+DATA_TYPE_ERROR_MSG = "Data problems, please verify the data types and the file format"
+INGESTION_JOB_NOT_FOUND_MSG = "Ingestion job not found"
+INGESTION_SHUTDOWN_MSG = "The API stopped before the job finished, please upload the file again"
+NOT_ACCEPTABLE_MSG = "None of the requested media types is available"
+UNSUPPORTED_FILE_FORMAT_MSG = "Only CSV, Parquet and Arrow files are allowed"
+PYARROW_REQUIRED_MSG = "Parquet and Arrow files are not supported by this server"
+ARROW_ERROR_MSG = "There was an error reading the Parquet or Arrow file, please check the file is not corrupted"
+UNSUPPORTED_ENCODING_MSG = "Only gzip and zstd compressed content is supported"
+ZSTD_REQUIRED_MSG = "zstd compressed content is not supported by this server"
+DECOMPRESSION_ERROR_MSG = "There was an error decompressing the content, please check it is not truncated or corrupted"
+NDJSON_RECORD_ERROR_MSG = "Line {line} is not a valid record: {error}"
+CONFLICT_ROWS_MSG = "{reason}, rows: {rows}"
+DB_UNAVAILABLE_MSG = "The database is not reachable"
+DB_POOL_EXHAUSTED_MSG = "Every database connection of the pool is in use"
\ No newline at end of file
@@ -1,16 +1,54 @@
-from sqlalchemy.exc import IntegrityError, OperationalError, DatabaseError
+from sqlalchemy.exc import IntegrityError, OperationalError, DatabaseError, DataError
 from sqlalchemy.orm import Session
+import asyncio
 import functools
 from typing import Any, Callable, TypeVar
+from fastapi.concurrency import run_in_threadpool
 from utils.constants import *
+from utils.exceptions import ProcessingError
 from utils.log_manager import SingletonLogger
+from utils.metrics import db_operation_errors
+from utils.sql_timing import sql_operation
 
 logger = SingletonLogger().get_logger()
 
 # Type variable for the return type of the decorated function
 T = TypeVar('T')
 
+def describe_error(error: Exception) -> str:
+    """
+    Returns the client message for an error raised while saving records.
+
+    Args:
+        error (Exception): The error raised by the database or the record validation.
+
+    Returns:
+        str: The message of utils.constants describing the error.
+    """
+    if isinstance(error, (TypeError, DataError)):
+        return DATA_TYPE_ERROR_MSG
+    if isinstance(error, IntegrityError):
+        error_message = str(error.orig).lower()
+        if "foreign key violation" in error_message or "foreign key constraint" in error_message:
+            return FOREIGN_KEY_VIOLATION_MSG
+        elif "duplicate key value violates unique constraint" in error_message:
+            return UNIQUE_CONSTRAINT_VIOLATION_MSG
+    return GENERIC_ERROR_MSG
+
+# Error category of each client message, for the error metrics
+ERROR_CATEGORIES = {
+    FOREIGN_KEY_VIOLATION_MSG: "foreign_key",
+    UNIQUE_CONSTRAINT_VIOLATION_MSG: "duplicate",
+    DATA_TYPE_ERROR_MSG: "data_type",
+    GENERIC_ERROR_MSG: "integrity"
+}
+
 def db_operation(func: Callable[..., T]) -> Callable[..., T]:
+    # Synchronous functions run in the thread pool, so their blocking database
+    # calls do not freeze the event loop. Coroutines are awaited directly and must
+    # offload their own blocking calls.
+    is_coroutine = asyncio.iscoroutinefunction(func)
+
     @functools.wraps(func)
     async def wrapper(*args: Any, **kwargs: Any) -> T:
         # Find AsyncSession in arguments (args or kwargs)
@@ -21,33 +59,48 @@ def db_operation(func: Callable[..., T]) -> Callable[..., T]:
             raise ValueError("No DB session object found in arguments.")
 
         try:
-            result = await func(*args, **kwargs)
-            db.flush()
+            # The statements of the operation, also the ones run in the thread pool, are attributed to it
+            with sql_operation(func.__name__):
+                if is_coroutine:
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await run_in_threadpool(func, *args, **kwargs)
+                await run_in_threadpool(db.flush)
             return result
 
+        except ProcessingError as e:
+            db_operation_errors.labels(func.__name__, e.category).inc()
+            await run_in_threadpool(db.rollback)
+            raise
+
         except TypeError as e:
-            db.rollback()
-            logger.error(f"Type error occurred in {func.__name__}: {str(e)}")
+            db_operation_errors.labels(func.__name__, "data_type").inc()
+            await run_in_threadpool(db.rollback)
+            logger.error("Type error occurred in %s: %s", func.__name__, e)
             raise Exception(DATA_TYPE_ERROR_MSG)
 
         except IntegrityError as e:
-            db.rollback()
-            logger.error(f"Integrity error occurred: {e.orig}")
-            error_message = str(e.orig).lower()
-
-            if "foreign key violation" in error_message or "foreign key constraint" in error_message:
-                raise Exception(FOREIGN_KEY_VIOLATION_MSG)
-            elif "duplicate key value violates unique constraint" in error_message:
-                raise Exception(UNIQUE_CONSTRAINT_VIOLATION_MSG)
-            raise Exception(GENERIC_ERROR_MSG)
+            message = describe_error(e)
+            db_operation_errors.labels(func.__name__, ERROR_CATEGORIES[message]).inc()
+            await run_in_threadpool(db.rollback)
+            logger.error("Integrity error occurred: %s", e.orig)
+            raise Exception(message)
+
+        except DataError as e:
+            db_operation_errors.labels(func.__name__, "data_type").inc()
+            await run_in_threadpool(db.rollback)
+            logger.error("Data error occurred in %s: %s", func.__name__, e.orig)
+            raise Exception(DATA_TYPE_ERROR_MSG)
 
         except (OperationalError, DatabaseError) as e:
-            db.rollback()
-            logger.error(f"Database error occurred in {func.__name__}: {str(e.orig)}")
+            db_operation_errors.labels(func.__name__, "database").inc()
+            await run_in_threadpool(db.rollback)
+            logger.error("Database error occurred in %s: %s", func.__name__, e.orig)
             raise Exception(GENERIC_ERROR_MSG)
 
         except Exception as e:
-            db.rollback()
-            logger.error(f"Unexpected error in {func.__name__}: {str(e)}")
+            db_operation_errors.labels(func.__name__, "unexpected").inc()
+            await run_in_threadpool(db.rollback)
+            logger.error("Unexpected error in %s: %s", func.__name__, e)
             raise Exception(GENERIC_ERROR_MSG)
     return wrapper
\ No newline at end of file
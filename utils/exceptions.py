@@ -0,0 +1,13 @@
+class ProcessingError(Exception):
+    """
+    Raised when a request payload cannot be processed.
+
+    The message is already safe to return to the client, so the db_operation
+    decorator re-raises it as is instead of replacing it with a generic message.
+    The category labels the error in the db_operation_errors metric, i.e. the
+    duplicate or foreign_key conflicts found before inserting anything.
+    """
+
+    def __init__(self, message: str, category: str = "processing"):
+        super().__init__(message)
+        self.category = category
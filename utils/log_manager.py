@@ -1,4 +1,171 @@
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.constants import (
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_FORMAT,
+    LOG_QUEUE,
+    LOG_QUEUE_SIZE,
+    LOG_RATE_LIMIT,
+    LOG_RATE_LIMIT_WINDOW)
+from utils.metrics import log_records_dropped, log_records_suppressed
+
+# The scope and id of the request being handled, read by the records logged while handling it
+current_request: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_request", default=None)
+
+# Fields passed with extra= that are written by the JSON formatter
+EXTRA_FIELDS = ("rows", "duration", "job_id", "table")
+
+def parse_levels(levels: str) -> Dict[str, int]:
+    """
+    Parses per module log levels, i.e. "partial_load=ERROR,sql_timing=DEBUG".
+
+    Args:
+        levels: Comma separated module=LEVEL pairs, the module being the file name without extension.
+
+    Returns:
+        The level of each module.
+    """
+    parsed = {}
+    for item in levels.split(","):
+        module, _, level = item.partition("=")
+        if module.strip() and level.strip():
+            parsed[module.strip()] = logging.getLevelName(level.strip().upper())
+    return parsed
+
+class ModuleLevelFilter(logging.Filter):
+    """
+    Drops the records below the level of the module that logged them.
+    """
+
+    def __init__(self, default_level: int, levels: Dict[str, int]):
+        super().__init__()
+        self.default_level = default_level
+        self.levels = levels
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.levels.get(record.module, self.default_level)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` warnings or errors per call site and time window.
+
+    Records are grouped by the line that logged them, so the same error repeated for
+    thousands of rows with different values is logged a few times per window. The
+    first record let through after a suppression carries the number of suppressed ones.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self.suppressed_total = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno < logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            # Window start, records let through and records suppressed in the window
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                site = self._sites[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if site[1] >= self.limit:
+                site[2] += 1
+                self.suppressed_total += 1
+                log_records_suppressed.inc()
+                return False
+            site[1] += 1
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the request id and route of the request being handled to the records.
+
+    It runs in the thread that logs, before the record is queued, so the context
+    variables of the request are still available.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request = current_request.get()
+        if request is not None:
+            record.request_id = request["id"]
+            record.route = getattr(request["scope"].get("route"), "path", None)
+        return True
+
+class TextFormatter(logging.Formatter):
+    """
+    The text format of the records, noting the similar records suppressed before them.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        return f"{text} ({suppressed} similar messages suppressed)" if suppressed else text
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, with their request and extra fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage()
+        }
+        for field in ("request_id", "route", "suppressed") + EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops the records when the queue is full instead of blocking.
+    """
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default one formats the exception into the message, the listener formats it
+        # instead, i.e. in the exception field of the JSON format. The arguments are merged
+        # now, they could change before the listener writes the record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+            log_records_dropped.inc()
 
 class SingletonLogger:
     _instance = None
@@ -11,13 +178,93 @@ class SingletonLogger:
 
     def _initialize_logger(self):
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
+        default_level = logging.getLevelName(LOG_LEVEL.upper())
+        levels = parse_levels(LOG_LEVELS)
+        # The logger lets through the lowest configured level, the filter applies each module one
+        self.logger.setLevel(min([default_level, *levels.values()]))
 
         # Basic handler and formatter
         handler = logging.StreamHandler()
-        formatter = logging.Formatter(' %(levelname)s - %(asctime)s - %(module)s:%(lineno)d - %(message)s')
+        if LOG_FORMAT == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = TextFormatter(' %(levelname)s - %(asctime)s - %(module)s:%(lineno)d - %(message)s')
         handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+
+        # With the queue the request only pays the filters and the enqueue, the listener
+        # thread formats and writes the records
+        self.listener = None
+        if LOG_QUEUE:
+            front = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+            self.listener = QueueListener(front.queue, handler)
+            self.listener.start()
+            atexit.register(self.stop)
+            os.register_at_fork(after_in_child=self._restart_listener)
+        else:
+            front = handler
+
+        self.rate_limit = RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_LIMIT_WINDOW)
+        front.addFilter(ModuleLevelFilter(default_level, levels))
+        front.addFilter(self.rate_limit)
+        front.addFilter(ContextFilter())
+        self.logger.addHandler(front)
+        self.handler, self.front = handler, front
 
     def get_logger(self):
-        return self.logger
\ No newline at end of file
+        return self.logger
+
+    def _restart_listener(self):
+        # Threads do not survive a fork, workers forked from a preloaded application
+        # start their own listener, on a new queue in case the lock of the old one was held
+        if self.listener is not None:
+            self.front.queue = queue.Queue(LOG_QUEUE_SIZE)
+            self.listener = QueueListener(self.front.queue, self.handler)
+            self.listener.start()
+
+    def stop(self):
+        """
+        Writes the queued records and stops the listener thread, the records logged
+        afterwards are written directly.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.logger.removeHandler(self.front)
+            for log_filter in self.front.filters:
+                self.handler.addFilter(log_filter)
+            self.logger.addHandler(self.handler)
+            self.front = self.handler
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving every request an id, logged with its records and returned in X-Request-ID.
+
+    The id of the X-Request-ID request header is kept when present, so a request can be
+    followed across services.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = current_request.set({"id": request_id, "scope": scope})
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            current_request.reset(token)
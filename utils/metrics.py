@@ -0,0 +1,129 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.constants import PROMETHEUS_MULTIPROC_DIR
+
+# The metrics are prometheus_client ones. With PROMETHEUS_MULTIPROC_DIR set, before this module
+# is imported, each worker process writes their values to that directory and /metrics adds them up
+
+def render_metrics() -> bytes:
+    """
+    Renders the metrics in the Prometheus text exposition format.
+
+    With several worker processes (PROMETHEUS_MULTIPROC_DIR), the metrics of every worker
+    are added up: counters and histograms of the exited ones included, and the gauges of
+    the running ones.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=PROMETHEUS_MULTIPROC_DIR)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def histogram_snapshot(metric: Histogram, **labels: str) -> Dict[str, Any]:
+    """
+    Returns the state of a histogram child of this process as JSON serializable data.
+
+    Args:
+        metric: The histogram.
+        labels: The label values of the child.
+
+    Returns:
+        A dictionary with the cumulative count per bucket upper bound ("+Inf"
+        included), the total number of observations and their sum.
+    """
+    snapshot = {"buckets": {}, "count": 0.0, "sum": 0.0}
+    # Creates the child, with empty buckets, when nothing was observed yet
+    metric.labels(**labels)
+    for family in metric.collect():
+        for sample in family.samples:
+            sample_labels = dict(sample.labels)
+            bound = sample_labels.pop("le", None)
+            if sample_labels != labels:
+                continue
+            if sample.name.endswith("_bucket"):
+                snapshot["buckets"][bound] = sample.value
+            elif sample.name.endswith("_count"):
+                snapshot["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                snapshot["sum"] = sample.value
+    return snapshot
+
+def merge_histograms(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds up two histogram snapshots with the same buckets.
+    """
+    return {
+        "buckets": {bound: count + second["buckets"].get(bound, 0) for bound, count in first["buckets"].items()},
+        "count": first["count"] + second["count"],
+        "sum": first["sum"] + second["sum"]
+    }
+
+@contextmanager
+def timed(target: Histogram) -> Iterator[None]:
+    """
+    Observes the duration in seconds of the block, also when it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target.observe(time.perf_counter() - start)
+
+# Duration buckets in seconds, from sub millisecond queries to long loads
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Batch size buckets in rows
+ROWS_BUCKETS = (1, 10, 100, 500, 1000, 5000, 10000, 50000)
+
+# Counters are exposed with the _total suffix, i.e. rows_ingested_total
+request_duration = Histogram(
+    "http_request_duration_seconds", "Duration of the HTTP requests, until the response is sent.",
+    ("method", "route", "status"), buckets=DURATION_BUCKETS)
+rows_ingested = Counter("rows_ingested", "Rows committed by the loads.", ("table",))
+batch_flush_duration = Histogram(
+    "batch_flush_duration_seconds", "Duration of each batch written to the database by a load.",
+    ("table",), buckets=DURATION_BUCKETS)
+batch_flush_rows = Histogram("batch_flush_rows", "Rows of each batch written by a load.", ("table",), buckets=ROWS_BUCKETS)
+db_operation_errors = Counter(
+    "db_operation_errors", "Errors of the database operations, by category.", ("operation", "category"))
+report_query_duration = Histogram(
+    "report_query_duration_seconds", "Duration of the report queries, cache hits excluded.",
+    ("report",), buckets=DURATION_BUCKETS)
+log_records_dropped = Counter("log_records_dropped", "Log records dropped because the log queue was full.")
+log_records_suppressed = Counter(
+    "log_records_suppressed", "Repeated warnings and errors suppressed by the rate limit.")
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing the duration of every HTTP request by method, route and status.
+
+    The route is the path template (i.e. /ingestion/{job_id}), requests that match no
+    route are grouped under "unmatched" to keep the number of series bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_duration.labels(scope["method"], route, status).observe(time.perf_counter() - start)
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from prometheus_client import Histogram
+
+from utils.constants import (
+    SLOW_QUERY_SECONDS,
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_FILE,
+    SLOW_QUERY_EXPLAIN_INTERVAL)
+from utils.log_manager import SingletonLogger
+from utils.metrics import DURATION_BUCKETS
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# The service function running the statements and the batch it is loading, set by db_operation and the loaders
+current_operation: ContextVar[Optional[str]] = ContextVar("current_operation", default=None)
+current_batch: ContextVar[Optional[int]] = ContextVar("current_batch", default=None)
+
+statement_duration = Histogram(
+    "sql_statement_duration_seconds", "Duration of the SQL statements, by calling operation.",
+    ("operation",), buckets=DURATION_BUCKETS)
+
+# Statements captured with EXPLAIN, other ones (i.e. PREPARE, SAVEPOINT) are only logged
+EXPLAINABLE = ("select", "with", "insert", "update", "delete", "execute")
+_explain_lock = threading.Lock()
+# When each statement was last explained, cleared when it holds too many statements
+_explained_at: Dict[str, float] = {}
+_EXPLAINED_MAX = 1000
+
+@contextmanager
+def sql_operation(name: str) -> Iterator[None]:
+    """
+    Attributes the statements run inside the block (also in the thread pool) to an operation.
+    """
+    token = current_operation.set(name)
+    batch_token = current_batch.set(None)
+    try:
+        yield
+    finally:
+        current_batch.reset(batch_token)
+        current_operation.reset(token)
+
+def set_batch(number: Optional[int]) -> None:
+    """
+    Attributes the next statements of the current operation to a batch of its load.
+    """
+    current_batch.set(number)
+
+def describe_caller() -> str:
+    """
+    Returns the operation and batch running the current statement, i.e. "create_employees batch 3".
+    """
+    operation = current_operation.get() or "unknown"
+    batch = current_batch.get()
+    return f"{operation} batch {batch}" if batch is not None else operation
+
+def observe_statement(statement: str, elapsed: float) -> bool:
+    """
+    Records the duration of a statement and logs it if it is slower than SLOW_QUERY_SECONDS.
+
+    Statements run outside of the engine cursor (i.e. COPY) report their duration here.
+
+    Args:
+        statement: The SQL statement.
+        elapsed: Its duration in seconds.
+
+    Returns:
+        True if the statement was slow.
+    """
+    statement_duration.labels(current_operation.get() or "unknown").observe(elapsed)
+    if SLOW_QUERY_SECONDS <= 0 or elapsed < SLOW_QUERY_SECONDS:
+        return False
+    logger.warning("Slow statement in %s (%.1f ms): %s", describe_caller(), elapsed * 1000,
+                   " ".join(statement.split())[:1000], extra={"duration": elapsed})
+    return True
+
+def _should_explain(statement: str) -> bool:
+    # At most one plan per statement every SLOW_QUERY_EXPLAIN_INTERVAL seconds
+    now = time.monotonic()
+    with _explain_lock:
+        last = _explained_at.get(statement)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        if len(_explained_at) >= _EXPLAINED_MAX:
+            _explained_at.clear()
+        _explained_at[statement] = now
+    return True
+
+def _capture_plan(cursor: Any, statement: str, parameters: Any, elapsed: float) -> None:
+    # Plain EXPLAIN plans the statement without running it. It runs under a savepoint,
+    # so a failing EXPLAIN does not abort the transaction
+    connection = cursor.connection
+    plan_cursor = connection.cursor()
+    try:
+        plan_cursor.execute("SAVEPOINT explain_capture")
+        try:
+            plan_cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters or None)
+            plan = plan_cursor.fetchone()[0]
+        except Exception:
+            plan_cursor.execute("ROLLBACK TO SAVEPOINT explain_capture")
+            raise
+        finally:
+            plan_cursor.execute("RELEASE SAVEPOINT explain_capture")
+    except Exception as e:
+        logger.error("Could not capture the plan of a slow statement in %s: %s", describe_caller(), e)
+        return
+    finally:
+        plan_cursor.close()
+
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "caller": describe_caller(),
+        "seconds": round(elapsed, 6),
+        "statement": statement,
+        "parameters": repr(parameters)[:1000],
+        "plan": plan
+    }
+    with _explain_lock, open(SLOW_QUERY_EXPLAIN_FILE, "a") as file:
+        file.write(json.dumps(entry, default=str) + "\n")
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Times every statement executed by an engine, attributing it to the calling operation.
+
+    Statements slower than SLOW_QUERY_SECONDS are logged and, with SLOW_QUERY_EXPLAIN,
+    their EXPLAIN plan is appended to SLOW_QUERY_EXPLAIN_FILE as a JSON line, at most once
+    every SLOW_QUERY_EXPLAIN_INTERVAL seconds per statement.
+
+    Args:
+        engine: The engine to instrument.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["statement_start"].pop()
+        slow = observe_statement(statement, elapsed)
+        # Inserts of several rows expanded into a single VALUES run with cursor.execute and can be
+        # explained, real executemany calls cannot
+        single = not executemany or (context is not None and context.execute_style is ExecuteStyle.INSERTMANYVALUES)
+        if (slow and SLOW_QUERY_EXPLAIN and single and statement.lstrip().lower().startswith(EXPLAINABLE)
+                and _should_explain(statement)):
+            _capture_plan(cursor, statement, parameters, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # A statement failing once its cursor exists has no after_cursor_execute, its start time is dropped.
+        # Errors opening a connection have neither a cursor nor a connection
+        if getattr(context, "cursor", None) is None or getattr(context, "connection", None) is None:
+            return
+        starts = context.connection.info.get("statement_start")
+        if starts:
+            starts.pop()
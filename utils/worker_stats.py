@@ -0,0 +1,118 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from prometheus_client import multiprocess
+
+from utils.constants import PROMETHEUS_MULTIPROC_DIR, WORKER_STATS_DIR, WORKER_STATS_INTERVAL
+from utils.log_manager import SingletonLogger
+
+# Ensure type safety
+logger = SingletonLogger().get_logger()
+
+# Task publishing the stats of this worker, started with the application
+_publisher: Optional[asyncio.Task] = None
+
+def _stats_path(pid: int, dead: bool = False) -> str:
+    # A later worker may reuse the pid, the stats of each exited one are kept under their own name
+    suffix = f".dead-{time.time_ns()}" if dead else ""
+    return os.path.join(WORKER_STATS_DIR, f"worker-{pid}{suffix}.json")
+
+def write_worker_stats(stats: Dict[str, Any]) -> None:
+    """
+    Publishes the stats of this worker, replacing its previous ones.
+
+    The file is written aside and renamed, so readers never see a partial file.
+
+    Args:
+        stats: JSON serializable stats, i.e. the pool usage.
+    """
+    path = _stats_path(os.getpid())
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(stats, file)
+    os.replace(temporary, path)
+
+def read_worker_stats() -> List[Dict[str, Any]]:
+    """
+    Reads the stats published by every worker, running or exited.
+
+    Returns:
+        The stats of each worker with its "pid" and whether it is "alive".
+    """
+    workers = []
+    for path in sorted(glob.glob(os.path.join(WORKER_STATS_DIR, "worker-*.json"))):
+        name = os.path.basename(path)[len("worker-"):-len(".json")]
+        try:
+            with open(path) as file:
+                stats = json.load(file)
+        except (OSError, ValueError):
+            # Removed or replaced while listing
+            continue
+        stats["pid"] = int(name.split(".")[0])
+        stats["alive"] = ".dead" not in name
+        workers.append(stats)
+    return workers
+
+def mark_worker_dead(pid: int) -> None:
+    """
+    Keeps the last stats of an exited worker, its counters are still aggregated but not its gauges.
+
+    Its pool usage is kept under a name of its own, and its metrics are marked dead in
+    PROMETHEUS_MULTIPROC_DIR.
+
+    Called by the gunicorn master when a worker exits.
+    """
+    if WORKER_STATS_DIR and os.path.exists(_stats_path(pid)):
+        os.replace(_stats_path(pid), _stats_path(pid, dead=True))
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Removes the live gauges of the worker, its counters and histograms are kept
+        multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
+
+def clear_worker_stats() -> None:
+    """
+    Creates the stats and metrics directories and removes the stats and metrics of a previous run.
+    """
+    os.makedirs(WORKER_STATS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(WORKER_STATS_DIR, "worker-*.json*")):
+        os.remove(path)
+    if PROMETHEUS_MULTIPROC_DIR:
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+
+async def _publish(collect: Callable[[], Dict[str, Any]]) -> None:
+    while True:
+        try:
+            await run_in_threadpool(lambda: write_worker_stats(collect()))
+        except Exception as e:
+            logger.error("Could not publish the worker stats: %s", e)
+        await asyncio.sleep(WORKER_STATS_INTERVAL)
+
+def start_stats_publisher(collect: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Publishes the stats of this worker every WORKER_STATS_INTERVAL seconds, if WORKER_STATS_DIR is set.
+
+    Args:
+        collect: Returns the current stats of the worker.
+    """
+    global _publisher
+    if WORKER_STATS_DIR:
+        os.makedirs(WORKER_STATS_DIR, exist_ok=True)
+        _publisher = asyncio.create_task(_publish(collect))
+
+async def stop_stats_publisher(collect: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Stops publishing the stats of this worker, publishing them one last time.
+    """
+    global _publisher
+    if _publisher is not None:
+        _publisher.cancel()
+        await asyncio.gather(_publisher, return_exceptions=True)
+        _publisher = None
+        await run_in_threadpool(lambda: write_worker_stats(collect()))